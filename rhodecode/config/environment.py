@@ -20,8 +20,10 @@ from rhodecode.lib.auth import set_available_permissions
 from rhodecode.lib.utils import repo2db_mapper, make_ui, set_rhodecode_config,\
     load_rcextensions, check_git_version
 from rhodecode.lib.utils2 import engine_from_config, str2bool
+from rhodecode.lib.vcs.conf import settings as vcs_settings
 from rhodecode.model import init_model
 from rhodecode.model.scm import ScmModel
+from rhodecode.model.permission import PermissionModel
 
 log = logging.getLogger(__name__)
 
@@ -68,6 +70,9 @@ def load_environment(global_conf, app_conf, initial=False):
         input_encoding='utf-8', default_filters=['escape'],
         imports=['from webhelpers.html import escape'])
 
+    # persistent vcs indexes are stored together with other caches
+    vcs_settings.CACHE_DIR = os.path.join(app_conf['cache_dir'], 'vcs')
+
     # sets the c attribute access when don't existing attribute are accessed
     config['pylons.strict_tmpl_context'] = True
     test = os.path.split(config['__file__'])[-1] == 'test.ini'
@@ -93,9 +98,10 @@ def load_environment(global_conf, app_conf, initial=False):
     # Setup the SQLAlchemy database engine
     sa_engine_db1 = engine_from_config(config, 'sqlalchemy.db1.')
     init_model(sa_engine_db1)
+    PermissionModel.track_changes()
 
     repos_path = make_ui('db').configitems('paths')[0][1]
-    repo2db_mapper(ScmModel().repo_scan(repos_path),
+    repo2db_mapper(ScmModel().scan_repos(repos_path),
                    remove_obsolete=False, install_git_hook=False)
     set_available_permissions(config)
     config['base_path'] = repos_path
@@ -93,6 +93,7 @@ class DefaultsController(BaseController):
                 setting.app_settings_value = v
                 Session().add(setting)
             Session().commit()
+            RhodeCodeSetting.invalidate_app_settings()
             h.flash(_('Default settings updated successfully'),
                     category='success')
 
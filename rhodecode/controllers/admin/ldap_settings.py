@@ -123,6 +123,7 @@ class LdapSettingsController(BaseController):
                         Session().add(setting)
 
                 Session().commit()
+                RhodeCodeSetting.invalidate_app_settings()
                 h.flash(_('Ldap settings updated successfully'),
                         category='success')
                 if not ldap_active:
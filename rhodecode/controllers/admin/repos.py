@@ -137,6 +137,8 @@ class ReposController(BaseController):
 
         repos_data = []
         total_records = len(c.repos_list)
+        # recorded sizes, repositories aren't measured on every view
+        repo_sizes = ScmModel().get_repo_sizes()
 
         _tmpl_lookup = rhodecode.CONFIG['pylons.app_globals'].mako_lookup
         template = _tmpl_lookup.get_template('data_table/_dt_elements.html')
@@ -152,6 +154,7 @@ class ReposController(BaseController):
                                        .render(repo_name, _=_, h=h, c=c))
 
         for repo in c.repos_list:
+            size = repo_sizes.get(repo.repo_name)
             repos_data.append({
                 "menu": quick_menu(repo.repo_name),
                 "raw_name": repo.repo_name.lower(),
@@ -159,6 +162,8 @@ class ReposController(BaseController):
                                  repo.private, repo.fork),
                 "desc": repo.description,
                 "owner": repo.user.username,
+                "size": h.format_byte_size(size) if size is not None else '',
+                "raw_size": size or 0,
                 "action": repo_actions(repo.repo_name),
             })
 
@@ -40,6 +40,7 @@ from rhodecode.lib.auth import LoginRequired, HasPermissionAllDecorator, \
     HasPermissionAnyDecorator, NotAnonymous
 from rhodecode.lib.base import BaseController, render
 from rhodecode.lib.celerylib import tasks, run_task
+from rhodecode.lib.middleware.pygrack import get_git_service_pool
 from rhodecode.lib.utils import repo2db_mapper, invalidate_cache, \
     set_rhodecode_config, repo_name_slug, check_git_version
 from rhodecode.model.db import RhodeCodeUi, Repository, RepoGroup, \
@@ -73,6 +74,8 @@ class SettingsController(BaseController):
                            key=lambda k: k[0].lower())
         c.py_version = platform.python_version()
         c.platform = platform.platform()
+        pool = get_git_service_pool()
+        c.git_service_stats = pool.get_stats() if pool is not None else None
         super(SettingsController, self).__before__()
 
     @HasPermissionAllDecorator('hg.admin')
@@ -113,12 +116,15 @@ class SettingsController(BaseController):
         if setting_id == 'mapping':
             rm_obsolete = request.POST.get('destroy', False)
             log.debug('Rescanning directories with destroy=%s' % rm_obsolete)
-            initial = ScmModel().repo_scan()
-            log.debug('invalidating all repositories')
-            for repo_name in initial.keys():
-                invalidate_cache('get_repo_cached_%s' % repo_name)
+            def _invalidated(scanned_repos):
+                # repositories are invalidated while they're scanned
+                for scanned in scanned_repos:
+                    invalidate_cache('get_repo_cached_%s' % scanned.name)
+                    yield scanned
 
-            added, removed = repo2db_mapper(initial, rm_obsolete)
+            log.debug('invalidating all repositories')
+            added, removed = repo2db_mapper(
+                _invalidated(ScmModel().scan_repos()), rm_obsolete)
 
             h.flash(_('Repositories successfully'
                       ' rescanned added: %s,removed: %s') % (added, removed),
@@ -158,6 +164,7 @@ class SettingsController(BaseController):
                 Session().add(sett3)
 
                 Session().commit()
+                RhodeCodeSetting.invalidate_app_settings()
                 set_rhodecode_config(config)
                 h.flash(_('Updated application settings'), category='success')
 
@@ -203,6 +210,7 @@ class SettingsController(BaseController):
                 Session().add(sett4)
 
                 Session().commit()
+                RhodeCodeSetting.invalidate_app_settings()
                 set_rhodecode_config(config)
                 h.flash(_('Updated visualisation settings'),
                         category='success')
@@ -175,7 +175,7 @@ class ApiController(JSONRPCController):
 
         try:
             rm_obsolete = Optional.extract(remove_obsolete)
-            added, removed = repo2db_mapper(ScmModel().repo_scan(),
+            added, removed = repo2db_mapper(ScmModel().scan_repos(),
                                             remove_obsolete=rm_obsolete)
             return {'added': added, 'removed': removed}
         except Exception:
@@ -69,16 +69,9 @@ class ChangelogController(BaseRepoController):
         p = safe_int(request.params.get('page', 1), 1)
         branch_name = request.params.get('branch', None)
         try:
-            if branch_name:
-                collection = [z for z in
-                              c.rhodecode_repo.get_changesets(start=0,
-                                                    branch_name=branch_name)]
-                c.total_cs = len(collection)
-            else:
-                collection = c.rhodecode_repo
-                c.total_cs = len(c.rhodecode_repo)
-
-            c.pagination = RepoPage(collection, page=p, item_count=c.total_cs,
+            c.total_cs = c.rhodecode_repo.count(branch_name)
+            c.pagination = RepoPage(c.rhodecode_repo, page=p,
+                                    item_count=c.total_cs,
                                     items_per_page=c.size, branch=branch_name)
             collection = list(c.pagination)
             page_revisions = [x.raw_id for x in collection]
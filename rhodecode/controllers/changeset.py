@@ -47,7 +47,6 @@ from rhodecode.model.comment import ChangesetCommentsModel
 from rhodecode.model.changeset_status import ChangesetStatusModel
 from rhodecode.model.meta import Session
 from rhodecode.model.repo import RepoModel
-from rhodecode.lib.diffs import LimitedDiffContainer
 from rhodecode.lib.exceptions import StatusChangeOnClosedPullRequestError
 from rhodecode.lib.vcs.backends.base import EmptyChangeset
 from rhodecode.lib.utils2 import safe_unicode
@@ -240,32 +239,28 @@ class ChangesetController(BaseRepoController):
             context_lcl = get_line_ctx('', request.GET)
             ign_whitespace_lcl = ign_whitespace_lcl = get_ignore_ws('', request.GET)
 
-            _diff = c.rhodecode_repo.get_diff(cs1, cs2,
+            get_diff = lambda: c.rhodecode_repo.get_diff(cs1, cs2,
                 ignore_whitespace=ign_whitespace_lcl, context=context_lcl)
             diff_limit = self.cut_off_limit if not fulldiff else None
-            diff_processor = diffs.DiffProcessor(_diff,
-                                                 vcs=c.rhodecode_repo.alias,
-                                                 format='gitdiff',
-                                                 diff_limit=diff_limit)
             cs_changes = OrderedDict()
             if method == 'show':
-                _parsed = diff_processor.prepare()
-                c.limited_diff = False
-                if isinstance(_parsed, LimitedDiffContainer):
-                    c.limited_diff = True
+                # changesets are immutable, so is the diff between them
+                key = ('changeset', getattr(cs1, 'raw_id', cs1), cs2,
+                       ign_whitespace_lcl, context_lcl)
+                c.limited_diff, _parsed = diffs.get_rendered_diff(get_diff,
+                    key, vcs=c.rhodecode_repo.alias, diff_limit=diff_limit,
+                    enable_comments=enable_comments)
                 for f in _parsed:
                     st = f['stats']
                     if st[0] != 'b':
                         c.lines_added += st[0]
                         c.lines_deleted += st[1]
                     fid = h.FID(changeset.raw_id, f['filename'])
-                    diff = diff_processor.as_html(enable_comments=enable_comments,
-                                                  parsed_lines=[f])
                     cs_changes[fid] = [cs1, cs2, f['operation'], f['filename'],
-                                       diff, st]
+                                       f['html'], st]
             else:
                 # downloads/raw we only need RAW diff nothing else
-                diff = diff_processor.as_raw()
+                diff = get_diff()
                 cs_changes[''] = [None, None, None, None, diff, None]
             c.changes[changeset.raw_id] = cs_changes
 
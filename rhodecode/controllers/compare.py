@@ -41,7 +41,6 @@ from rhodecode.model.db import Repository
 from rhodecode.model.pull_request import PullRequestModel
 from webob.exc import HTTPBadRequest
 from rhodecode.lib.utils2 import str2bool
-from rhodecode.lib.diffs import LimitedDiffContainer
 from rhodecode.lib.vcs.backends.base import EmptyChangeset
 
 log = logging.getLogger(__name__)
@@ -152,17 +151,13 @@ class CompareController(BaseRepoController):
 
         diff_limit = self.cut_off_limit if not fulldiff else None
 
-        _diff = diffs.differ(org_repo, org_ref, other_repo, other_ref,
-                             discovery_data,
-                             remote_compare=incoming_changesets)
-
-        diff_processor = diffs.DiffProcessor(_diff or '', format='gitdiff',
-                                             diff_limit=diff_limit)
-        _parsed = diff_processor.prepare()
-
-        c.limited_diff = False
-        if isinstance(_parsed, LimitedDiffContainer):
-            c.limited_diff = True
+        get_diff = lambda: diffs.differ(org_repo, org_ref, other_repo,
+                                        other_ref, discovery_data,
+                                        remote_compare=incoming_changesets)
+        key = diffs.differ_key(org_repo, org_ref, other_repo, other_ref,
+                               remote_compare=incoming_changesets)
+        c.limited_diff, _parsed = diffs.get_rendered_diff(get_diff, key,
+                                                          diff_limit=diff_limit)
 
         c.files = []
         c.changes = {}
@@ -175,7 +170,6 @@ class CompareController(BaseRepoController):
                 c.lines_deleted += st[1]
             fid = h.FID('', f['filename'])
             c.files.append([fid, f['operation'], f['filename'], f['stats']])
-            diff = diff_processor.as_html(enable_comments=False, parsed_lines=[f])
-            c.changes[fid] = [f['operation'], f['filename'], diff]
+            c.changes[fid] = [f['operation'], f['filename'], f['html']]
 
         return render('compare/compare_diff.html')
@@ -129,7 +129,8 @@ class FeedController(BaseRepoController):
                  ttl=self.ttl
             )
 
-            for cs in reversed(list(c.rhodecode_repo[-self.feed_nr:])):
+            for cs in reversed(c.rhodecode_repo.get_changesets_bulk(
+                    c.rhodecode_repo.revisions[-self.feed_nr:])):
                 feed.add_item(title=self._get_title(cs),
                               link=url('changeset_home', repo_name=repo_name,
                                        revision=cs.raw_id, qualified=True),
@@ -142,10 +143,10 @@ class FeedController(BaseRepoController):
             return feed.writeString('utf-8')
 
         key = repo_name + '_ATOM'
-        inv = CacheInvalidation.invalidate(key)
-        if inv is not None:
+        version = CacheInvalidation.invalidate(key)
+        if version is not None:
             region_invalidate(_get_feed_from_cache, None, key)
-            CacheInvalidation.set_valid(inv.cache_key)
+            CacheInvalidation.set_valid(key, version)
         return _get_feed_from_cache(key)
 
     def rss(self, repo_name):
@@ -162,7 +163,8 @@ class FeedController(BaseRepoController):
                 ttl=self.ttl
             )
 
-            for cs in reversed(list(c.rhodecode_repo[-self.feed_nr:])):
+            for cs in reversed(c.rhodecode_repo.get_changesets_bulk(
+                    c.rhodecode_repo.revisions[-self.feed_nr:])):
                 feed.add_item(title=self._get_title(cs),
                               link=url('changeset_home', repo_name=repo_name,
                                        revision=cs.raw_id, qualified=True),
@@ -175,8 +177,8 @@ class FeedController(BaseRepoController):
             return feed.writeString('utf-8')
 
         key = repo_name + '_RSS'
-        inv = CacheInvalidation.invalidate(key)
-        if inv is not None:
+        version = CacheInvalidation.invalidate(key)
+        if version is not None:
             region_invalidate(_get_feed_from_cache, None, key)
-            CacheInvalidation.set_valid(inv.cache_key)
+            CacheInvalidation.set_valid(key, version)
         return _get_feed_from_cache(key)
@@ -28,13 +28,14 @@ import logging
 import traceback
 import tempfile
 
-from pylons import request, response, tmpl_context as c, url
+from pylons import request, response, config, tmpl_context as c, url
 from pylons.i18n.translation import _
 from pylons.controllers.util import redirect
 from rhodecode.lib.utils import jsonify
 
 from rhodecode.lib import diffs
 from rhodecode.lib import helpers as h
+from rhodecode.lib.archive_store import get_archive_store
 
 from rhodecode.lib.compat import OrderedDict
 from rhodecode.lib.utils2 import convert_line_endings, detect_mode, safe_str,\
@@ -418,26 +419,83 @@ class FilesController(BaseRepoController):
         except (ImproperArchiveTypeError, KeyError):
             return _('Unknown archive type')
 
-        fd, archive = tempfile.mkstemp()
-        t = open(archive, 'wb')
-        cs.fill_archive(stream=t, kind=fileformat, subrepos=subrepos)
-        t.close()
+        def fill(stream):
+            cs.fill_archive(stream=stream, kind=fileformat, subrepos=subrepos)
 
-        def get_chunked_archive(archive):
-            stream = open(archive, 'rb')
+        response.content_disposition = str('attachment; filename=%s-%s%s' \
+                                           % (repo_name, revision[:12], ext))
+        response.content_type = str(content_type)
+
+        # archive of a changeset never changes, it's built once for all
+        # downloads
+        key = (repo_name, cs.raw_id, fileformat, subrepos)
+        store = get_archive_store()
+        archive = None
+        if store is not None:
+            archive = store.get(key)
+
+        if archive is None and not subrepos:
+            # sent while it's being built, it's stored at the same time
+            chunks = cs.iter_archive(kind=fileformat)
+            if store is not None:
+                chunks = store.iter_create(key, chunks)
+            response.app_iter = chunks
+            return
+
+        if archive is None:
+            # subrepositories are archived only by the backend
+            if store is None:
+                fd, archive = tempfile.mkstemp()
+                os.close(fd)
+                t = open(archive, 'wb')
+                try:
+                    fill(t)
+                finally:
+                    t.close()
+                self._send_archive(archive, remove=True)
+                return
+            archive = store.create(key, fill)
+
+        header = config.get('archive_sendfile_header')
+        if header:
+            # front-end server sends the file
+            if header.lower() == 'x-accel-redirect':
+                location = config.get('archive_accel_redirect_location', '')
+                value = '%s/%s' % (location.rstrip('/'), store.get_name(key))
+            else:
+                value = archive
+            response.headers[str(header)] = safe_str(value)
+            return ''
+        self._send_archive(archive)
+
+    def _send_archive(self, archive, remove=False):
+        """
+        Makes response send content of archive file, using file wrapper of
+        the server when it's available
+
+        :param remove: removes the file once it's sent
+        """
+        size = os.path.getsize(archive)
+        stream = open(archive, 'rb')
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and not remove:
+            response.app_iter = file_wrapper(stream, 64 * 1024)
+        else:
+            response.app_iter = self._iter_archive(stream, archive, remove)
+        # setting app_iter resets content length
+        response.content_length = size
+
+    def _iter_archive(self, stream, archive, remove):
+        try:
             while True:
-                data = stream.read(16 * 1024)
+                data = stream.read(64 * 1024)
                 if not data:
-                    stream.close()
-                    os.close(fd)
-                    os.remove(archive)
                     break
                 yield data
-
-        response.content_disposition = str('attachment; filename=%s-%s%s' \
-                                           % (repo_name, revision[:12], ext))
-        response.content_type = str(content_type)
-        return get_chunked_archive(archive)
+        finally:
+            stream.close()
+            if remove:
+                os.remove(archive)
 
     @LoginRequired()
     @HasRepoPermissionAnyDecorator('repository.read', 'repository.write',
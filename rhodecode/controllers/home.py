@@ -25,23 +25,24 @@
 
 import logging
 
-from pylons import tmpl_context as c, request
-from pylons.i18n.translation import _
-from webob.exc import HTTPBadRequest
+from pylons import tmpl_context as c, request, response
+from webob.exc import HTTPBadRequest, HTTPNotFound
 
-import rhodecode
-from rhodecode.lib import helpers as h
 from rhodecode.lib.ext_json import json
-from rhodecode.lib.auth import LoginRequired
+from rhodecode.lib.auth import LoginRequired, HasReposGroupPermissionAny
 from rhodecode.lib.base import BaseController, render
-from rhodecode.model.db import Repository
-from sqlalchemy.sql.expression import func
+from rhodecode.lib.utils2 import safe_int
+from rhodecode.model.db import Repository, RepoGroup
+from rhodecode.model.repo import RepoModel
 
 log = logging.getLogger(__name__)
 
 
 class HomeController(BaseController):
 
+    # max number of repositories returned in one page of repos_data
+    MAX_DASHBOARD_ITEMS = 1000
+
     @LoginRequired()
     def __before__(self):
         super(HomeController, self).__before__()
@@ -50,62 +51,50 @@ class HomeController(BaseController):
         c.groups = self.scm_model.get_repos_groups()
         c.group = None
 
+        ## lightweight version of dashboard fetches repositories page by
+        ## page from repos_data
         if c.visual.lightweight_dashboard is False:
             c.repos_list = self.scm_model.get_repos()
-        ## lightweight version of dashboard
-        else:
-            c.repos_list = Repository.query()\
-                            .filter(Repository.group_id == None)\
-                            .order_by(func.lower(Repository.repo_name))\
-                            .all()
-            repos_data = []
-            total_records = len(c.repos_list)
-
-            _tmpl_lookup = rhodecode.CONFIG['pylons.app_globals'].mako_lookup
-            template = _tmpl_lookup.get_template('data_table/_dt_elements.html')
-
-            quick_menu = lambda repo_name: (template.get_def("quick_menu")
-                                            .render(repo_name, _=_, h=h, c=c))
-            repo_lnk = lambda name, rtype, private, fork_of: (
-                template.get_def("repo_name")
-                .render(name, rtype, private, fork_of, short_name=False,
-                        admin=False, _=_, h=h, c=c))
-            last_change = lambda last_change:  (template.get_def("last_change")
-                                           .render(last_change, _=_, h=h, c=c))
-            rss_lnk = lambda repo_name: (template.get_def("rss")
-                                           .render(repo_name, _=_, h=h, c=c))
-            atom_lnk = lambda repo_name: (template.get_def("atom")
-                                           .render(repo_name, _=_, h=h, c=c))
-
-            def desc(desc):
-                if c.visual.stylify_metatags:
-                    return h.urlify_text(h.desc_stylize(h.truncate(desc, 60)))
-                else:
-                    return h.urlify_text(h.truncate(desc, 60))
-
-            for repo in c.repos_list:
-                repos_data.append({
-                    "menu": quick_menu(repo.repo_name),
-                    "raw_name": repo.repo_name.lower(),
-                    "name": repo_lnk(repo.repo_name, repo.repo_type,
-                                     repo.private, repo.fork),
-                    "last_change": last_change(repo.last_db_change),
-                    "desc": desc(repo.description),
-                    "owner": h.person(repo.user.username),
-                    "rss": rss_lnk(repo.repo_name),
-                    "atom": atom_lnk(repo.repo_name),
-                })
-
-            c.data = json.dumps({
-                "totalRecords": total_records,
-                "startIndex": 0,
-                "sort": "name",
-                "dir": "asc",
-                "records": repos_data
-            })
 
         return render('/index.html')
 
+    def repos_data(self):
+        """
+        Returns JSON page of repositories for lightweight dashboard data
+        table. Accepts startIndex, results, sort, dir and filter params
+        of data table, and optional group_id to list repositories of a group
+        """
+        group_id = safe_int(request.GET.get('group_id'))
+        if group_id is not None:
+            group = RepoGroup.get_or_404(group_id)
+            if not HasReposGroupPermissionAny('group.read', 'group.write',
+                                              'group.admin')(group.group_name,
+                                                             'repos data'):
+                raise HTTPNotFound()
+
+        start = max(safe_int(request.GET.get('startIndex'), 0), 0)
+        limit = safe_int(request.GET.get('results'),
+                         c.visual.lightweight_dashboard_items)
+        limit = min(max(limit, 1), self.MAX_DASHBOARD_ITEMS)
+        sort_key = request.GET.get('sort', 'name')
+        if sort_key not in RepoModel.SORT_COLUMNS:
+            sort_key = 'name'
+        sort_dir = request.GET.get('dir') == 'desc' and 'desc' or 'asc'
+
+        total, repos_list = RepoModel().get_repos_page(
+            self.rhodecode_user, group_id=group_id, start=start, limit=limit,
+            sort_key=sort_key, sort_dir=sort_dir,
+            name_filter=request.GET.get('filter'))
+
+        response.content_type = 'application/json'
+        return json.dumps({
+            "totalRecords": total,
+            "startIndex": start,
+            "sort": sort_key,
+            "dir": sort_dir,
+            "records": RepoModel().get_repos_as_dict(repos_list)
+        })
+
     def repo_switcher(self):
         if request.is_xhr:
             all_repos = Repository.query().order_by(Repository.repo_name).all()
@@ -43,7 +43,6 @@ from rhodecode.lib import diffs
 from rhodecode.lib.utils import action_logger, jsonify
 from rhodecode.lib.vcs.exceptions import EmptyRepositoryError
 from rhodecode.lib.vcs.backends.base import EmptyChangeset
-from rhodecode.lib.diffs import LimitedDiffContainer
 from rhodecode.model.db import User, PullRequest, ChangesetStatus,\
     ChangesetComment
 from rhodecode.model.pull_request import PullRequestModel
@@ -309,15 +308,11 @@ class PullrequestsController(BaseRepoController):
         diff_limit = self.cut_off_limit if not fulldiff else None
 
         #we swap org/other ref since we run a simple diff on one repo
-        _diff = diffs.differ(org_repo, other_ref, other_repo, org_ref)
-
-        diff_processor = diffs.DiffProcessor(_diff or '', format='gitdiff',
-                                             diff_limit=diff_limit)
-        _parsed = diff_processor.prepare()
-
-        c.limited_diff = False
-        if isinstance(_parsed, LimitedDiffContainer):
-            c.limited_diff = True
+        get_diff = lambda: diffs.differ(org_repo, other_ref, other_repo,
+                                        org_ref)
+        key = diffs.differ_key(org_repo, other_ref, other_repo, org_ref)
+        c.limited_diff, _parsed = diffs.get_rendered_diff(get_diff, key,
+            diff_limit=diff_limit, enable_comments=enable_comments)
 
         c.files = []
         c.changes = {}
@@ -330,9 +325,7 @@ class PullrequestsController(BaseRepoController):
                 c.lines_deleted += st[1]
             fid = h.FID('', f['filename'])
             c.files.append([fid, f['operation'], f['filename'], f['stats']])
-            diff = diff_processor.as_html(enable_comments=enable_comments,
-                                          parsed_lines=[f])
-            c.changes[fid] = [f['operation'], f['filename'], diff]
+            c.changes[fid] = [f['operation'], f['filename'], f['html']]
 
     def show(self, repo_name, pull_request_id):
         repo_model = RepoModel()
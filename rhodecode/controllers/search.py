@@ -22,6 +22,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+import time
 import logging
 import traceback
 import urllib
@@ -31,14 +32,16 @@ from pylons import request, config, tmpl_context as c
 from rhodecode.lib.auth import LoginRequired
 from rhodecode.lib.base import BaseController, render
 from rhodecode.lib.indexers import CHGSETS_SCHEMA, SCHEMA, CHGSET_IDX_NAME, \
-    IDX_NAME, WhooshResultWrapper
+    IDX_NAME, WhooshResultWrapper, split_content_query, get_searcher, \
+    get_index_version
+from rhodecode.lib.search_cache import CachedPage, get_search_cache
 
 from webhelpers.paginate import Page
 from webhelpers.util import update_params
 
-from whoosh.index import open_dir, EmptyIndexError
+from whoosh.index import EmptyIndexError
 from whoosh.qparser import QueryParser, QueryParserError
-from whoosh.query import Phrase, Wildcard, Term, Prefix
+from whoosh.query import Phrase, Wildcard, Term, Prefix, Every
 from rhodecode.model.repo import RepoModel
 from rhodecode.lib.utils2 import safe_str, safe_int
 
@@ -52,6 +55,43 @@ class SearchController(BaseController):
     def __before__(self):
         super(SearchController, self).__before__()
 
+    def _search(self, index_dir, index_name, schema_defn, search_type,
+                cur_query):
+        """
+        Parses the query and returns lazy list of its results
+
+        :raise QueryParserError: if query can't be parsed
+        """
+        searcher = get_searcher(index_dir, index_name)
+        highlight_items = set()
+        qp = QueryParser(search_type, schema=schema_defn)
+        if c.repo_name:
+            cur_query = u'repository:%s %s' % (c.repo_name, cur_query)
+        query = qp.parse(unicode(cur_query))
+        # extract words for highlight
+        if isinstance(query, Phrase):
+            highlight_items.update(query.words)
+        elif isinstance(query, Prefix):
+            highlight_items.add(query.text)
+        else:
+            for i in query.all_terms():
+                if i[0] in ['content', 'message']:
+                    highlight_items.add(i[1])
+
+        path_filter = None
+        if search_type == 'content':
+            # content lives in blob documents shared by paths
+            query, path_filter = split_content_query(query)
+            if query is None:
+                query = Every('blob')
+
+        log.debug('query: %s' % query)
+        log.debug('path filter: %s' % path_filter)
+        log.debug('hl terms: %s' % highlight_items)
+        return WhooshResultWrapper(search_type, searcher, query,
+                                   highlight_items, RepoModel().repos_path,
+                                   path_filter)
+
     def index(self, search_repo=None):
         c.repo_name = search_repo
         c.formated_results = []
@@ -85,54 +125,46 @@ class SearchController(BaseController):
 
         if c.cur_query:
             p = safe_int(request.params.get('page', 1), 1)
-            highlight_items = set()
             try:
-                idx = open_dir(config['app_conf']['index_dir'],
-                               indexname=index_name)
-                searcher = idx.searcher()
-
-                qp = QueryParser(search_type, schema=schema_defn)
-                if c.repo_name:
-                    cur_query = u'repository:%s %s' % (c.repo_name, cur_query)
+                index_dir = config['app_conf']['index_dir']
+                start = time.time()
+                # page of results is valid as long as the index doesn't
+                # change
+                cache = get_search_cache()
+                cache_key = (index_name,
+                             get_index_version(index_dir, index_name),
+                             search_type, u' '.join(cur_query.split()),
+                             c.repo_name, p)
+                cached = cache.get(cache_key) if cache is not None else None
                 try:
-                    query = qp.parse(unicode(cur_query))
-                    # extract words for highlight
-                    if isinstance(query, Phrase):
-                        highlight_items.update(query.words)
-                    elif isinstance(query, Prefix):
-                        highlight_items.add(query.text)
+                    if cached is None:
+                        results = self._search(index_dir, index_name,
+                                               schema_defn, search_type,
+                                               cur_query)
                     else:
-                        for i in query.all_terms():
-                            if i[0] in ['content', 'message']:
-                                highlight_items.add(i[1])
-
-                    matcher = query.matcher(searcher)
-
-                    log.debug('query: %s' % query)
-                    log.debug('hl terms: %s' % highlight_items)
-                    results = searcher.search(query)
+                        results = CachedPage(*cached)
                     res_ln = len(results)
                     c.runtime = '%s results (%.3f seconds)' % (
-                        res_ln, results.runtime
+                        res_ln, time.time() - start
                     )
 
                     def url_generator(**kw):
                         q = urllib.quote(safe_str(c.cur_query))
                         return update_params("?q=%s&type=%s" \
                         % (q, safe_str(c.cur_type)), **kw)
-                    repo_location = RepoModel().repos_path
                     c.formated_results = Page(
-                        WhooshResultWrapper(search_type, searcher, matcher,
-                                            highlight_items, repo_location),
+                        results,
                         page=p,
                         item_count=res_ln,
                         items_per_page=10,
                         url=url_generator
                     )
+                    if cached is None and cache is not None:
+                        cache.set(cache_key,
+                                  (res_ln, list(c.formated_results.items)))
 
                 except QueryParserError:
                     c.runtime = _('Invalid search query. Try quoting it.')
-                searcher.close()
             except (EmptyIndexError, IOError):
                 log.error(traceback.format_exc())
                 log.error('Empty Index data')
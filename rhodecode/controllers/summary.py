@@ -223,10 +223,10 @@ class SummaryController(BaseRepoController):
             return readme_data, readme_file
 
         key = repo_name + '_README'
-        inv = CacheInvalidation.invalidate(key)
-        if inv is not None:
+        version = CacheInvalidation.invalidate(key)
+        if version is not None:
             region_invalidate(_get_readme_from_cache, None, key)
-            CacheInvalidation.set_valid(inv.cache_key)
+            CacheInvalidation.set_valid(key, version)
         return _get_readme_from_cache(key)
 
     def _get_download_links(self, repo):
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.archive_store
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Size bounded on disk store of downloadable repository archives
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import logging
+
+try:
+    import fcntl
+except ImportError:
+    # windows, same archive can be built by several requests at once there
+    fcntl = None
+
+import rhodecode
+from rhodecode.lib.utils2 import safe_int
+from rhodecode.lib.disk_store import DiskStore
+
+log = logging.getLogger(__name__)
+
+
+class ArchiveStore(DiskStore):
+    """
+    Keeps archives of changesets in files named by hash of their key, so
+    each archive is built only once no matter how many times it's
+    downloaded. Archive of given changeset never changes, entries are only
+    removed, least recently used first, when size of the store grows over
+    ``max_size`` bytes.
+    """
+
+    def get(self, key):
+        """
+        Returns path of archive stored under ``key`` or ``None``
+        """
+        path = self._get_path(key)
+        if not self._touch(path):
+            return None
+        return path
+
+    def create(self, key, fill):
+        """
+        Returns path of archive stored under ``key``, it's written by
+        ``fill`` called with a file opened for writing if it's not stored
+        yet. Concurrent requests of the same archive wait until it's built
+        by the first one.
+        """
+        path = self.get(key)
+        if path is not None:
+            return path
+
+        path = self._get_path(key)
+        self._makedirs(os.path.dirname(path))
+        lock_file = open(path + '.lock', 'ab')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            if self.get(key) is not None:
+                log.debug('archive %s was built concurrently' % path)
+                return path
+            self._write(path, fill)
+        finally:
+            # closing the file releases the lock
+            lock_file.close()
+        return path
+
+    def iter_create(self, key, chunks):
+        """
+        Yields given ``chunks`` of archive and stores them under ``key`` at
+        the same time, archive is stored once it's read whole. When the same
+        archive is being stored by another request, chunks are only yielded,
+        nobody waits for archive being built. ``chunks`` are closed at the
+        end, if they can be.
+        """
+        try:
+            for chunk in self._iter_create(key, chunks):
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _iter_create(self, key, chunks):
+        path = self._get_path(key)
+        self._makedirs(os.path.dirname(path))
+        lock_file = open(path + '.lock', 'ab')
+        try:
+            locked = True
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(),
+                                fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except IOError:
+                    locked = False
+            if not locked or self.get(key) is not None:
+                log.debug('archive %s is stored by other request' % path)
+                for chunk in chunks:
+                    yield chunk
+                return
+
+            fd, tmp_path = self._mkstemp(path)
+            f = os.fdopen(fd, 'wb')
+            stored = False
+            try:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+                f.close()
+                os.rename(tmp_path, path)
+                stored = True
+            finally:
+                if not stored:
+                    # failed or not read whole
+                    f.close()
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+        finally:
+            lock_file.close()
+
+        self._added(path, os.path.getsize(path))
+
+    def _remove(self, path):
+        if not super(ArchiveStore, self)._remove(path):
+            return False
+        try:
+            os.remove(path + '.lock')
+        except OSError:
+            pass
+        return True
+
+
+_store = None
+
+
+def get_archive_store():
+    """
+    Returns archive store configured by ``archive_cache_size`` (in megabytes)
+    kept in ``cache_dir``, or ``None`` if it's disabled
+    """
+    global _store
+    if _store is None:
+        conf = rhodecode.CONFIG
+        cache_dir = conf.get('app_conf', {}).get('cache_dir')
+        max_size = safe_int(conf.get('archive_cache_size', 1024), 1024)
+        if cache_dir and max_size > 0:
+            _store = ArchiveStore(os.path.join(cache_dir, 'archives'),
+                                  max_size * 1024 * 1024)
+        else:
+            _store = False
+    return _store or None
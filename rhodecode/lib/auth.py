@@ -326,6 +326,8 @@ class  AuthUser(object):
         self.admin = False
         self.inherit_default_permissions = False
         self.permissions = {}
+        # filled together with user data when possible
+        self.unread_notifications = None
         self._api_key = api_key
         self.propagate_data()
         self._instance = None
@@ -374,7 +376,7 @@ class  AuthUser(object):
             self.username = 'None'
 
         log.debug('Auth User is now %s' % self)
-        user_model.fill_perms(self)
+        user_model.fill_perms(self, cache=True)
 
     @property
     def is_admin(self):
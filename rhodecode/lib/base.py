@@ -242,7 +242,7 @@ class BaseController(WSGIController):
         c.ga_code = config.get('rhodecode_ga_code')
         # Visual options
         c.visual = AttributeDict({})
-        rc_config = RhodeCodeSetting.get_app_settings()
+        rc_config = RhodeCodeSetting.get_cached_app_settings()
 
         c.visual.show_public_icon = str2bool(rc_config.get('rhodecode_show_public_icon'))
         c.visual.show_private_icon = str2bool(rc_config.get('rhodecode_show_private_icon'))
@@ -252,7 +252,9 @@ class BaseController(WSGIController):
 
         c.repo_name = get_repo_slug(request)
         c.backends = BACKENDS.keys()
-        c.unread_notifications = NotificationModel()\
+        c.unread_notifications = c.rhodecode_user.unread_notifications
+        if c.unread_notifications is None:
+            c.unread_notifications = NotificationModel()\
                         .get_unread_cnt_for_user(c.rhodecode_user.user_id)
         self.cut_off_limit = int(config.get('cut_off_limit'))
 
@@ -266,6 +268,7 @@ class BaseController(WSGIController):
         # the request is routed to. This routing information is
         # available in environ['pylons.routes_dict']
         start = time.time()
+        meta.query_counter.reset()
         try:
             self.ip_addr = _get_ip_addr(environ)
             # make sure that we update permissions each time we call controller
@@ -286,9 +289,10 @@ class BaseController(WSGIController):
             )
             return WSGIController.__call__(self, environ, start_response)
         finally:
-            log.info('IP: %s Request to %s time: %.3fs' % (
+            log.info('IP: %s Request to %s time: %.3fs queries: %s' % (
                 _get_ip_addr(environ),
-                safe_unicode(_get_access_path(environ)), time.time() - start)
+                safe_unicode(_get_access_path(environ)), time.time() - start,
+                meta.query_counter.count)
             )
             meta.Session.remove()
 
@@ -310,8 +314,8 @@ class BaseRepoController(BaseController):
 
             dbr = c.rhodecode_db_repo = Repository.get_by_repo_name(c.repo_name)
             c.rhodecode_repo = c.rhodecode_db_repo.scm_instance
-            # update last change according to VCS data
-            dbr.update_last_change(c.rhodecode_repo.last_change)
+            # last change is updated by push hooks and rescan, viewing
+            # repository doesn't write anything
             if c.rhodecode_repo is None:
                 log.error('%s this repository is present in database but it '
                           'cannot be created as an scm instance', c.repo_name)
@@ -319,6 +323,5 @@ class BaseRepoController(BaseController):
                 redirect(url('home'))
 
             # some globals counter for menu
-            c.repository_followers = self.scm_model.get_followers(dbr)
-            c.repository_forks = self.scm_model.get_forks(dbr)
-            c.repository_pull_requests = self.scm_model.get_pull_requests(dbr)
+            (c.repository_followers, c.repository_forks,
+             c.repository_pull_requests) = self.scm_model.get_counters(dbr)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.cache_versions
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    File backed store of repository cache versions
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import logging
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # windows, writers are not serialized between processes there
+    fcntl = None
+
+from rhodecode.lib.utils2 import safe_str, safe_unicode
+
+log = logging.getLogger(__name__)
+
+
+class FileVersionStore(object):
+    """
+    Keeps monotonically increasing cache versions of all repositories in
+    a single file, so readers get all of them with one read. File is parsed
+    again only when it changed on disk, writers serialize on a lock file and
+    replace whole file atomically.
+
+    Each line of the file is a version followed by a repository name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self._lock = threading.Lock()
+        self._stat = None
+        self._versions = {}
+
+    def __repr__(self):
+        return '<%s at %s>' % (self.__class__.__name__, self.path)
+
+    def _get_stat(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_mtime, st.st_size
+
+    def _read(self):
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return {}
+        try:
+            data = f.read()
+        finally:
+            f.close()
+
+        versions = {}
+        for line in data.splitlines():
+            try:
+                version, repo_name = line.split(' ', 1)
+                versions[safe_unicode(repo_name)] = int(version)
+            except ValueError:
+                log.warning('skipping malformed line %r in %s'
+                            % (line, self.path))
+        return versions
+
+    def _write(self, versions):
+        dirname = os.path.dirname(self.path)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                for repo_name, version in versions.iteritems():
+                    f.write('%s %s\n' % (version, safe_str(repo_name)))
+            finally:
+                f.close()
+            try:
+                os.rename(tmp_path, self.path)
+            except OSError:
+                # windows can't rename over existing file
+                os.remove(self.path)
+                os.rename(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_versions(self):
+        """
+        Returns dict of all repository names and their versions
+        """
+        stat = self._get_stat()
+        if stat != self._stat:
+            self._versions = self._read()
+            self._stat = stat
+        return self._versions
+
+    def get_version(self, repo_name):
+        return self.get_versions().get(safe_unicode(repo_name), 0)
+
+    def bump(self, repo_name):
+        """
+        Increments version of given repository and returns the new one
+        """
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(dirname):
+                    raise
+
+        repo_name = safe_unicode(repo_name)
+        self._lock.acquire()
+        try:
+            lock_file = open(self.lock_path, 'ab')
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                versions = self._read()
+                version = versions[repo_name] = versions.get(repo_name, 0) + 1
+                self._write(versions)
+            finally:
+                # closing the file releases the lock
+                lock_file.close()
+        finally:
+            self._lock.release()
+        log.debug('bumped cache version of %s to %s' % (repo_name, version))
+        return version
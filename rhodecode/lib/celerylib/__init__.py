@@ -41,6 +41,7 @@ from rhodecode.lib.pidlock import DaemonLock, LockHeld
 from rhodecode.model import init_model
 from rhodecode.model import meta
 from rhodecode.model.db import Statistics, Repository, User
+from rhodecode.model.permission import PermissionModel
 
 from sqlalchemy import engine_from_config
 
@@ -112,6 +113,7 @@ def get_session():
     if CELERY_ON:
         engine = engine_from_config(config, 'sqlalchemy.db1.')
         init_model(engine)
+        PermissionModel.track_changes()
     sa = meta.Session()
     return sa
 
@@ -23,12 +23,13 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-from celery.decorators import task
+from celery.decorators import task, periodic_task
 
 import os
 import traceback
 import logging
 from os.path import join as jn
+from datetime import timedelta
 
 from time import mktime
 from operator import itemgetter
@@ -40,7 +41,7 @@ from pylons.i18n.translation import _
 from rhodecode.lib.vcs import get_backend
 
 from rhodecode import CELERY_ON, CELERY_EAGER
-from rhodecode.lib.utils2 import safe_str
+from rhodecode.lib.utils2 import safe_str, safe_int
 from rhodecode.lib.celerylib import run_task, locked_task, dbsession, \
     str2bool, __get_lockkey, LockHeld, DaemonLock, get_session
 from rhodecode.lib.helpers import person
@@ -55,7 +56,7 @@ from rhodecode.model.scm import ScmModel
 
 add_cache(config)
 
-__all__ = ['whoosh_index', 'get_commits_stats',
+__all__ = ['whoosh_index', 'get_commits_stats', 'update_repo_sizes',
            'reset_user_password', 'send_email']
 
 
@@ -85,6 +86,21 @@ def whoosh_index(repo_location, full_index):
                          .run(full_index=full_index)
 
 
+@periodic_task(run_every=timedelta(hours=safe_int(
+                   config.get('repo_size_update_interval'), 24)),
+               ignore_result=True)
+@locked_task
+@dbsession
+def update_repo_sizes():
+    """
+    Measures sizes of all repositories on disk, pushes only add sizes of
+    pushed data to recorded ones, so they drift apart over time
+    """
+    log = get_logger(update_repo_sizes)
+    updated = ScmModel(get_session()).update_repo_sizes()
+    log.info('updated sizes of %s repositories' % updated)
+
+
 @task(ignore_result=True)
 @dbsession
 def get_commits_stats(repo_name, ts_min_y, ts_max_y):
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.clone_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Cache of packs and bundles sent to full clones of repositories
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import cgi
+import logging
+
+import rhodecode
+from rhodecode.lib.archive_store import ArchiveStore
+from rhodecode.lib.scm_registry import get_refs_stamp
+from rhodecode.lib.utils2 import safe_int
+
+log = logging.getLogger(__name__)
+
+# hex of mercurial's null revision
+HG_NULLID = '0' * 40
+
+
+def get_upload_pack_key(body):
+    """
+    Returns key of git upload-pack request of a full clone, made of its
+    pkt-lines without agent capability, or ``None`` if it's request of
+    fetch which already has some objects, or it can't be parsed.
+    Wanted objects are given by their ids, so response of the same request
+    never changes.
+
+    :param body: body of the request
+    """
+    lines = []
+    pos = 0
+    while pos < len(body):
+        try:
+            size = int(body[pos:pos + 4], 16)
+        except ValueError:
+            return None
+        if size == 0:
+            # flush packet
+            lines.append('')
+            pos += 4
+            continue
+        if size < 4 or pos + size > len(body):
+            return None
+        lines.append(body[pos + 4:pos + size].rstrip('\n'))
+        pos += size
+
+    wants = [l for l in lines if l.startswith('want ')]
+    if not wants or 'done' not in lines:
+        return None
+    for line in lines:
+        if line.startswith('have ') or line.startswith('shallow '):
+            return None
+    # version of client doesn't change what's sent to it
+    first = lines.index(wants[0])
+    lines[first] = ' '.join(w for w in wants[0].split(' ')
+                            if not w.startswith('agent='))
+    return '\n'.join(lines)
+
+
+def get_getbundle_key(environ):
+    """
+    Returns key of mercurial getbundle request of a full clone, made of its
+    arguments, or ``None`` if it's request of pull which already has some
+    changesets. Arguments are read from query string and ``X-HgArg``
+    headers the same way hgweb does.
+
+    :param environ: environ of the request
+    """
+    args = cgi.parse_qs(environ.get('QUERY_STRING', ''),
+                        keep_blank_values=True)
+    chunks = []
+    i = 1
+    while True:
+        h = environ.get('HTTP_X_HGARG_%s' % i)
+        if h is None:
+            break
+        chunks.append(h)
+        i += 1
+    args.update(cgi.parse_qs(''.join(chunks), keep_blank_values=True))
+
+    if args.get('cmd') != ['getbundle'] or not args.get('heads'):
+        return None
+    for common in args.get('common', ['']):
+        if [n for n in common.split() if n != HG_NULLID]:
+            return None
+    return tuple(sorted((k, tuple(v)) for k, v in args.items()))
+
+
+def get_repo_state(repo_name, repo_path):
+    """
+    Returns state of repository cached responses are valid for, made of its
+    id, its cache version and stamp of its refs, or ``None`` if it's not
+    in the database. Git and mercurial check wanted objects against current
+    refs, so responses stored for other refs are never sent again, they're
+    evicted as least recently used ones. Recreated repository gets new id.
+
+    :param repo_name: name of the repository
+    :param repo_path: full path of the repository
+    """
+    from rhodecode.model.db import Repository, CacheInvalidation
+    repo = Repository.get_by_repo_name(repo_name)
+    if repo is None:
+        return None
+    return (repo.repo_id, CacheInvalidation.get_version(repo_name),
+            get_refs_stamp(repo_path))
+
+
+def iter_file(path, chunk_size=64 * 1024):
+    f = open(path, 'rb')
+    try:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            yield data
+    finally:
+        f.close()
+
+
+def _iter_response(first, it, app_iter):
+    try:
+        if first:
+            yield first
+        for chunk in it:
+            yield chunk
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+def cache_response(store, key, app, environ, start_response):
+    """
+    Calls WSGI ``app`` and stores its successful response under ``key`` in
+    ``store`` while it's sent to the client
+    """
+    status = []
+
+    def _start_response(response_status, headers, exc_info=None):
+        status.append(response_status)
+        return start_response(response_status, headers, exc_info)
+
+    app_iter = app(environ, _start_response)
+    # applications written as generators start the response with their
+    # first chunk
+    it = iter(app_iter)
+    try:
+        first = it.next()
+    except StopIteration:
+        first = None
+    chunks = _iter_response(first, it, app_iter)
+    if first is not None and status and status[0].startswith('200'):
+        return store.iter_create(key, chunks)
+    return chunks
+
+
+_cache = None
+
+
+def get_clone_cache():
+    """
+    Returns store of packs and bundles sent to full clones, configured by
+    ``clone_cache_size`` (in megabytes) and kept in ``cache_dir``, or
+    ``None`` if it's disabled
+    """
+    global _cache
+    if _cache is None:
+        conf = rhodecode.CONFIG
+        cache_dir = conf.get('app_conf', {}).get('cache_dir')
+        max_size = safe_int(conf.get('clone_cache_size', 1024), 1024)
+        if cache_dir and max_size > 0:
+            _cache = ArchiveStore(os.path.join(cache_dir, 'clones'),
+                                  max_size * 1024 * 1024)
+        else:
+            _cache = False
+    return _cache or None
@@ -286,6 +286,12 @@ class DbManage(object):
                            'Please validate and check default permissions '
                            'in admin panel')
 
+            def step_10(self):
+                pass
+
+            def step_11(self):
+                pass
+
         upgrade_steps = [0] + range(curr_version + 1, __dbversion__ + 1)
 
         # CALL THE PROPER ORDER OF STEPS TO PERFORM FULL UPGRADE
@@ -0,0 +1,41 @@
+import logging
+import datetime
+
+from sqlalchemy import *
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import relation, backref, class_mapper, joinedload
+from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.declarative import declarative_base
+
+from rhodecode.lib.dbmigrate.migrate import *
+from rhodecode.lib.dbmigrate.migrate.changeset import *
+
+from rhodecode.model.meta import Base
+from rhodecode.model import meta
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    """
+    Upgrade operations go here.
+    Don't create your own engine; bind migrate_engine to your metadata
+    """
+    #==========================================================================
+    # CACHE INVALIDATION
+    #==========================================================================
+    tbl = Table('cache_invalidation', MetaData(bind=migrate_engine),
+                autoload=True, autoload_with=migrate_engine)
+    cache_version = Column("cache_version", Integer(), nullable=True,
+                           unique=None, default=0)
+    # create cache_version column
+    cache_version.create(table=tbl, populate_default=True)
+
+    # caches are versioned per repository now, old per key entries are not
+    # used anymore
+    tbl.delete().execute()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
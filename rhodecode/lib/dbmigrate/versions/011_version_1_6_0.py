@@ -0,0 +1,53 @@
+import logging
+import datetime
+
+from sqlalchemy import *
+from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm import relation, backref, class_mapper, joinedload
+from sqlalchemy.orm.session import Session
+from sqlalchemy.ext.declarative import declarative_base
+
+from rhodecode.lib.dbmigrate.migrate import *
+from rhodecode.lib.dbmigrate.migrate.changeset import *
+
+from rhodecode.model.meta import Base
+from rhodecode.model import meta
+
+log = logging.getLogger(__name__)
+
+
+def upgrade(migrate_engine):
+    """
+    Upgrade operations go here.
+    Don't create your own engine; bind migrate_engine to your metadata
+    """
+    #==========================================================================
+    # REPOSITORY SUMMARY
+    #==========================================================================
+    meta = MetaData(bind=migrate_engine)
+    # repositories table is needed to resolve the foreign key
+    Table('repositories', meta, autoload=True, autoload_with=migrate_engine)
+    tbl = Table('repository_summary', meta,
+        Column("summary_id", Integer(), nullable=False, unique=True,
+               default=None, primary_key=True),
+        Column("repository_id", Integer(),
+               ForeignKey('repositories.repo_id'), nullable=False,
+               unique=True, default=None),
+        Column("tip_id", String(40), nullable=False),
+        Column("tip_revision", Integer(), nullable=False),
+        Column("tip_message", UnicodeText(25000), nullable=True),
+        Column("tip_author", Unicode(255), nullable=True),
+        Column("last_change", DateTime(timezone=False), nullable=True),
+        Column("size", BigInteger(), nullable=True),
+        Column("cache_version", Integer(), nullable=True, default=0),
+        UniqueConstraint('repository_id'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8',
+    )
+    # rows are filled in by next repository rescan, or on first dashboard view
+    tbl.create()
+
+
+def downgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.diff_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Size bounded on disk cache of parsed and rendered diffs
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import zlib
+import logging
+import traceback
+import cPickle as pickle
+
+import rhodecode
+from rhodecode.lib.utils2 import safe_int
+from rhodecode.lib.disk_store import DiskStore
+
+log = logging.getLogger(__name__)
+
+
+class DiffCache(DiskStore):
+    """
+    Keeps values in compressed files named by hash of their key. Diffs
+    between immutable changesets never change, so entries are never
+    invalidated, least recently used ones are removed when size of the cache
+    grows over ``max_size`` bytes.
+    """
+
+    def get(self, key):
+        """
+        Returns value stored under ``key`` or ``None`` if it's not cached
+        """
+        path = self._get_path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                value = pickle.loads(zlib.decompress(f.read()))
+            except Exception:
+                log.error(traceback.format_exc())
+                return None
+        finally:
+            f.close()
+        self._touch(path)
+        return value
+
+    def set(self, key, value):
+        data = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        if len(data) > self.max_size * (1 - self.EVICT_TO):
+            log.debug('not caching %s bytes long entry' % len(data))
+            return
+        try:
+            self._write(self._get_path(key), lambda f: f.write(data))
+        except EnvironmentError:
+            log.error(traceback.format_exc())
+
+
+_cache = None
+
+
+def get_diff_cache():
+    """
+    Returns diff cache configured by ``diff_cache_size`` (in megabytes) kept
+    in ``cache_dir``, or ``None`` if it's disabled
+    """
+    global _cache
+    if _cache is None:
+        conf = rhodecode.CONFIG
+        cache_dir = conf.get('app_conf', {}).get('cache_dir')
+        max_size = safe_int(conf.get('diff_cache_size', 256), 256)
+        if cache_dir and max_size > 0:
+            _cache = DiffCache(os.path.join(cache_dir, 'diffs'),
+                               max_size * 1024 * 1024)
+        else:
+            _cache = False
+    return _cache or None
@@ -30,7 +30,7 @@ import difflib
 import logging
 import traceback
 
-from itertools import tee, imap
+from itertools import tee, imap, chain
 
 from mercurial import patch
 from mercurial.mdiff import diffopts
@@ -38,6 +38,7 @@ from mercurial.bundlerepo import bundlerepository
 
 from pylons.i18n.translation import _
 
+import rhodecode
 from rhodecode.lib.compat import BytesIO
 from rhodecode.lib.vcs.utils.hgcompat import localrepo
 from rhodecode.lib.vcs.exceptions import VCSError
@@ -46,9 +47,12 @@ from rhodecode.lib.vcs.backends.base import EmptyChangeset
 from rhodecode.lib.helpers import escape
 from rhodecode.lib.utils import make_ui
 from rhodecode.lib.utils2 import safe_unicode
+from rhodecode.lib.diff_cache import get_diff_cache
 
 log = logging.getLogger(__name__)
 
+_raw_id_re = re.compile(r'^[0-9a-fA-F]{40}$')
+
 
 def wrap_to_table(str_):
     return '''<table class="code-difftable">
@@ -154,11 +158,82 @@ class LimitedDiffContainer(object):
             yield l
 
 
+def iter_lines(diff):
+    """
+    Yields lines of given diff keeping their line endings. Diff can be a
+    string or any iterable of string chunks (like output of a subprocess),
+    it's read only as far as lines are consumed
+    """
+    if isinstance(diff, basestring):
+        diff = [diff]
+    pending = ''
+    for chunk in diff:
+        start = 0
+        end = chunk.find('\n')
+        while end != -1:
+            if pending:
+                yield pending + chunk[start:end + 1]
+                pending = ''
+            else:
+                yield chunk[start:end + 1]
+            start = end + 1
+            end = chunk.find('\n', start)
+        pending += chunk[start:]
+    if pending:
+        yield pending
+
+
+class LineReader(object):
+    """
+    Iterator over diff lines which can look at the next line without
+    consuming it
+    """
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._next = None
+
+    def __iter__(self):
+        return self
+
+    def peek(self):
+        """
+        Returns next line without consuming it or ``None`` at the end
+        """
+        if self._next is None:
+            try:
+                self._next = self._lines.next()
+            except StopIteration:
+                return None
+        return self._next
+
+    def next(self):
+        line = self.peek()
+        if line is None:
+            raise StopIteration
+        self._next = None
+        return line
+
+    def until(self, prefix):
+        """
+        Yields lines up to the one starting with ``prefix``, which is left
+        unconsumed
+        """
+        while True:
+            line = self.peek()
+            if line is None or line.startswith(prefix):
+                return
+            yield self.next()
+
+
 class DiffProcessor(object):
     """
     Give it a unified or git diff and it returns a list of the files that were
     mentioned in the diff together with a dict of meta information that
     can be used to render it in a HTML template.
+
+    Diff is parsed file by file while it's read, inline changes of a file are
+    highlighted only when the file is rendered.
     """
     _chunk_re = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@(.*)')
     _newline_marker = re.compile(r'^\\ No newline at end of file')
@@ -193,31 +268,38 @@ class DiffProcessor(object):
         (?:^\+\+\+[ ](b/(?P<b_file>.+)|/dev/null)(?:\n|$))?
     """, re.VERBOSE | re.MULTILINE)
 
+    # lines that can be part of git style file header
+    _header_prefixes = ('similarity index ', 'rename from ', 'rename to ',
+                        'old mode ', 'new mode ', 'new file mode ',
+                        'deleted file mode ', 'index ', '--- ', '+++ ')
+
     #used for inline highlighter word split
     _token_re = re.compile(r'()(&gt;|&lt;|&amp;|\W+?)')
 
     def __init__(self, diff, vcs='hg', format='gitdiff', diff_limit=None):
         """
-        :param diff:   a text in diff format
+        :param diff:   a text in diff format, or an iterable of text chunks
+            of the diff that will be read while it's parsed
         :param vcs: type of version controll hg or git
         :param format: format of diff passed, `udiff` or `gitdiff`
         :param diff_limit: define the size of diff that is considered "big"
             based on that parameter cut off will be triggered, set to None
             to show full diff
         """
-        if not isinstance(diff, basestring):
-            raise Exception('Diff must be a basestring got %s instead' % type(diff))
-
         self._diff = diff
         self._format = format
         self.adds = 0
         self.removes = 0
-        # calculate diff size
-        self.diff_size = len(diff)
+        # calculate diff size, it's not known for streamed diffs
+        self.diff_size = None
+        if isinstance(diff, basestring):
+            self.diff_size = len(diff)
         self.diff_limit = diff_limit
         self.cur_diff_size = 0
+        self.limited_diff = False
         self.parsed = False
         self.parsed_diff = []
+        self.inline_diff = True
         self.vcs = vcs
 
         if format == 'gitdiff':
@@ -335,20 +417,49 @@ class DiffProcessor(object):
             old_mode, new_mode, new_file_mode, deleted_file_mode,
             a_blob_id, b_blob_id, b_mode, a_file, b_file
 
-        :param diff_chunk:
+        :param diff_chunk: header of the file diff without leading
+            ``diff --git``
         :type diff_chunk:
         """
 
         if self.vcs == 'git':
             match = self._git_header_re.match(diff_chunk)
-            diff = diff_chunk[match.end():]
-            return match.groupdict(), imap(self._escaper, diff.splitlines(1))
         elif self.vcs == 'hg':
             match = self._hg_header_re.match(diff_chunk)
-            diff = diff_chunk[match.end():]
-            return match.groupdict(), imap(self._escaper, diff.splitlines(1))
         else:
             raise Exception('VCS type %s is not supported' % self.vcs)
+        return match.groupdict(), diff_chunk[match.end():].splitlines(1)
+
+    def _iter_file_diffs(self):
+        """
+        Yields tuples of parsed header and iterator over diff lines of every
+        file in the diff. Lines of a file have to be consumed or dropped
+        before the next file is taken
+        """
+        reader = LineReader(iter_lines(self._diff))
+        # skip anything before first file
+        for _line in reader.until('diff --git'):
+            pass
+        for line in reader:
+            header = [line[len('diff --git'):]]
+            while True:
+                line = reader.peek()
+                if line is None or not line.startswith(self._header_prefixes):
+                    break
+                header.append(reader.next())
+            head, leftover = self._get_header(''.join(header))
+            yield head, chain(leftover, self._iter_file_lines(reader))
+
+    def _iter_file_lines(self, reader):
+        """
+        Yields diff lines of current file, last line of a file followed by
+        another one is given without its newline
+        """
+        for line in reader.until('diff --git'):
+            next_line = reader.peek()
+            if next_line is not None and next_line.startswith('diff --git'):
+                line = line[:-1]
+            yield line
 
     def _clean_line(self, line, command):
         if command in ['+', '-', ' ']:
@@ -356,15 +467,15 @@ class DiffProcessor(object):
             line = line[1:]
         return line
 
-    def _parse_gitdiff(self, inline_diff=True):
-        _files = []
-        diff_container = lambda arg: arg
-
-        ##split the diff in chunks of separate --git a/file b/file chunks
-        for raw_diff in ('\n' + self._diff).split('\ndiff --git')[1:]:
+    def _iter_gitdiff(self):
+        """
+        Yields parsed files of the diff while it's read. Parsing stops when
+        the diff limit is exceeded, ``limited_diff`` is set then and the file
+        crossing the limit is not returned
+        """
+        for head, lines in self._iter_file_diffs():
             binary = False
             binary_msg = 'unknown binary'
-            head, diff = self._get_header(raw_diff)
 
             if not head['a_file'] and head['b_file']:
                 op = 'A'
@@ -402,13 +513,11 @@ class DiffProcessor(object):
 
             if not binary:
                 try:
-                    chunks, stats = self._parse_lines(diff)
+                    chunks, stats = self._parse_lines(imap(self._escaper,
+                                                           lines))
                 except DiffLimitExceeded:
-                    diff_container = lambda _diff: LimitedDiffContainer(
-                                                self.diff_limit,
-                                                self.cur_diff_size,
-                                                _diff)
-                    break
+                    self.limited_diff = True
+                    return
             else:
                 chunks = []
                 chunks.append([{
@@ -417,38 +526,55 @@ class DiffProcessor(object):
                     'action':     'binary',
                     'line':       binary_msg,
                 }])
+            # drop what's left of this file, like binary data
+            for _line in lines:
+                pass
 
-            _files.append({
+            yield {
                 'filename':         head['b_path'],
                 'old_revision':     head['a_blob_id'],
                 'new_revision':     head['b_blob_id'],
                 'chunks':           chunks,
                 'operation':        op,
                 'stats':            stats,
-            })
+                'highlighted':      False,
+            }
+
+    def _parse_gitdiff(self, inline_diff=True):
+        _files = list(self._iter_gitdiff())
 
         sorter = lambda info: {'A': 0, 'M': 1, 'D': 2}.get(info['operation'])
+        _files.sort(key=sorter)
 
-        if inline_diff is False:
-            return diff_container(sorted(_files, key=sorter))
+        if self.limited_diff:
+            return LimitedDiffContainer(self.diff_limit, self.cur_diff_size,
+                                        _files)
+        return _files
 
-        # highlight inline changes
-        for diff_data in _files:
-            for chunk in diff_data['chunks']:
-                lineiter = iter(chunk)
-                try:
-                    while 1:
-                        line = lineiter.next()
-                        if line['action'] not in ['unmod', 'context']:
-                            nextline = lineiter.next()
-                            if nextline['action'] in ['unmod', 'context'] or \
-                               nextline['action'] == line['action']:
-                                continue
-                            self.differ(line, nextline)
-                except StopIteration:
-                    pass
-
-        return diff_container(sorted(_files, key=sorter))
+    def highlight_inline(self, diff_data):
+        """
+        Highlights inline changes of parsed file, it's done only once for
+        every file
+
+        :param diff_data: parsed file as returned by ``prepare``
+        """
+        if diff_data.get('highlighted'):
+            return diff_data
+        for chunk in diff_data['chunks']:
+            lineiter = iter(chunk)
+            try:
+                while 1:
+                    line = lineiter.next()
+                    if line['action'] not in ['unmod', 'context']:
+                        nextline = lineiter.next()
+                        if nextline['action'] in ['unmod', 'context'] or \
+                           nextline['action'] == line['action']:
+                            continue
+                        self.differ(line, nextline)
+            except StopIteration:
+                pass
+        diff_data['highlighted'] = True
+        return diff_data
 
     def _parse_udiff(self, inline_diff=True):
         raise NotImplementedError()
@@ -569,7 +695,11 @@ class DiffProcessor(object):
         """
         Prepare the passed udiff for HTML rendering. It'l return a list
         of dicts with diff information
+
+        :param inline_diff: highlight changes inside of lines when files are
+            rendered with ``as_html``
         """
+        self.inline_diff = inline_diff
         parsed = self._parser(inline_diff=inline_diff)
         self.parsed = True
         self.parsed_diff = parsed
@@ -579,6 +709,9 @@ class DiffProcessor(object):
         """
         Returns raw string diff
         """
+        if not isinstance(self._diff, basestring):
+            # streamed diff can be read only once
+            self._diff = ''.join(self._diff)
         return self._diff
         #return u''.join(imap(self._line_counter, self._diff.splitlines(1)))
 
@@ -614,6 +747,8 @@ class DiffProcessor(object):
         })
 
         for diff in diff_lines:
+            if self.inline_diff:
+                self.highlight_inline(diff)
             for line in diff['chunks']:
                 _html_empty = False
                 for change in line:
@@ -692,6 +827,49 @@ class DiffProcessor(object):
         return self.adds, self.removes
 
 
+def get_rendered_diff(get_diff, key=None, vcs='hg', diff_limit=None,
+                      enable_comments=False):
+    """
+    Returns tuple of ``limited_diff`` flag and list of parsed files of the
+    diff, each a dict of filename, operation, stats and rendered html.
+    Result is kept in diff cache, ``get_diff`` is not called at all when it's
+    already there
+
+    :param get_diff: callable returning the diff
+    :param key: identifies diffed revisions and options of the diff in the
+        cache, only immutable revisions may be used. Nothing is cached without
+        the key
+    """
+    cache = None
+    if key is not None:
+        cache = get_diff_cache()
+    if cache is not None:
+        # rendering can change between versions
+        key = (rhodecode.__version__, key, vcs, diff_limit, enable_comments)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    diff_processor = DiffProcessor(get_diff() or '', vcs=vcs,
+                                   format='gitdiff', diff_limit=diff_limit)
+    _parsed = diff_processor.prepare()
+    files = []
+    for f in _parsed:
+        files.append({
+            'filename':         f['filename'],
+            'operation':        f['operation'],
+            'stats':            f['stats'],
+            'html':             diff_processor.as_html(
+                                    enable_comments=enable_comments,
+                                    parsed_lines=[f]),
+        })
+    result = isinstance(_parsed, LimitedDiffContainer), files
+
+    if cache is not None:
+        cache.set(key, result)
+    return result
+
+
 class InMemoryBundleRepo(bundlerepository):
     def __init__(self, ui, path, bundlestream):
         self._tempparent = None
@@ -704,6 +882,18 @@ class InMemoryBundleRepo(bundlerepository):
         self.bundlefilespos = {}
 
 
+def differ_key(org_repo, org_ref, other_repo, other_ref, remote_compare=False):
+    """
+    Returns diff cache key of ``differ`` result or ``None`` if any of the refs
+    is not a full changeset id, branches, bookmarks and tags can move
+    """
+    for ref_type, ref in (org_ref, other_ref):
+        if ref_type != 'rev' or not _raw_id_re.match(ref or ''):
+            return None
+    return ('differ', org_ref[1], other_ref[1],
+            org_repo.repo_id == other_repo.repo_id, remote_compare)
+
+
 def differ(org_repo, org_ref, other_repo, other_ref, discovery_data=None,
            remote_compare=False, context=3, ignore_whitespace=False):
     """
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.disk_store
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Size bounded on disk store of files, least recently used are removed
+    first
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class DiskStore(object):
+    """
+    Keeps entries in files named by hash of their key. Entries are never
+    invalidated, least recently used ones are removed when size of the
+    store grows over ``max_size`` bytes. Files starting with a dot and
+    ``.lock`` files aren't entries, they're left for temporary files and
+    locks of subclasses.
+    """
+
+    # after eviction store takes this part of max_size
+    EVICT_TO = 0.8
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # size of store, counted when it's first written to
+        self._size = None
+
+    def __repr__(self):
+        return '<%s at %s>' % (self.__class__.__name__, self.path)
+
+    def get_name(self, key):
+        """
+        Returns path of entry stored under ``key`` relative to the store
+        """
+        name = hashlib.sha1(repr(key)).hexdigest()
+        return '%s/%s' % (name[:2], name[2:])
+
+    def _get_path(self, key):
+        return os.path.join(self.path, *self.get_name(key).split('/'))
+
+    def _iter_entries(self):
+        """
+        Yields (mtime, size, path) of all entries of the store
+        """
+        if not os.path.isdir(self.path):
+            return
+        for dirname in os.listdir(self.path):
+            dirpath = os.path.join(self.path, dirname)
+            if not os.path.isdir(dirpath):
+                continue
+            for name in os.listdir(dirpath):
+                if name.startswith('.') or name.endswith('.lock'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    # removed concurrently
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _touch(self, path):
+        """
+        Marks entry at ``path`` as recently used, returns ``False`` if
+        there's no such entry
+        """
+        try:
+            os.utime(path, None)
+        except OSError:
+            return False
+        return True
+
+    def _makedirs(self, dirname):
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(dirname):
+                    raise
+
+    def _mkstemp(self, path):
+        """
+        Returns (fd, path) of new temporary file next to entry at ``path``,
+        it's renamed to the entry once it's written whole
+        """
+        dirname = os.path.dirname(path)
+        self._makedirs(dirname)
+        return tempfile.mkstemp(dir=dirname, prefix='.tmp')
+
+    def _write(self, path, fill):
+        """
+        Writes entry at ``path`` by ``fill`` called with a temporary file
+        opened for writing, so nobody reads partially written entry
+        """
+        fd, tmp_path = self._mkstemp(path)
+        os.close(fd)
+        try:
+            # opened by name, some writers read written file again
+            f = open(tmp_path, 'wb')
+            try:
+                fill(f)
+            finally:
+                f.close()
+            os.rename(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._added(path, os.path.getsize(path))
+
+    def _added(self, path, size):
+        self._lock.acquire()
+        try:
+            if self._size is None:
+                self._size = sum(entry[1] for entry in self._iter_entries())
+            else:
+                self._size += size
+            if self._size > self.max_size:
+                self._evict(keep=path)
+        finally:
+            self._lock.release()
+
+    def _remove(self, path):
+        """
+        Removes entry at ``path``, returns ``False`` if it was removed
+        concurrently
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+    def _evict(self, keep=None):
+        """
+        Removes least recently used entries, except of just added ``keep``
+        one, until store takes ``EVICT_TO`` part of its max size. Size is
+        recounted, other processes could have written to the same store
+        """
+        entries = sorted(self._iter_entries())
+        size = sum(entry[1] for entry in entries)
+        limit = self.max_size * self.EVICT_TO
+        removed = 0
+        for _mtime, entry_size, path in entries:
+            if size <= limit:
+                break
+            if path == keep or not self._remove(path):
+                continue
+            size -= entry_size
+            removed += 1
+        self._size = size
+        log.debug('removed %s entries from %s' % (removed, self))
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            for _mtime, _size, path in list(self._iter_entries()):
+                self._remove(path)
+            self._size = 0
+        finally:
+            self._lock.release()
@@ -33,22 +33,17 @@ def _dagwalker(repo, revs, alias):
 
     if alias == 'hg':
         cl = repo._repo.changelog.parentrevs
-        repo = repo
     elif alias == 'git':
-        def cl(rev):
-            return [x.revision for x in repo[rev].parents()]
-        repo = repo
+        cl = repo._get_parent_revisions
 
     lowestrev = min(revs)
     gpcache = {}
 
     knownrevs = set(revs)
     for rev in revs:
-        ctx = repo[rev]
-        parents = sorted(set([p.revision for p in ctx.parents
-                              if p.revision in knownrevs]))
-        mpars = [p.revision for p in ctx.parents if
-                 p.revision != nullrev and p.revision not in parents]
+        prevs = [p for p in cl(rev) if p != nullrev]
+        parents = sorted(set([p for p in prevs if p in knownrevs]))
+        mpars = [p for p in prevs if p not in parents]
 
         for mpar in mpars:
             gp = gpcache.get(mpar)
@@ -59,7 +54,7 @@ def _dagwalker(repo, revs, alias):
             else:
                 parents.extend(g for g in gp if g not in parents)
 
-        yield (ctx.revision, 'C', ctx, parents)
+        yield (rev, 'C', rev, parents)
 
 
 def _colored(dag):
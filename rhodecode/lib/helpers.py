@@ -46,7 +46,8 @@ from rhodecode.lib.utils2 import str2bool, safe_unicode, safe_str, \
     get_changeset_safe, datetime_to_time, time_to_datetime, AttributeDict
 from rhodecode.lib.markup_renderer import MarkupRenderer
 from rhodecode.lib.vcs.exceptions import ChangesetDoesNotExistError
-from rhodecode.lib.vcs.backends.base import BaseChangeset, EmptyChangeset
+from rhodecode.lib.vcs.backends.base import BaseChangeset, EmptyChangeset, \
+    BaseRepository
 from rhodecode.config.conf import DATE_FORMAT, DATETIME_FORMAT
 from rhodecode.model.changeset_status import ChangesetStatusModel
 from rhodecode.model.db import URL_SEP, Permission
@@ -793,6 +794,10 @@ class RepoPage(Page):
 
         """Create a "RepoPage" instance. special pager for paging
         repository
+
+        If ``collection`` is a repository, only changesets of requested page
+        are created, optionally limited to history of ``branch`` keyword
+        argument
         """
         self._url_generator = url
 
@@ -817,6 +822,8 @@ class RepoPage(Page):
         # we calculate that ourselves.
         if item_count is not None:
             self.item_count = item_count
+        elif isinstance(self.collection, BaseRepository):
+            self.item_count = self.collection.count(kwargs.get('branch'))
         else:
             self.item_count = len(self.collection)
 
@@ -841,7 +848,13 @@ class RepoPage(Page):
             self.last_item = ((self.item_count - 1) - items_per_page *
                               (self.page - 1))
 
-            self.items = list(self.collection[self.first_item:self.last_item + 1])
+            if isinstance(self.collection, BaseRepository):
+                self.items = self.collection.get_changesets_page(
+                    branch_name=kwargs.get('branch'), offset=self.first_item,
+                    limit=self.last_item + 1 - self.first_item)
+            else:
+                self.items = list(self.collection[self.first_item:
+                                                  self.last_item + 1])
 
             # Links to previous and next page
             if self.page > self.first_page:
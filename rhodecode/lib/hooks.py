@@ -32,62 +32,77 @@ from mercurial.scmutil import revrange
 from mercurial.node import nullrev
 
 from rhodecode.lib import helpers as h
-from rhodecode.lib.utils import action_logger
+from rhodecode.lib.utils import action_logger, get_scm_size
 from rhodecode.lib.vcs.backends.base import EmptyChangeset
 from rhodecode.lib.compat import json
 from rhodecode.lib.exceptions import HTTPLockedRC
-from rhodecode.lib.utils2 import safe_str, datetime_to_time
+from rhodecode.lib.utils2 import safe_str, safe_int, datetime_to_time
 from rhodecode.model.db import Repository, User
-
-
-def _get_scm_size(alias, root_path):
-
-    if not alias.startswith('.'):
-        alias += '.'
-
-    size_scm, size_root = 0, 0
-    for path, dirs, files in os.walk(safe_str(root_path)):
-        if path.find(alias) != -1:
-            for f in files:
-                try:
-                    size_scm += os.path.getsize(os.path.join(path, f))
-                except OSError:
-                    pass
-        else:
-            for f in files:
-                try:
-                    size_root += os.path.getsize(os.path.join(path, f))
-                except OSError:
-                    pass
-
-    size_scm_f = h.format_byte_size(size_scm)
-    size_root_f = h.format_byte_size(size_root)
-    size_total_f = h.format_byte_size(size_root + size_scm)
-
-    return size_scm_f, size_root_f, size_total_f
+from rhodecode.model.meta import Session
 
 
 def repo_size(ui, repo, hooktype=None, **kwargs):
     """
-    Presents size of repository after push
+    Presents size of repository after push. Recorded size of repository
+    grows by size of pushed bundle, whole repository is measured only when
+    its size wasn't recorded yet
 
     :param ui:
     :param repo:
     :param hooktype:
     """
-
-    size_hg_f, size_root_f, size_total_f = _get_scm_size('.hg', repo.root)
+    extras = dict(repo.ui.configitems('rhodecode_extras'))
+    size = None
+    if 'repository' in extras:
+        size = _add_repo_summary_size(extras['repository'],
+                                      safe_int(extras.get('pushed_size'), 0))
+    if size is None:
+        size_hg, size_root = get_scm_size('.hg', repo.root)
+        size = size_hg + size_root
+        if 'repository' in extras:
+            _set_repo_summary_size(extras['repository'], size)
 
     last_cs = repo[len(repo) - 1]
 
-    msg = ('Repository size .hg:%s repo:%s total:%s\n'
+    msg = ('Repository size:%s\n'
            'Last revision is now r%s:%s\n') % (
-        size_hg_f, size_root_f, size_total_f, last_cs.rev(), last_cs.hex()[:12]
+        h.format_byte_size(size), last_cs.rev(), last_cs.hex()[:12]
     )
 
     sys.stdout.write(msg)
 
 
+def _add_repo_summary_size(repository, size):
+    from rhodecode.model.scm import ScmModel
+    size = ScmModel().add_repo_size(repository, size)
+    Session().commit()
+    return size
+
+
+def _set_repo_summary_size(repository, size):
+    repo = Repository.get_by_repo_name(repository)
+    if repo is not None and repo.summary is not None:
+        repo.summary.size = size
+        Session().add(repo.summary)
+        Session().commit()
+
+
+def refresh_repository(repository):
+    """
+    Invalidates caches of pushed repository and refreshes its dashboard
+    summary, dashboard only renders stored summaries. It's called after
+    every push whether push logger hook is enabled or not, by simplehg and
+    by handle_git_receive, and after web commits and pulls from remote
+
+    :param repository: repository name
+    """
+    from rhodecode.model.scm import ScmModel
+    scm_model = ScmModel()
+    scm_model.mark_for_invalidation(repository)
+    scm_model.update_repo_summary(repository)
+    Session().commit()
+
+
 def pre_push(ui, repo, **kwargs):
     # pre push function, currently used to ban pushing when
     # repository is locked
@@ -428,3 +443,11 @@ def handle_git_receive(repo_path, revs, env, hook_type='post'):
                 git_revs += ['tag=>%s' % push_ref['name']]
 
         log_push_action(baseui, repo, _git_revs=git_revs)
+
+    if hook_type == 'post' and repo.commit_graph is not None:
+        # index pushed commits right away so first web request after push
+        # doesn't have to do it
+        repo.commit_graph.refresh()
+
+    if hook_type == 'post':
+        refresh_repository(extras['repository'])
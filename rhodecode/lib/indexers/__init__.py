@@ -26,6 +26,7 @@ import os
 import sys
 import traceback
 import logging
+import threading
 from os.path import dirname as dn, join as jn
 
 #to get the rhodecode import
@@ -39,6 +40,7 @@ from whoosh.fields import TEXT, ID, STORED, NUMERIC, BOOLEAN, Schema, FieldType,
 from whoosh.index import create_in, open_dir
 from whoosh.formats import Characters
 from whoosh.highlight import highlight, HtmlFormatter, ContextFragmenter
+from whoosh.query import And, Term
 
 from webhelpers.html.builder import escape, literal
 from sqlalchemy import engine_from_config
@@ -57,15 +59,20 @@ log = logging.getLogger(__name__)
 ANALYZER = RegexTokenizer(expression=r"\w+") | LowercaseFilter()
 
 #INDEX SCHEMA DEFINITION
+# index holds two kinds of documents, one per file path and one per unique
+# file content (blob). Path documents point at their content with blob_id,
+# so content shared by forks is analysed and stored only once
 SCHEMA = Schema(
     fileid=ID(unique=True),
     owner=TEXT(),
     repository=TEXT(stored=True),
     path=TEXT(stored=True),
-    content=FieldType(format=Characters(), analyzer=ANALYZER,
-                      scorable=True, stored=True),
+    blob_id=ID(stored=True),
     modtime=STORED(),
-    extension=TEXT(stored=True)
+    extension=TEXT(stored=True),
+    blob=ID(unique=True, stored=True),
+    content=FieldType(format=Characters(), analyzer=ANALYZER,
+                      scorable=True, stored=True)
 )
 
 IDX_NAME = 'HG_INDEX'
@@ -134,7 +141,8 @@ class MakeIndex(BasePasterCommand):
             WhooshIndexingDaemon(index_location=index_location,
                                  repo_location=repo_location,
                                  repo_list=repo_list,
-                                 repo_update_list=repo_update_list)\
+                                 repo_update_list=repo_update_list,
+                                 procs=self.options.procs)\
                 .run(full_index=self.options.full_index)
             l.release()
         except LockHeld:
@@ -165,36 +173,160 @@ class MakeIndex(BasePasterCommand):
                           help="Specifies that index should be made full i.e"
                                 " destroy old and build from scratch",
                           default=False)
+        self.parser.add_option('--processes',
+                          action='store',
+                          type='int',
+                          dest='procs',
+                          help="Specifies number of processes reading "
+                                "repositories in parallel. OPTIONAL",
+                          default=1)
+
+
+# searchers are kept per thread, as whoosh readers share open files
+_searchers = threading.local()
+
+
+def get_searcher(index_location, index_name):
+    """
+    Returns searcher of index ``index_name`` in ``index_location``, it's
+    opened once per thread and refreshed only after the indexer commits new
+    generation of the index or rebuilds it
+
+    :raise EmptyIndexError: if there's no such index
+    """
+    searchers = _searchers.__dict__
+    key = (index_location, index_name)
+    if key in searchers:
+        idx, searcher, modified = searchers[key]
+        last_modified = idx.last_modified()
+        if last_modified == modified:
+            return searcher
+        if searcher.up_to_date():
+            # index was built again from scratch with the same generation
+            searcher.close()
+            searcher = idx.searcher()
+        else:
+            searcher = searcher.refresh()
+    else:
+        idx = open_dir(index_location, indexname=index_name)
+        last_modified = idx.last_modified()
+        searcher = idx.searcher()
+    searchers[key] = (idx, searcher, last_modified)
+    return searcher
+
+
+def get_index_version(index_location, index_name):
+    """
+    Returns version of index ``index_name`` in ``index_location``, which
+    changes whenever the indexer commits to it or rebuilds it. Searcher of
+    current thread is refreshed to that version
+
+    :raise EmptyIndexError: if there's no such index
+    """
+    get_searcher(index_location, index_name)
+    idx, searcher, modified = _searchers.__dict__[(index_location,
+                                                   index_name)]
+    return searcher.reader().generation(), modified
+
+
+def split_content_query(query):
+    """
+    Splits parsed content search query into a query matching content (blob)
+    documents and a query filtering paths pointing at them, any of them can
+    be ``None``
+
+    :param query: query parsed with file index ``SCHEMA``
+    """
+    def is_content(q):
+        return all(leaf.field() == 'content' for leaf in q.leaves())
+
+    if isinstance(query, And):
+        content = [q for q in query.subqueries if is_content(q)]
+        paths = [q for q in query.subqueries if not is_content(q)]
+        content = content and And(content).normalize() or None
+        paths = paths and And(paths).normalize() or None
+        return content, paths
+    if is_content(query):
+        return query, None
+    return None, query
 
 
 class WhooshResultWrapper(object):
-    def __init__(self, search_type, searcher, matcher, highlight_items,
-                 repo_location):
+    """
+    Lazy list of search results, documents matching ``query`` are counted
+    up front but stored fields, spans and highlights are read only for
+    sliced out page of results
+    """
+
+    def __init__(self, search_type, searcher, query, highlight_items,
+                 repo_location, path_filter=None):
         self.search_type = search_type
         self.searcher = searcher
-        self.matcher = matcher
+        self.query = query
         self.highlight_items = highlight_items
         self.fragment_size = 200
         self.repo_location = repo_location
+        self.path_filter = path_filter
 
     @LazyProperty
     def doc_ids(self):
+        """
+        Returns list of (path document, content document) numbers of content
+        search results, in the order of content documents
+        """
         docs_id = []
-        while self.matcher.is_active():
-            docnum = self.matcher.id()
-            chunks = [offsets for offsets in self.get_chunks()]
-            docs_id.append([docnum, chunks])
-            self.matcher.next()
+        for docnum in self.searcher.docs_for_query(self.query):
+            # expand content match into all paths having that content
+            for path_docnum in self.get_path_docs(docnum):
+                docs_id.append((path_docnum, docnum))
         return docs_id
 
+    @LazyProperty
+    def count(self):
+        if self.search_type == 'content':
+            return len(self.doc_ids)
+        return sum(1 for docnum in self.searcher.docs_for_query(self.query))
+
+    def get_path_docs(self, docnum):
+        """
+        Returns sorted numbers of path documents pointing at content
+        document ``docnum``, narrowed by ``path_filter``
+        """
+        blob_id = self.searcher.stored_fields(docnum).get('blob')
+        if not blob_id:
+            return []
+        q = Term('blob_id', blob_id)
+        if self.path_filter is not None:
+            q = And([q, self.path_filter])
+        return sorted(self.searcher.docs_for_query(q))
+
+    def get_page_docs(self, start, stop):
+        """
+        Returns (document, content document) numbers of results from
+        ``start`` to ``stop``. Other than content searches are ordered by
+        score and only as many results as needed are scored.
+        """
+        pagelen = stop - start
+        if pagelen <= 0 or start >= len(self):
+            return []
+        if self.search_type == 'content':
+            return self.doc_ids[start:stop]
+        if start % pagelen == 0:
+            hits = self.searcher.search_page(self.query,
+                                             start // pagelen + 1,
+                                             pagelen=pagelen)
+        else:
+            hits = self.searcher.search(self.query, limit=stop)[start:stop]
+        return [(hit.docnum, None) for hit in hits]
+
     def __str__(self):
-        return '<%s at %s>' % (self.__class__.__name__, len(self.doc_ids))
+        return '<%s at %s>' % (self.__class__.__name__, len(self))
 
     def __repr__(self):
         return self.__str__()
 
     def __len__(self):
-        return len(self.doc_ids)
+        return self.count
 
     def __iter__(self):
         """
@@ -202,28 +334,32 @@ class WhooshResultWrapper(object):
 
         *Requires* implementation of ``__getitem__`` method.
         """
-        for docid in self.doc_ids:
-            yield self.get_full_content(docid)
+        for res in self[0:len(self)]:
+            yield res
 
     def __getitem__(self, key):
         """
         Slicing of resultWrapper
         """
-        i, j = key.start, key.stop
+        i, j = key.start or 0, key.stop
+        if j is None or j > len(self):
+            j = len(self)
 
         slices = []
-        for docid in self.doc_ids[i:j]:
-            slices.append(self.get_full_content(docid))
+        for docnum, blob_docnum in self.get_page_docs(i, j):
+            slices.append(self.get_full_content(docnum, blob_docnum))
         return slices
 
-    def get_full_content(self, docid):
-        res = self.searcher.stored_fields(docid[0])
+    def get_full_content(self, docnum, blob_docnum=None):
+        res = self.searcher.stored_fields(docnum)
         log.debug('result: %s' % res)
         if self.search_type == 'content':
             full_repo_path = jn(self.repo_location, res['repository'])
             f_path = res['path'].split(full_repo_path)[-1]
             f_path = f_path.lstrip(os.sep)
-            content_short = self.get_short_content(res, docid[1])
+            res['content'] = self.searcher.stored_fields(blob_docnum)['content']
+            content_short = self.get_short_content(
+                res, self.get_chunks(blob_docnum))
             res.update({'content_short': content_short,
                         'content_short_hl': self.highlight(content_short),
                         'f_path': f_path
@@ -244,18 +380,21 @@ class WhooshResultWrapper(object):
 
         return ''.join([res['content'][chunk[0]:chunk[1]] for chunk in chunks])
 
-    def get_chunks(self):
+    def get_chunks(self, docnum):
         """
         Smart function that implements chunking the content
         but not overlap chunks so it doesn't highlight the same
         close occurrences twice.
 
-        :param matcher:
-        :param size:
+        :param docnum: number of content document
         """
         memory = [(0, 0)]
-        if self.matcher.supports('positions'):
-            for span in self.matcher.spans():
+        matcher = self.query.matcher(self.searcher)
+        if matcher.is_active():
+            matcher.skip_to(docnum)
+        if matcher.is_active() and matcher.id() == docnum and \
+                matcher.supports('positions'):
+            for span in matcher.spans():
                 start = span.startchar or 0
                 end = span.endchar or 0
                 start_offseted = max(0, start - self.fragment_size)
@@ -264,7 +403,7 @@ class WhooshResultWrapper(object):
                 if start_offseted < memory[-1][1]:
                     start_offseted = memory[-1][1]
                 memory.append((start_offseted, end_offseted,))
-                yield (start_offseted, end_offseted,)
+        return memory[1:]
 
     def highlight(self, content, top=5):
         if self.search_type not in ['content', 'message']:
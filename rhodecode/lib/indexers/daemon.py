@@ -26,6 +26,7 @@ from __future__ import with_statement
 
 import os
 import sys
+import hashlib
 import logging
 import traceback
 
@@ -41,10 +42,12 @@ sys.path.append(project_path)
 
 from rhodecode.config.conf import INDEX_EXTENSIONS
 from rhodecode.model.scm import ScmModel
+from rhodecode.lib.compat import json
 from rhodecode.lib.utils2 import safe_unicode, safe_str
 from rhodecode.lib.indexers import SCHEMA, IDX_NAME, CHGSETS_SCHEMA, \
     CHGSET_IDX_NAME
 
+from rhodecode.lib.vcs.backends import get_backend
 from rhodecode.lib.vcs.exceptions import ChangesetError, RepositoryError, \
     NodeDoesNotExistError
 
@@ -54,6 +57,88 @@ from whoosh.qparser import QueryParser
 
 log = logging.getLogger('whoosh_indexer')
 
+# max number of files read by one indexing task
+FILES_PER_TASK = 500
+
+# repositories opened by indexing process, {path: repo}
+_repos = {}
+
+
+def get_blob_id(content):
+    """
+    Returns id of unicode file ``content`` in the index, the same content
+    gets the same id in every repository
+    """
+    return unicode(hashlib.sha1(content.encode('utf8')).hexdigest())
+
+
+def get_file_docs(repo_name, repo, raw_id, paths):
+    """
+    Returns list of file index documents of given ``paths`` of ``raw_id``
+    changeset of repository. All files get date of that changeset as their
+    modification time, so no history is read.
+
+    Content of the file is returned with the path document, it's split into
+    its own blob document when added to the index
+    """
+    cs = repo.get_changeset(raw_id)
+    mtime = mktime(cs.date.timetuple())
+    owner = safe_unicode(repo.contact)
+    repository = safe_unicode(repo_name)
+    repo_path = safe_str(repo.path)
+
+    docs = []
+    for path in paths:
+        full_path = jn(repo_path, safe_str(path))
+        try:
+            node = cs.get_node(safe_unicode(path))
+        except (ChangesetError, NodeDoesNotExistError):
+            log.debug('    >> %s does not exist at %s' % (full_path, cs))
+            continue
+        if not node.is_file():
+            continue
+
+        # we just index the content of chosen files, and skip binary files
+        if node.extension in INDEX_EXTENSIONS and not node.is_binary:
+            u_content = node.content
+            if not isinstance(u_content, unicode):
+                log.warning('  >> %s Could not get this content as unicode '
+                            'replacing with empty content' % full_path)
+                u_content = u''
+            else:
+                log.debug('    >> %s [WITH CONTENT]' % full_path)
+        else:
+            log.debug('    >> %s' % full_path)
+            # just index file name without it's content
+            u_content = u''
+
+        p = safe_unicode(full_path)
+        doc = dict(
+            fileid=p,
+            owner=owner,
+            repository=repository,
+            path=p,
+            content=u_content,
+            modtime=mtime,
+            extension=node.extension
+        )
+        if u_content:
+            doc['blob_id'] = get_blob_id(u_content)
+        docs.append(doc)
+    return docs
+
+
+def _get_file_docs(task):
+    """
+    Runs one indexing task in pool process
+    """
+    repo_name, repo_path, alias, raw_id, paths = task
+    try:
+        repo = _repos[repo_path]
+    except KeyError:
+        repo = _repos[repo_path] = get_backend(alias)(safe_str(repo_path))
+    return get_file_docs(repo_name, repo, raw_id, paths)
+
 
 class WhooshIndexingDaemon(object):
     """
@@ -62,8 +147,10 @@ class WhooshIndexingDaemon(object):
 
     def __init__(self, indexname=IDX_NAME, index_location=None,
                  repo_location=None, sa=None, repo_list=None,
-                 repo_update_list=None):
+                 repo_update_list=None, procs=1):
         self.indexname = indexname
+        # number of processes reading files of repositories
+        self.procs = procs
 
         self.index_location = index_location
         if not index_location:
@@ -106,70 +193,145 @@ class WhooshIndexingDaemon(object):
         elif not exists_in(self.index_location, CHGSET_IDX_NAME):
             log.info('Running full index build as the changeset'
                      ' index does not exist')
+        elif 'blob' not in open_dir(self.index_location,
+                                    indexname=IDX_NAME).schema:
+            log.info('Running full index build as the file content'
+                     ' index has old format')
         else:
             self.initial = False
 
-    def get_paths(self, repo):
+    @property
+    def revisions_path(self):
         """
-        recursive walk in root dir and return a set of all path in that dir
-        based on repository walk function
+        Path of file index metadata, last indexed changeset of every
+        repository
         """
-        index_paths_ = set()
+        return jn(self.index_location, '%s_revisions.json' % self.indexname)
+
+    def get_indexed_revisions(self):
         try:
-            tip = repo.get_changeset('tip')
-            for _topnode, _dirs, files in tip.walk('/'):
+            with open(self.revisions_path, 'rb') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def set_indexed_revisions(self, revisions):
+        tmp_path = self.revisions_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            json.dump(revisions, f)
+        if os.path.exists(self.revisions_path):
+            # windows can't rename over existing file
+            os.remove(self.revisions_path)
+        os.rename(tmp_path, self.revisions_path)
+
+    def get_paths(self, repo, cs=None):
+        """
+        Returns list of paths of all files in given changeset of repository,
+        tip by default
+        """
+        index_paths_ = []
+        try:
+            if cs is None:
+                cs = repo.get_changeset('tip')
+            for _topnode, _dirs, files in cs.walk('/'):
                 for f in files:
-                    index_paths_.add(jn(safe_str(repo.path), safe_str(f.path)))
+                    index_paths_.append(f.path)
 
         except RepositoryError:
             log.debug(traceback.format_exc())
             pass
         return index_paths_
 
-    def get_node(self, repo, path):
-        n_path = path[len(repo.path) + 1:]
-        node = repo.get_changeset().get_node(n_path)
-        return node
+    def get_fileid(self, repo, path):
+        return safe_unicode(jn(safe_str(repo.path), safe_str(path)))
 
-    def get_node_mtime(self, node):
-        return mktime(node.last_changeset.date.timetuple())
-
-    def add_doc(self, writer, path, repo, repo_name):
+    def get_index_tasks(self, repo_name, repo, paths, raw_id):
         """
-        Adding doc to writer this function itself fetches data from
-        the instance of vcs backend
+        Splits indexing of given paths of repository into tasks that can run
+        in separate processes
         """
+        return [(repo_name, repo.path, repo.alias, raw_id,
+                 paths[i:i + FILES_PER_TASK])
+                for i in xrange(0, len(paths), FILES_PER_TASK)]
 
-        node = self.get_node(repo, path)
-        indexed = indexed_w_content = 0
-        # we just index the content of chosen files, and skip binary files
-        if node.extension in INDEX_EXTENSIONS and not node.is_binary:
-            u_content = node.content
-            if not isinstance(u_content, unicode):
-                log.warning('  >> %s Could not get this content as unicode '
-                            'replacing with empty content' % path)
-                u_content = u''
-            else:
-                log.debug('    >> %s [WITH CONTENT]' % path)
-                indexed_w_content += 1
+    def index_files(self, writer, tasks, blobs, searcher=None):
+        """
+        Runs indexing tasks and adds all documents to the whoosh index
+        writer. Tasks are spread across ``procs`` processes
 
+        :param writer: the whoosh index writer to add to
+        :param tasks: list of tasks from ``get_index_tasks``
+        :param blobs: set of blob ids referenced by added files, it's
+          updated with blobs of files added now
+        :param searcher: searcher of existing index, blobs already found
+          there are not added again
+        """
+        if self.procs > 1 and len(tasks) > 1:
+            # python 2.5 has no multiprocessing, it's needed by procs only
+            from multiprocessing import Pool
+            pool = Pool(min(self.procs, len(tasks)))
+            try:
+                results = pool.imap_unordered(_get_file_docs, tasks)
+                indexed = self._add_docs(writer, results, blobs, searcher)
+            finally:
+                pool.terminate()
         else:
-            log.debug('    >> %s' % path)
-            # just index file name without it's content
-            u_content = u''
-            indexed += 1
+            indexed = self._add_docs(writer, (_get_file_docs(task)
+                                              for task in tasks),
+                                     blobs, searcher)
+        _repos.clear()
+        return indexed
 
-        p = safe_unicode(path)
-        writer.add_document(
-            fileid=p,
-            owner=unicode(repo.contact),
-            repository=safe_unicode(repo_name),
-            path=p,
-            content=u_content,
-            modtime=self.get_node_mtime(node),
-            extension=node.extension
-        )
-        return indexed, indexed_w_content
+    def _add_docs(self, writer, results, blobs, searcher):
+        i_cnt = iwc_cnt = b_cnt = 0
+        for docs in results:
+            for doc in docs:
+                content = doc.pop('content')
+                blob_id = doc.get('blob_id')
+                if blob_id:
+                    # content is analysed only the first time it's seen
+                    if blob_id not in blobs:
+                        blobs.add(blob_id)
+                        if searcher is None or \
+                            searcher.document_number(blob=blob_id) is None:
+                            writer.add_document(blob=blob_id,
+                                                content=content)
+                            b_cnt += 1
+                    iwc_cnt += 1
+                else:
+                    i_cnt += 1
+                writer.add_document(**doc)
+        log.debug('added %s files %s with content, %s new blobs' % (
+                  i_cnt + iwc_cnt, iwc_cnt, b_cnt))
+        return i_cnt, iwc_cnt
+
+    def delete_files(self, writer, searcher, query, deleted, orphans):
+        """
+        Deletes files matching ``query`` from the index, collecting their
+        document numbers in ``deleted`` and blobs they pointed at in
+        ``orphans``
+        """
+        for docnum in searcher.docs_for_query(query):
+            deleted.add(docnum)
+            blob_id = searcher.stored_fields(docnum).get('blob_id')
+            if blob_id:
+                orphans.add(blob_id)
+        writer.delete_by_query(query)
+
+    def delete_orphans(self, writer, searcher, deleted, orphans):
+        """
+        Deletes blobs no file points at anymore from the index
+
+        :param deleted: numbers of file documents deleted from the index
+        :param orphans: ids of blobs that might not be referenced anymore
+        """
+        cnt = 0
+        for blob_id in orphans:
+            refs = set(searcher.docs_for_query(Term('blob_id', blob_id)))
+            if not refs - deleted:
+                writer.delete_by_term('blob', blob_id)
+                cnt += 1
+        log.debug('deleted %s unreferenced blobs' % cnt)
 
     def index_changesets(self, writer, repo_name, repo, start_rev=None):
         """
@@ -213,25 +375,6 @@ class WhooshIndexingDaemon(object):
         log.debug('indexed %d changesets for repo %s' % (indexed, repo_name))
         return indexed
 
-    def index_files(self, file_idx_writer, repo_name, repo):
-        """
-        Index files for given repo_name
-
-        :param file_idx_writer: the whoosh index writer to add to
-        :param repo_name: name of the repository we're indexing
-        :param repo: instance of vcs repo
-        """
-        i_cnt = iwc_cnt = 0
-        log.debug('building index for [%s]' % repo.path)
-        for idx_path in self.get_paths(repo):
-            i, iwc = self.add_doc(file_idx_writer, idx_path, repo, repo_name)
-            i_cnt += i
-            iwc_cnt += iwc
-
-        log.debug('added %s files %s with content for repo %s' %
-                  (i_cnt + iwc_cnt, iwc_cnt, repo.path))
-        return i_cnt, iwc_cnt
-
     def update_changeset_index(self):
         idx = open_dir(self.index_location, indexname=CHGSET_IDX_NAME)
 
@@ -288,87 +431,82 @@ class WhooshIndexingDaemon(object):
                     log.debug('>> NOTHING TO COMMIT TO CHANGESET INDEX<<')
 
     def update_file_index(self):
+        """
+        Reindexes only files added, changed or removed since last indexed
+        changeset of each repository
+        """
         log.debug((u'STARTING INCREMENTAL INDEXING UPDATE FOR EXTENSIONS %s '
                    'AND REPOS %s') % (INDEX_EXTENSIONS, self.repo_paths.keys()))
 
         idx = open_dir(self.index_location, indexname=self.indexname)
-        # The set of all paths in the index
-        indexed_paths = set()
-        # The set of all paths we need to re-index
-        to_index = set()
+        revisions = self.get_indexed_revisions()
+        tasks = []
+        # numbers of deleted file documents and blobs they pointed at
+        deleted = set()
+        orphans = set()
+        blobs = set()
 
         writer = idx.writer()
+        searcher = idx.searcher()
         writer_is_dirty = False
         try:
-            with idx.reader() as reader:
-
-                # Loop over the stored fields in the index
-                for fields in reader.all_stored_fields():
-                    indexed_path = fields['path']
-                    indexed_repo_path = fields['repository']
-                    indexed_paths.add(indexed_path)
-
-                    if not indexed_repo_path in self.filtered_repo_update_paths:
-                        continue
-
-                    repo = self.repo_paths[indexed_repo_path]
-
-                    try:
-                        node = self.get_node(repo, indexed_path)
-                        # Check if this file was changed since it was indexed
-                        indexed_time = fields['modtime']
-                        mtime = self.get_node_mtime(node)
-                        if mtime > indexed_time:
-                            # The file has changed, delete it and add it to
-                            # the list of files to reindex
-                            log.debug(
-                                'adding to reindex list %s mtime: %s vs %s' % (
-                                    indexed_path, mtime, indexed_time)
-                            )
-                            writer.delete_by_term('fileid', indexed_path)
-                            writer_is_dirty = True
-
-                            to_index.add(indexed_path)
-                    except (ChangesetError, NodeDoesNotExistError):
-                        # This file was deleted since it was indexed
-                        log.debug('removing from index %s' % indexed_path)
-                        writer.delete_by_term('path', indexed_path)
-                        writer_is_dirty = True
-
-            # Loop over the files in the filesystem
-            # Assume we have a function that gathers the filenames of the
-            # documents to be indexed
-            ri_cnt_total = 0  # indexed
-            riwc_cnt_total = 0  # indexed with content
             for repo_name, repo in self.repo_paths.items():
                 # skip indexing if there aren't any revisions
                 if len(repo) < 1:
                     continue
-                ri_cnt = 0   # indexed
-                riwc_cnt = 0  # indexed with content
-                for path in self.get_paths(repo):
-                    path = safe_unicode(path)
-                    if path in to_index or path not in indexed_paths:
-
-                        # This is either a file that's changed, or a new file
-                        # that wasn't indexed before. So index it!
-                        i, iwc = self.add_doc(writer, path, repo, repo_name)
-                        writer_is_dirty = True
-                        log.debug('re indexing %s' % path)
-                        ri_cnt += i
-                        ri_cnt_total += 1
-                        riwc_cnt += iwc
-                        riwc_cnt_total += iwc
-                log.debug('added %s files %s with content for repo %s' % (
-                             ri_cnt + riwc_cnt, riwc_cnt, repo.path)
-                )
+                tip = repo.get_changeset()
+                last_rev = revisions.get(repo_name)
+                if last_rev == tip.raw_id:
+                    continue
+
+                changes = None
+                if last_rev is not None:
+                    try:
+                        changes = repo.get_changed_paths(last_rev, tip.raw_id)
+                    except (ChangesetError, RepositoryError):
+                        log.debug('last indexed changeset %s of %s is gone'
+                                  % (last_rev, repo_name))
+
+                if changes is None:
+                    # don't know what is indexed, start over for this repo
+                    log.debug('reindexing all files of %s' % repo_name)
+                    # fileid of repository root ends with separator
+                    self.delete_files(writer, searcher,
+                                Prefix('fileid', self.get_fileid(repo, '')),
+                                deleted, orphans)
+                    paths = self.get_paths(repo, tip)
+                else:
+                    added, changed, removed = changes
+                    log.debug('reindexing %s added, %s changed and %s '
+                              'removed files of %s' % (len(added),
+                              len(changed), len(removed), repo_name))
+                    for path in changed + removed:
+                        self.delete_files(writer, searcher,
+                                Term('fileid', self.get_fileid(repo, path)),
+                                deleted, orphans)
+                    paths = added + changed
+
+                tasks.extend(self.get_index_tasks(repo_name, repo, paths,
+                                                  tip.raw_id))
+                revisions[repo_name] = tip.raw_id
+                writer_is_dirty = True
+
+            ri_cnt_total, riwc_cnt_total = self.index_files(writer, tasks,
+                                                            blobs, searcher)
             log.debug('indexed %s files in total and %s with content' % (
-                        ri_cnt_total, riwc_cnt_total)
+                        ri_cnt_total + riwc_cnt_total, riwc_cnt_total)
             )
-        finally:
+            self.delete_orphans(writer, searcher, deleted, orphans - blobs)
+        except:
+            searcher.close()
+            writer.cancel()
+            raise
+        else:
+            searcher.close()
             if writer_is_dirty:
                 log.debug('>> COMMITING CHANGES TO FILE INDEX <<')
                 writer.commit(merge=True)
+                self.set_indexed_revisions(revisions)
                 log.debug('>>> FINISHED REBUILDING FILE INDEX <<<')
             else:
                 log.debug('>> NOTHING TO COMMIT TO FILE INDEX <<')
@@ -387,21 +525,36 @@ class WhooshIndexingDaemon(object):
         chgset_idx_writer = chgset_idx.writer()
 
         file_idx = create_in(self.index_location, SCHEMA, indexname=IDX_NAME)
-        file_idx_writer = file_idx.writer()
+        if self.procs > 1:
+            # each process writes own segment, they are not merged at commit
+            file_idx_writer = file_idx.writer(procs=self.procs,
+                                              multisegment=True)
+        else:
+            file_idx_writer = file_idx.writer()
         log.debug('BUILDING INDEX FOR EXTENSIONS %s '
                   'AND REPOS %s' % (INDEX_EXTENSIONS, self.repo_paths.keys()))
 
+        revisions = {}
+        tasks = []
         for repo_name, repo in self.repo_paths.items():
             # skip indexing if there aren't any revisions
             if len(repo) < 1:
                 continue
 
-            self.index_files(file_idx_writer, repo_name, repo)
+            tip = repo.get_changeset()
+            log.debug('building index for [%s]' % repo.path)
+            tasks.extend(self.get_index_tasks(repo_name, repo,
+                                              self.get_paths(repo, tip),
+                                              tip.raw_id))
+            revisions[repo_name] = tip.raw_id
             self.index_changesets(chgset_idx_writer, repo_name, repo)
 
+        self.index_files(file_idx_writer, tasks, set())
+
         log.debug('>> COMMITING CHANGES <<')
-        file_idx_writer.commit(merge=True)
+        file_idx_writer.commit(merge=self.procs <= 1)
         chgset_idx_writer.commit(merge=True)
+        self.set_indexed_revisions(revisions)
         log.debug('>>> FINISHED BUILDING INDEX <<<')
 
     def update_indexes(self):
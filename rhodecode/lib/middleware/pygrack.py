@@ -1,12 +1,19 @@
 import os
+import zlib
+import time
 import socket
 import logging
+import threading
 import subprocess
 import traceback
 
 from webob import Request, Response, exc
 
+import rhodecode
 from rhodecode.lib import subprocessio
+from rhodecode.lib.utils2 import safe_int
+from rhodecode.lib.clone_cache import get_clone_cache, \
+    get_upload_pack_key, get_repo_state, iter_file
 
 log = logging.getLogger(__name__)
 
@@ -38,9 +45,228 @@ class FileWrapper(object):
         )
 
 
+class CountingStream(object):
+    """
+    Stream counting bytes read from ``fd``
+    """
+
+    def __init__(self, fd):
+        self.fd = fd
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fd.read(size)
+        if data:
+            self.bytes_read += len(data)
+        return data
+
+
+class GunzipStream(object):
+    """
+    Stream of decompressed content of gzipped ``fd``, it doesn't need to be
+    seekable
+    """
+
+    def __init__(self, fd, chunk_size=64 * 1024):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._buffer = ''
+        self._eof = False
+
+    def read(self, size=-1):
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            data = self.fd.read(self.chunk_size)
+            if data:
+                self._buffer += self._decompressor.decompress(data)
+            else:
+                self._buffer += self._decompressor.flush()
+                self._eof = True
+        if size < 0:
+            data, self._buffer = self._buffer, ''
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+class PrefixedStream(object):
+    """
+    Stream which gives already read ``prefix`` before rest of ``fd``
+    """
+
+    def __init__(self, prefix, fd):
+        self.prefix = prefix
+        self.fd = fd
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.fd.read(size)
+        if size < 0:
+            data, self.prefix = self.prefix + self.fd.read(), ''
+        else:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+        return data
+
+
+class GitServicePool(object):
+    """
+    Bounds number of git processes serving smart HTTP requests, in total and
+    per repository. Requests over the limits wait in a queue and those
+    waiting longer than ``timeout`` seconds are refused, so clone storms are
+    served gradually instead of overloading the server.
+    """
+
+    def __init__(self, max_processes, max_per_repo, timeout):
+        self.max_processes = max_processes
+        self.max_per_repo = max_per_repo
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        # {repo_name: number of running processes}
+        self._repos = {}
+        self._running = 0
+        self._waiting = 0
+        self._stats = dict(served=0, rejected=0, bytes_served=0,
+                           wait_time=0.0, max_wait_time=0.0)
+
+    def __repr__(self):
+        return '<%s (%s running, %s waiting)>' % (self.__class__.__name__,
+                                                 self._running, self._waiting)
+
+    def _can_run(self, repo_name):
+        return (self._running < self.max_processes and
+                self._repos.get(repo_name, 0) < self.max_per_repo)
+
+    def acquire(self, repo_name):
+        """
+        Waits until git process for given repository can be started. Returns
+        number of seconds spent waiting, or ``None`` if it timed out
+        """
+        start = time.time()
+        self._cond.acquire()
+        try:
+            self._waiting += 1
+            try:
+                while not self._can_run(repo_name):
+                    remaining = start + self.timeout - time.time()
+                    if remaining <= 0:
+                        self._stats['rejected'] += 1
+                        return None
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._running += 1
+            self._repos[repo_name] = self._repos.get(repo_name, 0) + 1
+            waited = time.time() - start
+            self._stats['wait_time'] += waited
+            self._stats['max_wait_time'] = max(self._stats['max_wait_time'],
+                                               waited)
+            return waited
+        finally:
+            self._cond.release()
+
+    def release(self, repo_name, bytes_served=0):
+        self._cond.acquire()
+        try:
+            self._running -= 1
+            self._repos[repo_name] -= 1
+            if not self._repos[repo_name]:
+                del self._repos[repo_name]
+            self._stats['served'] += 1
+            self._stats['bytes_served'] += bytes_served
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+    def get_stats(self):
+        """
+        Returns dict with numbers of running, waiting, served and rejected
+        requests, bytes served and total and max seconds spent in queue
+        """
+        self._cond.acquire()
+        try:
+            stats = dict(self._stats)
+            stats['running'] = self._running
+            stats['waiting'] = self._waiting
+            return stats
+        finally:
+            self._cond.release()
+
+
+_pool = None
+
+
+def get_git_service_pool():
+    """
+    Returns pool of git service processes of this process configured by
+    ``git_service_processes``, ``git_service_processes_per_repo`` and
+    ``git_service_queue_timeout`` (in seconds), or ``None`` if it's disabled
+    """
+    global _pool
+    if _pool is None:
+        conf = rhodecode.CONFIG
+        max_processes = safe_int(conf.get('git_service_processes', 3), 3)
+        max_per_repo = safe_int(conf.get('git_service_processes_per_repo',
+                                         2), 2)
+        timeout = safe_int(conf.get('git_service_queue_timeout', 10), 10)
+        if max_per_repo <= 0:
+            max_per_repo = max_processes
+        if max_processes > 0:
+            _pool = GitServicePool(max_processes, max_per_repo, timeout)
+        else:
+            _pool = False
+    return _pool or None
+
+
+class ServiceOutput(object):
+    """
+    Iterates over output of a git process started within the pool, counts
+    sent bytes and gives the place in pool back once it's closed. Given
+    ``on_close`` callback is called after that
+    """
+
+    def __init__(self, output, pool, repo_name, git_command, waited,
+                 on_close=None):
+        self.output = output
+        self.pool = pool
+        self.repo_name = repo_name
+        self.git_command = git_command
+        self.waited = waited
+        self.on_close = on_close
+        self.bytes_served = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        data = self.output.next()
+        self.bytes_served += len(data)
+        return data
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.output.close()
+        finally:
+            if self.pool is not None:
+                self.pool.release(self.repo_name, self.bytes_served)
+                log.info('%s of %s waited %.3fs in queue and sent %s bytes'
+                         % (self.git_command, self.repo_name, self.waited,
+                            self.bytes_served))
+            if self.on_close is not None:
+                self.on_close()
+
+    def __del__(self):
+        self.close()
+
+
 class GitRepository(object):
     git_folder_signature = set(['config', 'head', 'info', 'objects', 'refs'])
     commands = ['git-upload-pack', 'git-receive-pack']
+    # upload-pack requests up to this size are checked for full clones
+    max_clone_request_size = 1024 * 1024
 
     def __init__(self, repo_name, content_path, extras):
         files = set([f.lower() for f in os.listdir(content_path)])
@@ -82,17 +308,15 @@ class GitRepository(object):
         # if you do add '\n' as part of data, count it.
         server_advert = '# service=%s' % git_command
         packet_len = str(hex(len(server_advert) + 4)[2:].rjust(4, '0')).lower()
-        try:
-            out = subprocessio.SubprocessIOChunker(
-                r'git %s --stateless-rpc --advertise-refs "%s"' % (
-                                git_command[4:], self.content_path),
-                starting_values=[
-                    packet_len + server_advert + '0000'
-                ]
-            )
-        except EnvironmentError, e:
-            log.error(traceback.format_exc())
-            raise exc.HTTPExpectationFailed()
+        cmd = r'git %s --stateless-rpc --advertise-refs "%s"' % (
+                                git_command[4:], self.content_path)
+        out = self._run(git_command, cmd,
+            starting_values=[
+                packet_len + server_advert + '0000'
+            ]
+        )
+        if out is None:
+            return self._busy()
         resp = Response()
         resp.content_type = 'application/x-%s-advertisement' % str(git_command)
         resp.charset = None
@@ -116,28 +340,53 @@ class GitRepository(object):
                                       request.content_length)
         else:
             inputstream = environ['wsgi.input']
+        if environ.get('HTTP_CONTENT_ENCODING') == 'gzip':
+            # git gzips bigger upload-pack requests
+            inputstream = GunzipStream(inputstream)
 
-        try:
-            gitenv = os.environ
-            from rhodecode.lib.compat import json
-            gitenv['RHODECODE_EXTRAS'] = json.dumps(self.extras)
-            # forget all configs
-            gitenv['GIT_CONFIG_NOGLOBAL'] = '1'
-            opts = dict(
-                env=gitenv,
-                cwd=os.getcwd()
-            )
-            cmd = r'git %s --stateless-rpc "%s"' % (git_command[4:],
-                                                    self.content_path),
-            log.debug('handling cmd %s' % cmd)
-            out = subprocessio.SubprocessIOChunker(
-                cmd,
-                inputstream=inputstream,
-                **opts
-            )
-        except EnvironmentError, e:
-            log.error(traceback.format_exc())
-            raise exc.HTTPExpectationFailed()
+        on_close = None
+        if git_command == 'git-receive-pack':
+            inputstream = CountingStream(inputstream)
+            on_close = lambda: self._add_pushed_size(inputstream.bytes_read)
+
+        cache_key = None
+        store = get_clone_cache()
+        if git_command == 'git-upload-pack' and store is not None:
+            body = inputstream.read(self.max_clone_request_size + 1)
+            if len(body) > self.max_clone_request_size:
+                inputstream = PrefixedStream(body, inputstream)
+            elif body:
+                inputstream = body
+                key = get_upload_pack_key(body)
+                state = None
+                if key is not None:
+                    state = get_repo_state(self.repo_name, self.content_path)
+                if state is not None:
+                    cache_key = (state, key)
+                    path = store.get(cache_key)
+                    if path is not None:
+                        log.debug('sending %s of %s from clone cache'
+                                  % (git_command, self.repo_name))
+                        return self._send_cached(git_command, path)
+
+        # environment of this request only, os.environ is shared by all
+        # threads
+        gitenv = dict(os.environ)
+        from rhodecode.lib.compat import json
+        gitenv['RHODECODE_EXTRAS'] = json.dumps(self.extras)
+        # forget all configs
+        gitenv['GIT_CONFIG_NOGLOBAL'] = '1'
+        opts = dict(
+            env=gitenv,
+            cwd=os.getcwd()
+        )
+        cmd = r'git %s --stateless-rpc "%s"' % (git_command[4:],
+                                                self.content_path),
+        log.debug('handling cmd %s' % cmd)
+        out = self._run(git_command, cmd, cache_key=cache_key,
+                        on_close=on_close, inputstream=inputstream, **opts)
+        if out is None:
+            return self._busy()
 
         if git_command in [u'git-receive-pack']:
             # updating refs manually after each push.
@@ -153,6 +402,67 @@ class GitRepository(object):
         resp.app_iter = out
         return resp
 
+    def _run(self, git_command, cmd, cache_key=None, on_close=None,
+             **kwargs):
+        """
+        Starts git process once there's place for it in the pool, returns
+        iterator over its output or ``None`` if it waited too long
+
+        :param cache_key: output is stored under it in clone cache
+        :param on_close: called once the output is closed
+        """
+        pool = get_git_service_pool()
+        if pool is None:
+            waited = None
+        else:
+            waited = pool.acquire(self.repo_name)
+            if waited is None:
+                log.warning('%s of %s refused, %s' % (git_command,
+                                                      self.repo_name, pool))
+                return None
+        try:
+            out = subprocessio.SubprocessIOChunker(cmd, **kwargs)
+        except EnvironmentError, e:
+            log.error(traceback.format_exc())
+            if pool is not None:
+                pool.release(self.repo_name)
+            raise exc.HTTPExpectationFailed()
+        if cache_key is not None:
+            out = get_clone_cache().iter_create(cache_key, out)
+        if pool is None and on_close is None:
+            return out
+        return ServiceOutput(out, pool, self.repo_name, git_command, waited,
+                             on_close)
+
+    def _add_pushed_size(self, size):
+        """
+        Adds size of pushed pack to recorded size of the repository
+        """
+        from rhodecode.model.meta import Session
+        from rhodecode.model.scm import ScmModel
+        try:
+            ScmModel().add_repo_size(self.repo_name, size)
+            Session().commit()
+        except Exception:
+            log.error(traceback.format_exc())
+            Session().rollback()
+        finally:
+            Session.remove()
+
+    def _send_cached(self, git_command, path):
+        resp = Response()
+        resp.content_type = 'application/x-%s-result' % str(git_command)
+        resp.charset = None
+        resp.app_iter = iter_file(path)
+        resp.content_length = os.path.getsize(path)
+        return resp
+
+    def _busy(self):
+        pool = get_git_service_pool()
+        return exc.HTTPServiceUnavailable(
+            'Too many git requests, try again later',
+            headers=[('Retry-After', str(pool.timeout))])
+
     def __call__(self, environ, start_response):
         request = Request(environ)
         _path = self._get_fixedpath(request.path_info)
@@ -30,7 +30,7 @@ import logging
 import traceback
 
 from dulwich import server as dulserver
-from dulwich.web import LimitedInputFilter, GunzipFilter
+from dulwich.web import LimitedInputFilter
 from rhodecode.lib.exceptions import HTTPLockedRC
 from rhodecode.lib.hooks import pre_pull
 
@@ -257,7 +257,9 @@ class SimpleGit(BaseVCSController):
             repo_name=repo_name,
             extras=extras,
         )
-        app = GunzipFilter(LimitedInputFilter(app))
+        # gzipped requests are decompressed by the app, GunzipFilter needs
+        # seekable input
+        app = LimitedInputFilter(app)
         return app
 
     def __get_repository(self, environ):
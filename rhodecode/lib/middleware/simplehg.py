@@ -28,8 +28,11 @@ import os
 import logging
 import traceback
 
+from mercurial import hg
 from mercurial.error import RepoError
 from mercurial.hgweb import hgweb_mod
+from mercurial.hgweb.protocol import HGTYPE
+from mercurial.node import hex
 
 from paste.httpheaders import REMOTE_USER, AUTH_TYPE
 from webob.exc import HTTPNotFound, HTTPForbidden, HTTPInternalServerError, \
@@ -42,6 +45,10 @@ from rhodecode.lib.utils import make_ui, is_valid_repo, ui_sections
 from rhodecode.lib.compat import json
 from rhodecode.model.db import User
 from rhodecode.lib.exceptions import HTTPLockedRC
+from rhodecode.lib.clone_cache import get_clone_cache, get_getbundle_key, \
+    get_repo_state, cache_response, iter_file
+from rhodecode.lib.hooks import refresh_repository
+from rhodecode.model.meta import Session
 
 
 log = logging.getLogger(__name__)
@@ -164,6 +171,9 @@ class SimpleHg(BaseVCSController):
             'make_lock': None,
             'locked_by': [None, None]
         }
+        if action == 'push':
+            # recorded size of repository grows by size of pushed bundle
+            extras['pushed_size'] = environ.get('CONTENT_LENGTH') or 0
         #======================================================================
         # MERCURIAL REQUEST HANDLING
         #======================================================================
@@ -196,6 +206,12 @@ class SimpleHg(BaseVCSController):
                 self._invalidate_cache(repo_name)
             log.info('%s action on HG repo "%s"' % (action, repo_name))
             app = self.__make_app(repo_path, baseui, extras)
+            if action == 'pull':
+                return self.__serve_pull(app, repo_name, repo_path, baseui,
+                                         environ, start_response)
+            if action == 'push':
+                return self.__serve_push(app, repo_name, environ,
+                                         start_response)
             return app(environ, start_response)
         except RepoError, e:
             if str(e).find('not found') != -1:
@@ -214,6 +230,50 @@ class SimpleHg(BaseVCSController):
         """
         return hgweb_mod.hgweb(repo_name, name=repo_name, baseui=baseui)
 
+    def __serve_push(self, app, repo_name, environ, start_response):
+        """
+        Passes push to hgweb and refreshes the repository afterwards, hgweb
+        applies pushed changesets before it returns
+        """
+        resp = app(environ, start_response)
+        try:
+            refresh_repository(repo_name)
+        except Exception:
+            log.error(traceback.format_exc())
+            Session().rollback()
+        return resp
+
+    def __serve_pull(self, app, repo_name, repo_path, baseui, environ,
+                     start_response):
+        """
+        Sends bundles of full clones from clone cache, they're stored there
+        while hgweb sends them first time. Other requests are passed to hgweb
+        """
+        store = get_clone_cache()
+        key = get_getbundle_key(environ)
+        if store is None or key is None:
+            return app(environ, start_response)
+
+        state = get_repo_state(repo_name, repo_path)
+        if state is None:
+            return app(environ, start_response)
+        key = (state, key)
+        path = store.get(key)
+        if path is None:
+            return cache_response(store, key, app, environ, start_response)
+
+        log.debug('sending bundle of %s from clone cache' % repo_name)
+        # run hooks hgweb runs while it makes the bundle, they log the pull
+        repo = hg.repository(baseui, repo_path)
+        repo.hook('preoutgoing', throw=True, source='serve')
+        if len(repo):
+            repo.hook('outgoing', node=hex(repo.changelog.node(0)),
+                      source='serve')
+        start_response('200 Script output follows',
+                       [('Content-Type', HGTYPE),
+                        ('Content-Length', str(os.path.getsize(path)))])
+        return iter_file(path)
+
     def __get_repository(self, environ):
         """
         Get's repository name out of PATH_INFO header
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.scm_registry
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Size bounded registry of open scm instances of a process
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import logging
+import threading
+import traceback
+
+import rhodecode
+from rhodecode.lib.compat import OrderedDict
+from rhodecode.lib.utils2 import safe_int, str2bool
+
+log = logging.getLogger(__name__)
+
+# files changed by every change of refs, relative to repository path
+HG_REF_FILES = ('.hg/store/00changelog.i', '.hg/store/phaseroots',
+                '.hg/bookmarks', '.hg/localtags')
+# relative to git dir, refs are updated by renaming files in their dirs
+GIT_REF_FILES = ('HEAD', 'packed-refs')
+# every directory within them is checked, refs like feature/x are nested
+GIT_REF_DIRS = ('refs/heads', 'refs/tags')
+
+# rough memory footprint of an instance and of each of its changesets
+INSTANCE_SIZE = 256 * 1024
+CHANGESET_SIZE = 256
+
+
+def get_refs_stamp(path):
+    """
+    Returns stamp of refs of repository at given path, it changes whenever
+    repository gets new changesets, branches, tags or bookmarks. It's made
+    from a few ``stat`` calls only, one per directory of git refs
+    """
+    dirs = ()
+    if os.path.isdir(os.path.join(path, '.hg')):
+        files = HG_REF_FILES
+    else:
+        git_dir = os.path.join(path, '.git')
+        if os.path.isdir(git_dir):
+            path = git_dir
+        files = GIT_REF_FILES
+        dirs = GIT_REF_DIRS
+
+    stamp = [_stat(os.path.join(path, name)) for name in files]
+    for name in dirs:
+        top = os.path.join(path, name)
+        stamp.append(_stat(top))
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for dirname in dirnames:
+                nested = os.path.join(dirpath, dirname)
+                stamp.append((nested, _stat(nested)))
+    return tuple(stamp)
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_mtime, st.st_size
+
+
+def estimate_size(repo):
+    """
+    Returns estimated number of bytes given scm instance keeps in memory
+    """
+    try:
+        if repo.alias == 'hg':
+            # doesn't build list of all revisions just to count them
+            count = len(repo._repo)
+        else:
+            count = len(repo.revisions)
+    except Exception:
+        log.error(traceback.format_exc())
+        count = 0
+    return INSTANCE_SIZE + count * CHANGESET_SIZE
+
+
+class ScmInstanceRegistry(object):
+    """
+    Keeps open scm instances of repositories, so hot repositories don't
+    re-read their refs on every request. Instance is reused only as long as
+    cache version of its repository and stamp of its refs didn't change.
+    Least recently used instances are dropped when their estimated size
+    grows over ``max_size`` bytes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # {key: (instance, path, version, stamp, size)}, least recently
+        # used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __repr__(self):
+        return '<%s (%s instances, %s bytes)>' % (self.__class__.__name__,
+                                                 len(self._entries),
+                                                 self._size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[4]
+        return entry
+
+    def _put(self, key, entry):
+        self._pop(key)
+        self._entries[key] = entry
+        self._size += entry[4]
+
+    def get(self, key, path, version, create):
+        """
+        Returns instance registered under ``key``, or registers new one
+        returned by ``create`` if there's none or it's outdated
+
+        :param key: repository name
+        :param path: full path of the repository
+        :param version: current cache version of the repository
+        :param create: callable creating new instance
+        """
+        stamp = get_refs_stamp(path)
+        self._lock.acquire()
+        try:
+            entry = self._pop(key)
+            if entry is not None and entry[1:4] == (path, version, stamp):
+                # moves it to the most recently used end
+                self._put(key, entry)
+                return entry[0]
+        finally:
+            self._lock.release()
+
+        log.debug('creating new scm instance of %s' % key)
+        repo = create()
+        if repo is None:
+            return None
+        size = estimate_size(repo)
+        if size > self.max_size:
+            log.debug('not keeping %s bytes big instance of %s'
+                      % (size, key))
+            return repo
+
+        self._lock.acquire()
+        try:
+            self._put(key, (repo, path, version, stamp, size))
+            while self._size > self.max_size:
+                oldest = iter(self._entries).next()
+                log.debug('dropping least recently used instance of %s'
+                          % oldest)
+                self._pop(oldest)
+        finally:
+            self._lock.release()
+        return repo
+
+    def remove(self, key):
+        self._lock.acquire()
+        try:
+            self._pop(key)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._size = 0
+        finally:
+            self._lock.release()
+
+
+_registry = None
+
+
+def get_scm_registry():
+    """
+    Returns registry of scm instances of this process, bounded by
+    ``vcs_full_cache_size`` (in megabytes), or ``None`` if it's disabled by
+    ``vcs_full_cache = false``
+    """
+    global _registry
+    if _registry is None:
+        conf = rhodecode.CONFIG
+        max_size = safe_int(conf.get('vcs_full_cache_size', 128), 128)
+        if str2bool(conf.get('vcs_full_cache', True)) and max_size > 0:
+            _registry = ScmInstanceRegistry(max_size * 1024 * 1024)
+        else:
+            _registry = False
+    # empty registry is false, so it's compared to False explicitly
+    if _registry is False:
+        return None
+    return _registry
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.lib.search_cache
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Memory bounded cache of pages of full text search results
+
+    :created_on: Oct 18, 2026
+    :author: marcink
+    :copyright: (C) 2010-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+
+import rhodecode
+from rhodecode.lib.compat import OrderedDict
+from rhodecode.lib.utils2 import safe_int
+
+log = logging.getLogger(__name__)
+
+# rough memory footprint of a python object besides its content
+OBJECT_SIZE = 64
+
+
+def estimate_size(value):
+    """
+    Returns estimated number of bytes given value of strings, numbers,
+    lists, tuples and dicts keeps in memory
+    """
+    if isinstance(value, basestring):
+        return OBJECT_SIZE + len(value) * (4 if isinstance(value, unicode)
+                                           else 1)
+    if isinstance(value, dict):
+        return OBJECT_SIZE + sum(estimate_size(k) + estimate_size(v)
+                                 for k, v in value.iteritems())
+    if isinstance(value, (list, tuple)):
+        return OBJECT_SIZE + sum(estimate_size(v) for v in value)
+    return OBJECT_SIZE
+
+
+class CachedPage(object):
+    """
+    Search results of which only items of one page are known, it's sliced
+    by ``Page`` the same way as whole results would be
+    """
+
+    def __init__(self, count, items):
+        self.count = count
+        self.items = items
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, key):
+        return self.items
+
+
+class SearchCache(object):
+    """
+    Keeps pages of search results. Keys hold version of the searched index,
+    so entries of older versions are never hit again and are dropped as
+    least recently used ones when estimated size of the cache grows over
+    ``max_size`` bytes.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # {key: (value, size)}, least recently used first
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def __repr__(self):
+        return '<%s (%s entries, %s bytes)>' % (self.__class__.__name__,
+                                               len(self._entries),
+                                               self._size)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[1]
+        return entry
+
+    def get(self, key):
+        """
+        Returns value stored under ``key`` or ``None`` if it's not cached
+        """
+        self._lock.acquire()
+        try:
+            entry = self._pop(key)
+            if entry is None:
+                return None
+            # moves it to the most recently used end
+            self._entries[key] = entry
+            self._size += entry[1]
+            return entry[0]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_size:
+            log.debug('not caching %s bytes big search results' % size)
+            return
+        self._lock.acquire()
+        try:
+            self._pop(key)
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                self._pop(iter(self._entries).next())
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+            self._size = 0
+        finally:
+            self._lock.release()
+
+
+_cache = None
+
+
+def get_search_cache():
+    """
+    Returns search results cache of this process, bounded by
+    ``search_cache_size`` (in megabytes), or ``None`` if it's disabled
+    """
+    global _cache
+    if _cache is None:
+        conf = rhodecode.CONFIG
+        max_size = safe_int(conf.get('search_cache_size', 32), 32)
+        if max_size > 0:
+            _cache = SearchCache(max_size * 1024 * 1024)
+        else:
+            _cache = False
+    # empty cache is false, so it's compared to False explicitly
+    if _cache is False:
+        return None
+    return _cache
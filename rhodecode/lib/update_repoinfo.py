@@ -76,6 +76,13 @@ class UpdateCommand(BasePasterCommand):
             last_change = repo.scm_instance.last_change
             repo.update_last_change(last_change)
 
+        if self.options.update_size:
+            from rhodecode.model.scm import ScmModel
+            from rhodecode.model.meta import Session
+            for repo in repo_list:
+                ScmModel().update_repo_size(repo)
+                Session().commit()
+
     def update_parser(self):
         self.parser.add_option('--update-only',
                           action='store',
@@ -83,3 +90,10 @@ class UpdateCommand(BasePasterCommand):
                           help="Specifies a comma separated list of repositores "
                                 "to update last commit info for. OPTIONAL",
                           )
+        self.parser.add_option('--update-size',
+                          action='store_true',
+                          dest='update_size',
+                          default=False,
+                          help="Measures sizes of repositories on disk and "
+                               "records them. OPTIONAL",
+                          )
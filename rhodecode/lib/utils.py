@@ -25,7 +25,9 @@
 
 import os
 import re
+import Queue
 import logging
+import threading
 import datetime
 import traceback
 import paste
@@ -46,7 +48,7 @@ from webhelpers.text import collapse, remove_formatting, strip_tags
 from rhodecode.lib.vcs import get_backend
 from rhodecode.lib.vcs.backends.base import BaseChangeset
 from rhodecode.lib.vcs.utils.lazy import LazyProperty
-from rhodecode.lib.vcs.utils.helpers import get_scm
+from rhodecode.lib.vcs.utils.helpers import get_scm, ALIASES
 from rhodecode.lib.vcs.exceptions import VCSError
 
 from rhodecode.lib.caching_query import FromCache
@@ -173,37 +175,157 @@ def action_logger(user, action, repo, ipaddr='', sa=None, commit=False):
         raise
 
 
-def get_repos(path, recursive=False):
+def get_repo_type(path, names=None):
     """
-    Scans given path for repos and return (name,(type,path)) tuple
+    Returns alias of scm of repository at given directory found by its
+    marker directories, ``None`` if it's a removed repository or ``False``
+    if it's not a repository. It doesn't open the repository, so it's
+    much cheaper than ``get_scm``
+
+    :param path: path of the directory
+    :param names: names of files in the directory if they're already listed
+    """
+    if names is None:
+        names = os.listdir(path)
+    names = set(names)
+    found = []
+    for alias in ALIASES:
+        if '.' + alias in names and os.path.isdir(os.path.join(path,
+                                                               '.' + alias)):
+            found.append(alias)
+        elif 'rm__.' + alias in names:
+            return None
+        # bare git repositories don't have working directory
+        elif alias == 'git' and 'objects' in names and 'refs' in names \
+            and os.path.isdir(os.path.join(path, 'objects')) \
+            and os.path.isdir(os.path.join(path, 'refs')):
+            found.append(alias)
+    if len(found) != 1:
+        return False
+    return found[0]
+
+
+def _scan_dir(path):
+    """
+    Returns lists of (alias, path) of repositories and of other
+    subdirectories of given directory
+    """
+    repos, dirs = [], []
+    if not os.access(path, os.W_OK):
+        return repos, dirs
+    for name in sorted(os.listdir(path)):
+        cur_path = os.path.join(path, name)
+        try:
+            names = os.listdir(cur_path)
+        except OSError:
+            # files, broken links and not readable directories
+            continue
+        alias = get_repo_type(cur_path, names)
+        if alias is False:
+            dirs.append(cur_path)
+        else:
+            repos.append((alias, cur_path))
+    return repos, dirs
+
+
+def get_repos(path, recursive=False, workers=8):
+    """
+    Scans given path for repos and return (name,(type,path)) tuple.
+    Directories are listed by ``workers`` threads at once and repositories
+    are yielded as soon as they're found, not in any particular order.
+    Removed repositories have ``None`` type.
 
     :param path: path to scan for repositories
     :param recursive: recursive search and return names with subdirs in front
+    :param workers: number of threads listing directories
     """
 
     # remove ending slash for better results
     path = path.rstrip(os.sep)
 
-    def _get_repos(p):
-        if not os.access(p, os.W_OK):
-            return
-        for dirpath in os.listdir(p):
-            if os.path.isfile(os.path.join(p, dirpath)):
-                continue
-            cur_path = os.path.join(p, dirpath)
+    def _get_name(repo_path):
+        return repo_path.split(path, 1)[-1].lstrip(os.sep)
+
+    if workers <= 1:
+        pending = [path]
+        while pending:
+            repos, dirs = _scan_dir(pending.pop(0))
+            for alias, repo_path in repos:
+                yield _get_name(repo_path), (alias, repo_path)
+            if recursive:
+                pending.extend(dirs)
+        return
+
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+
+    def _worker():
+        while True:
+            dir_path = tasks.get()
+            if dir_path is None:
+                break
             try:
-                scm_info = get_scm(cur_path)
-                yield scm_info[1].split(path, 1)[-1].lstrip(os.sep), scm_info
-            except VCSError:
-                if not recursive:
-                    continue
-                #check if this dir containts other repos for recursive scan
-                rec_path = os.path.join(p, dirpath)
-                if os.path.isdir(rec_path):
-                    for inner_scm in _get_repos(rec_path):
-                        yield inner_scm
+                results.put((_scan_dir(dir_path), None))
+            except Exception, e:
+                log.error(traceback.format_exc())
+                results.put((([], []), e))
+
+    threads = []
+    for i in xrange(workers):
+        t = threading.Thread(target=_worker, name='repo-scan-%s' % i)
+        t.setDaemon(True)
+        t.start()
+        threads.append(t)
+
+    tasks.put(path)
+    pending = 1
+    try:
+        while pending:
+            (repos, dirs), error = results.get()
+            pending -= 1
+            if error is not None:
+                raise error
+            if recursive:
+                for dir_path in dirs:
+                    tasks.put(dir_path)
+                    pending += 1
+            for alias, repo_path in repos:
+                yield _get_name(repo_path), (alias, repo_path)
+    finally:
+        # workers finish listing of already queued directories and stop
+        for t in threads:
+            tasks.put(None)
+
+
+def get_scm_size(alias, root_path):
+    """
+    Returns sizes of files of scm (in ``alias`` directory) and of working
+    directory of repository at given path. It walks whole repository, so
+    it's used only when there's no recorded size of repository
 
-    return _get_repos(path)
+    :param alias: name of scm directory, i.e. ``.hg``
+    :param root_path: full path of repository
+    """
+
+    if not alias.startswith('.'):
+        alias += '.'
+
+    size_scm, size_root = 0, 0
+    for path, dirs, files in os.walk(safe_str(root_path)):
+        if path.find(alias) != -1:
+            for f in files:
+                try:
+                    size_scm += os.path.getsize(os.path.join(path, f))
+                except OSError:
+                    pass
+        else:
+            for f in files:
+                try:
+                    size_root += os.path.getsize(os.path.join(path, f))
+                except OSError:
+                    pass
+
+    return size_scm, size_root
 
 
 def is_valid_repo(repo_name, base_path, scm=None):
@@ -398,19 +520,22 @@ def map_groups(path):
 
 
 def repo2db_mapper(initial_repo_list, remove_obsolete=False,
-                   install_git_hook=False):
+                   install_git_hook=False, batch_size=100):
     """
     maps all repos given in initial_repo_list, non existing repositories
     are created, if remove_obsolete is True it also check for db entries
     that are not in initial_repo_list and removes them.
 
-    :param initial_repo_list: list of repositories found by scanning methods
+    :param initial_repo_list: list of repositories found by scanning methods,
+        either a dict of scm instances by names or an iterable of
+        ``ScannedRepo``, which is mapped while it's being scanned
     :param remove_obsolete: check for obsolete entries in database
     :param install_git_hook: if this is True, also check and install githook
         for a repo if missing
+    :param batch_size: number of repositories mapped in one transaction
     """
     from rhodecode.model.repo import RepoModel
-    from rhodecode.model.scm import ScmModel
+    from rhodecode.model.scm import ScmModel, ScannedRepo
     sa = meta.Session()
     rm = RepoModel()
     user = sa.query(User).filter(User.admin == True).first()
@@ -423,7 +548,19 @@ def repo2db_mapper(initial_repo_list, remove_obsolete=False,
 #    CacheInvalidation.clear_cache()
 #    sa.commit()
 
-    for name, repo in initial_repo_list.items():
+    if isinstance(initial_repo_list, dict):
+        initial_repo_list = [ScannedRepo(name, repo.alias, repo.path,
+                                         scm_instance=repo)
+                             for name, repo in initial_repo_list.items()]
+    names = set()
+    for scanned in initial_repo_list:
+        name = scanned.name
+        try:
+            repo = scanned.scm_instance
+        except OSError:
+            log.error(traceback.format_exc())
+            continue
+        names.add(name)
         group = map_groups(name)
         db_repo = rm.get_by_repo_name(name)
         # found repo that is on filesystem not in RhodeCode database
@@ -448,19 +585,17 @@ def repo2db_mapper(initial_repo_list, remove_obsolete=False,
         elif install_git_hook:
             if db_repo.repo_type == 'git':
                 ScmModel().install_git_hook(db_repo.scm_instance)
-        # during starting install all cache keys for all repositories in the
-        # system, this will register all repos and multiple instances
-        key, _prefix, _org_key = CacheInvalidation._get_key(name)
-        CacheInvalidation.invalidate(name)
-        log.debug("Creating a cache key for %s instance_id=>`%s`"
-                  % (name, _prefix or '-'))
+        # refresh dashboard summary using already created scm instance
+        ScmModel().update_repo_summary(db_repo or new_repo, scm_repo=repo)
+        if len(names) % batch_size == 0:
+            sa.commit()
 
     sa.commit()
     removed = []
     if remove_obsolete:
         # remove from database those repositories that are not in the filesystem
         for repo in sa.query(Repository).all():
-            if repo.repo_name not in initial_repo_list.keys():
+            if repo.repo_name not in names:
                 log.debug("Removing non-existing repository found in db `%s`" %
                           repo.repo_name)
                 try:
@@ -10,8 +10,10 @@
 """
 
 
+import time
 from itertools import chain
-from rhodecode.lib.vcs.utils import author_name, author_email
+from rhodecode.lib.vcs.utils import author_name, author_email, safe_str
+from rhodecode.lib.vcs.utils.archivers import iter_archive
 from rhodecode.lib.vcs.utils.lazy import LazyProperty
 from rhodecode.lib.vcs.utils.helpers import get_dict_for_attrs
 from rhodecode.lib.vcs.conf import settings
@@ -19,7 +21,8 @@ from rhodecode.lib.vcs.conf import settings
 from rhodecode.lib.vcs.exceptions import ChangesetError, EmptyRepositoryError, \
     NodeAlreadyAddedError, NodeAlreadyChangedError, NodeAlreadyExistsError, \
     NodeAlreadyRemovedError, NodeDoesNotExistError, NodeNotChangedError, \
-    RepositoryError
+    RepositoryError, BranchDoesNotExistError, ImproperArchiveTypeError, \
+    VCSError
 
 
 class BaseRepository(object):
@@ -175,8 +178,79 @@ class BaseRepository(object):
     def __getitem__(self, key):
         return self.get_changeset(key)
 
-    def count(self):
-        return len(self.revisions)
+    def count(self, branch_name=None):
+        """
+        Returns number of changesets in repository, or in given
+        ``branch_name`` if specified
+        """
+        if not branch_name:
+            return len(self.revisions)
+        return len(self.get_branch_revisions(branch_name))
+
+    def get_changesets_page(self, branch_name=None, offset=0, limit=None):
+        """
+        Returns list of at most ``limit`` changesets in ascending order,
+        starting at ``offset`` of whole repository or given ``branch_name``
+        history. Only changesets within the page are instantiated.
+
+        :param branch_name: if specified, only changesets of given branch
+          are paginated
+        :param offset: position of first returned changeset
+        :param limit: maximum number of returned changesets, ``None`` means
+          all remaining ones
+
+        :raise BranchDoesNotExistError: If given ``branch_name`` does not
+          exist.
+        """
+        if not branch_name:
+            revisions = self.revisions
+        else:
+            revisions = self.get_branch_revisions(branch_name)
+        end = None
+        if limit is not None:
+            end = offset + limit
+        return self.get_changesets_bulk(revisions[offset:end])
+
+    def get_changesets_bulk(self, revisions):
+        """
+        Returns list of changesets for given ``revisions``, in the same
+        order. Backends may read all of them at once and fill in message,
+        author, date, parents, branch and tags up front, which is much cheaper
+        for list views than calling ``get_changeset`` for each of them.
+
+        :param revisions: list of revisions' ids
+        """
+        return [self.get_changeset(rev) for rev in revisions]
+
+    @LazyProperty
+    def _branch_revisions(self):
+        return {}
+
+    def get_branch_revisions(self, branch_name):
+        """
+        Returns list of revisions' ids of given ``branch_name`` in ascending
+        order. Lists are computed once per branch head so they are recomputed
+        only after new changesets were pushed to the branch.
+
+        :raise BranchDoesNotExistError: If given ``branch_name`` does not
+          exist.
+        """
+        if branch_name not in self.branches:
+            raise BranchDoesNotExistError("Branch '%s' not found"
+                                          % branch_name)
+        head = self.branches[branch_name]
+        cached = self._branch_revisions.get(branch_name)
+        if cached is None or cached[0] != head:
+            cached = (head, self._get_branch_revisions(branch_name))
+            self._branch_revisions[branch_name] = cached
+        return cached[1]
+
+    def _get_branch_revisions(self, branch_name):
+        """
+        Computes list of revisions' ids of given ``branch_name`` in ascending
+        order
+        """
+        raise NotImplementedError
 
     def tag(self, name, user, revision=None, message=None, date=None, **opts):
         """
@@ -222,6 +296,17 @@ class BaseRepository(object):
         """
         raise NotImplementedError
 
+    def get_changed_paths(self, rev1, rev2):
+        """
+        Returns tuple of sorted lists of (added, changed, removed) file paths
+        between trees of ``rev1`` and ``rev2``, without reading any content.
+
+        :param rev1: Entry point from which changes are listed. Can be
+          ``self.EMPTY_CHANGESET`` - all files of ``rev2`` are added then
+        :param rev2: Until which revision changes should be listed.
+        """
+        raise NotImplementedError
+
     # ========== #
     # COMMIT API #
     # ========== #
@@ -561,6 +646,46 @@ class BaseChangeset(object):
                 break
             yield data
 
+    def iter_archive(self, kind='tgz', prefix=None, chunk_size=64 * 1024):
+        """
+        Returns iterable archive which is built while it's being read, file by
+        file. Unlike ``get_chunked_archive`` it doesn't need any stream to
+        fill, first chunk is returned at once and only currently archived file
+        is kept in memory.
+
+        :param kind: one of following: ``zip``, ``tar``, ``tgz``
+            or ``tbz2``. Default: ``tgz``.
+        :param prefix: name of root directory in archive.
+            Default is repository name and changeset's short_id joined with
+            dash.
+        :param chunk_size: minimal size of returned chunks. Default: 64k.
+
+        :raise ImproperArchiveTypeError: If given kind is wrong.
+        """
+        allowed_kinds = settings.ARCHIVE_SPECS.keys()
+        if kind not in allowed_kinds:
+            raise ImproperArchiveTypeError('Archive kind not supported use one'
+                'of %s', allowed_kinds)
+
+        if prefix is None:
+            prefix = '%s-%s' % (self.repository.name, self.short_id)
+        elif prefix.startswith('/'):
+            raise VCSError("Prefix cannot start with leading slash")
+        elif prefix.strip() == '':
+            raise VCSError("Prefix cannot be empty")
+
+        mtime = int(time.mktime(self.date.timetuple()))
+        return iter_archive(kind, self._get_archive_files(), safe_str(prefix),
+                            mtime, chunk_size)
+
+    def _get_archive_files(self):
+        """
+        Yields (path, stat mode, content) of all files of this changeset
+        """
+        for node in self.get_filenodes_generator():
+            yield (safe_str(node.path), node.mode,
+                   self.get_file_content(node.path))
+
     @LazyProperty
     def root(self):
         """
@@ -626,6 +751,15 @@ class BaseChangeset(object):
             for tup in self.walk(dirnode.path):
                 yield tup
 
+    def walk_paths(self, topurl=''):
+        """
+        Similar to ``walk`` method but yields tuples of paths (toppath,
+        dirpaths, filepaths) instead of nodes.
+        """
+        for topnode, dirs, files in self.walk(topurl):
+            yield (topnode.path, [d.path for d in dirs],
+                   [f.path for f in files])
+
     def get_filenodes_generator(self):
         """
         Returns generator that yields *all* file nodes.
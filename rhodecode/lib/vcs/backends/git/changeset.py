@@ -23,17 +23,19 @@ class GitChangeset(BaseChangeset):
     Represents state of the repository at single revision.
     """
 
-    def __init__(self, repository, revision):
+    def __init__(self, repository, revision, commit=None):
         self._stat_modes = {}
         self.repository = repository
 
-        try:
-            commit = self.repository._repo.get_object(revision)
-            if isinstance(commit, objects.Tag):
-                revision = commit.object[1]
-                commit = self.repository._repo.get_object(commit.object[1])
-        except KeyError:
-            raise RepositoryError("Cannot get object with id %s" % revision)
+        if commit is None:
+            try:
+                commit = self.repository._repo.get_object(revision)
+                if isinstance(commit, objects.Tag):
+                    revision = commit.object[1]
+                    commit = self.repository._repo.get_object(commit.object[1])
+            except KeyError:
+                raise RepositoryError("Cannot get object with id %s"
+                                      % revision)
         self.raw_id = revision
         self.id = self.raw_id
         self.short_id = self.raw_id[:12]
@@ -44,7 +46,7 @@ class GitChangeset(BaseChangeset):
         self._author_property = 'author'
         self._date_property = 'commit_time'
         self._date_tz_property = 'commit_timezone'
-        self.revision = repository.revisions.index(revision)
+        self.revision = repository._get_revision_index(revision)
 
         self.message = safe_unicode(commit.message)
 
@@ -185,15 +187,8 @@ class GitChangeset(BaseChangeset):
         """
         Returns list of children changesets.
         """
-        so, se = self.repository.run_git_command(
-            "rev-list --all --children | grep '^%s'" % self.raw_id
-        )
-
-        children = []
-        for l in so.splitlines():
-            childs = l.split(' ')[1:]
-            children.extend(childs)
-        return [self.repository.get_changeset(cs) for cs in children]
+        return [self.repository.get_changeset(rev) for rev in
+                self.repository._get_children_revisions(self.revision)]
 
     def next(self, branch=None):
 
@@ -0,0 +1,397 @@
+# -*- coding: utf-8 -*-
+"""
+    vcs.backends.git.commitgraph
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Persistent commit graph index for git repositories.
+
+    Index keeps every commit reachable from repository refs as a fixed size
+    record (sha, commit time, author, parents), position of a record is the
+    integer revision of a changeset. Full build stores them in the order of
+    ``git rev-list --all --reverse --date-order``, commits found when refs
+    change are appended in the same order after them, so revisions of
+    already indexed commits never change until history is rewritten and the
+    index is built again. File is memory mapped.
+"""
+
+import os
+import mmap
+import struct
+import logging
+import tempfile
+import traceback
+from binascii import hexlify, unhexlify
+from itertools import izip
+
+from dulwich.objects import Tag, Commit
+
+from rhodecode.lib.vcs.exceptions import RepositoryError
+
+log = logging.getLogger(__name__)
+
+nullrev = -1
+
+
+class CommitGraph(object):
+    """
+    Memory mapped commit graph of a ``GitRepository``.
+
+    File layout (all integers are big endian)::
+
+        header  magic, version, commits, tips, extra parents, authors size
+        tips    20 byte shas of refs index was built from
+        records commit sha, commit time, author idx, first and second parent
+        extra   (revision, parent) pairs of octopus merges
+        authors newline separated list of authors
+    """
+    MAGIC = 'RCCG'
+    VERSION = 1
+
+    _header = struct.Struct('>4sIIIII')
+    _record = struct.Struct('>20sqiii')
+    _extra = struct.Struct('>ii')
+
+    def __init__(self, repository, path):
+        self.repository = repository
+        self.path = path
+        self._map = None
+        self._tips = None
+        self._count = 0
+        self._records_offset = 0
+        self._extra_parents = {}
+        self._authors = None
+        self._authors_offset = 0
+        self._authors_size = 0
+        self._revision_map = None
+        self._children = None
+
+    def __len__(self):
+        return self._count
+
+    def __repr__(self):
+        return '<%s (%s) at %s>' % (self.__class__.__name__, self._count,
+                                    self.path)
+
+    @property
+    def loaded(self):
+        return self._map is not None
+
+    #==========================================================================
+    # READING
+    #==========================================================================
+
+    def _load(self):
+        """
+        Maps index file into memory, returns ``False`` if file is missing
+        or it's not a valid index
+        """
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return False
+        try:
+            try:
+                _map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (EnvironmentError, ValueError):
+                return False
+        finally:
+            f.close()
+
+        hsize = self._header.size
+        if len(_map) < hsize:
+            return False
+        magic, version, count, ntips, nextra, asize = \
+            self._header.unpack_from(_map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            log.debug('ignoring incompatible commit graph %s' % self.path)
+            return False
+
+        tips_end = hsize + ntips * 20
+        records_end = tips_end + count * self._record.size
+        extra_end = records_end + nextra * self._extra.size
+        if len(_map) != extra_end + asize:
+            log.warning('commit graph %s is truncated, rebuilding'
+                        % self.path)
+            return False
+
+        tips = set()
+        for offset in xrange(hsize, tips_end, 20):
+            tips.add(hexlify(_map[offset:offset + 20]))
+
+        extra_parents = {}
+        for offset in xrange(records_end, extra_end, self._extra.size):
+            rev, parent = self._extra.unpack_from(_map, offset)
+            extra_parents.setdefault(rev, []).append(parent)
+
+        self._map = _map
+        self._tips = tips
+        self._count = count
+        self._records_offset = tips_end
+        self._extra_parents = extra_parents
+        self._authors = None
+        self._authors_offset = extra_end
+        self._authors_size = asize
+        self._revision_map = None
+        self._children = None
+        return True
+
+    def _get_record(self, rev):
+        if rev < 0:
+            rev += self._count
+        if not 0 <= rev < self._count:
+            raise IndexError('revision %s out of range' % rev)
+        offset = self._records_offset + rev * self._record.size
+        return self._record.unpack_from(self._map, offset)
+
+    def get_raw_id(self, rev):
+        """
+        Returns full sha of commit at given integer ``rev``
+        """
+        return hexlify(self._get_record(rev)[0])
+
+    def get_revision(self, raw_id):
+        """
+        Returns integer revision of commit with given sha or ``None`` if it's
+        not indexed
+        """
+        if self._revision_map is None:
+            self._revision_map = dict(izip(self.revisions(),
+                                           xrange(self._count)))
+        return self._revision_map.get(raw_id)
+
+    def get_commit_time(self, rev):
+        return self._get_record(rev)[1]
+
+    def get_author(self, rev):
+        if self._authors is None:
+            start = self._authors_offset
+            data = self._map[start:start + self._authors_size]
+            self._authors = data.split('\n') if data else []
+        return self._authors[self._get_record(rev)[2]]
+
+    def parentrevs(self, rev):
+        """
+        Returns list of integer revisions of parents of given ``rev``
+        """
+        _sha, _time, _author, p1, p2 = self._get_record(rev)
+        if rev < 0:
+            rev += self._count
+        parents = [p for p in (p1, p2) if p != nullrev]
+        return parents + self._extra_parents.get(rev, [])
+
+    def childrenrevs(self, rev):
+        """
+        Returns list of integer revisions of children of given ``rev``
+        """
+        if self._children is None:
+            children = {}
+            for child in xrange(self._count):
+                for parent in self.parentrevs(child):
+                    children.setdefault(parent, []).append(child)
+            self._children = children
+        if rev < 0:
+            rev += self._count
+        return self._children.get(rev, [])
+
+    def revisions(self):
+        """
+        Returns list of all indexed shas in ascending revision order
+        """
+        if not self._count:
+            return []
+        _map = self._map
+        size = self._record.size
+        start = self._records_offset
+        return [hexlify(_map[offset:offset + 20]) for offset in
+                xrange(start, start + self._count * size, size)]
+
+    #==========================================================================
+    # UPDATING
+    #==========================================================================
+
+    def _get_tips(self):
+        """
+        Returns set of shas refs of repository point to, that's what
+        ``--all`` stands for in git rev-list
+        """
+        return set(self.repository._repo.get_refs().itervalues())
+
+    def _peel(self, shas):
+        """
+        Dereferences annotated tags and filters out everything that is not
+        a commit. Returns ``None`` if any object is missing from repository
+        """
+        repo = self.repository._repo
+        peeled = set()
+        for sha in shas:
+            try:
+                obj = repo[sha]
+                while isinstance(obj, Tag):
+                    obj = repo[obj.object[1]]
+            except KeyError:
+                return None
+            if isinstance(obj, Commit):
+                peeled.add(obj.id)
+        return peeled
+
+    def refresh(self):
+        """
+        Makes sure index is in sync with repository refs. Missing index is
+        built from scratch, new commits are appended to existing one, and
+        if history was rewritten (ref removed or force pushed) whole index is
+        rebuilt.
+        """
+        tips = self._get_tips()
+        if self.loaded and self._tips == tips:
+            return self
+        # maybe other process already updated it for us
+        if self._load() and self._tips == tips:
+            return self
+
+        entries = None
+        if self.loaded:
+            entries = self._get_incremental_entries(tips)
+        if entries is None:
+            log.debug('building commit graph for %s' % self.repository)
+            self._write(tips, self._parse_log('--all'), [], [])
+        else:
+            self._append(tips, entries)
+
+        if not self._load():
+            raise RepositoryError('Cannot read commit graph %s' % self.path)
+        return self
+
+    def _get_incremental_entries(self, tips):
+        """
+        Returns new commits that needs to be appended to index or ``None`` if
+        all previously indexed tips are not reachable from current refs
+        anymore
+        """
+        old_tips = self._peel(self._tips)
+        new_tips = self._peel(tips)
+        if old_tips is None or new_tips is None:
+            return None
+
+        vanished = old_tips - new_tips
+        if vanished:
+            so, se = self.repository.run_git_command(
+                'rev-list --max-count=1 %s --not %s'
+                % (' '.join(vanished), ' '.join(new_tips) or '--all'))
+            if so.strip():
+                log.debug('history of %s was rewritten' % self.repository)
+                return None
+
+        added = new_tips - old_tips
+        if not added:
+            return []
+        log.debug('appending %s new tips to commit graph of %s'
+                  % (len(added), self.repository))
+        exclude = old_tips and '--not %s' % ' '.join(old_tips) or ''
+        return [entry for entry in
+                self._parse_log('%s %s' % (' '.join(added), exclude))
+                if self.get_revision(entry[0]) is None]
+
+    def _parse_log(self, revs):
+        """
+        Returns list of (sha, commit time, author, parents) tuples in
+        ascending date order for commits reachable from given ``revs``
+        """
+        cmd = ('log --reverse --date-order --pretty=format:"%%H %%P%%x00'
+               '%%an <%%ae>%%x00%%ct" %s' % revs)
+        so, se = self.repository.run_git_command(cmd)
+        entries = []
+        for line in so.splitlines():
+            if not line:
+                continue
+            shas, author, timestamp = line.split('\x00')
+            shas = shas.split()
+            if not timestamp:
+                # git cannot parse malformed identities, dulwich can
+                commit = self.repository._repo[shas[0]]
+                author, timestamp = commit.author, commit.commit_time
+            entries.append((shas[0], int(timestamp), author, shas[1:]))
+        return entries
+
+    def _append(self, tips, entries):
+        """
+        Rewrites index with existing records followed by given ``entries``
+        """
+        size = self._record.size
+        start = self._records_offset
+        records = self._map[start:start + self._count * size]
+        if self._authors is None:
+            self.get_author(0)
+        self._write(tips, entries, records, list(self._authors),
+                    [(rev, p) for rev, parents in
+                     self._extra_parents.iteritems() for p in parents])
+
+    def _write(self, tips, entries, records, authors, extra=None):
+        revmap = {}
+        if records:
+            revmap = dict(izip(self.revisions(), xrange(self._count)))
+        authors_map = dict(izip(authors, xrange(len(authors))))
+        extra = extra or []
+        count = self._count if records else 0
+
+        new_records = []
+        for sha, timestamp, author, parents in entries:
+            author_idx = authors_map.get(author)
+            if author_idx is None:
+                author_idx = authors_map[author] = len(authors)
+                authors.append(author)
+            prevs = []
+            for parent in parents:
+                try:
+                    prevs.append(revmap[parent])
+                except KeyError:
+                    raise RepositoryError('parent %s of %s is missing in '
+                                          'commit graph' % (parent, sha))
+            p1 = p2 = nullrev
+            if prevs:
+                p1 = prevs[0]
+            if len(prevs) > 1:
+                p2 = prevs[1]
+            for p in prevs[2:]:
+                extra.append((count, p))
+            revmap[sha] = count
+            count += 1
+            new_records.append(self._record.pack(unhexlify(sha), timestamp,
+                                                 author_idx, p1, p2))
+
+        authors_data = '\n'.join(authors)
+        data = [self._header.pack(self.MAGIC, self.VERSION, count, len(tips),
+                                  len(extra), len(authors_data))]
+        data.extend(unhexlify(tip) for tip in tips)
+        data.append(records or '')
+        data.extend(new_records)
+        data.extend(self._extra.pack(rev, p) for rev, p in extra)
+        data.append(authors_data)
+        self._save(''.join(data))
+
+    def _save(self, data):
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(dirname):
+                    raise
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(data)
+            finally:
+                f.close()
+            try:
+                os.rename(tmp_path, self.path)
+            except OSError:
+                # windows can't rename over existing file
+                os.remove(self.path)
+                os.rename(tmp_path, self.path)
+        except (EnvironmentError, OSError):
+            log.error(traceback.format_exc())
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
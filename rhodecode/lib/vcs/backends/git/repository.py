@@ -12,6 +12,8 @@
 import os
 import re
 import time
+import hashlib
+import threading
 import posixpath
 import logging
 import traceback
@@ -21,6 +23,7 @@ from dulwich.repo import Repo, NotGitRepository
 from dulwich.objects import Tag
 from string import Template
 from subprocess import Popen, PIPE
+from rhodecode.lib.vcs.conf import settings
 from rhodecode.lib.vcs.backends.base import BaseRepository
 from rhodecode.lib.vcs.exceptions import BranchDoesNotExistError
 from rhodecode.lib.vcs.exceptions import ChangesetDoesNotExistError
@@ -37,11 +40,32 @@ from .workdir import GitWorkdir
 from .changeset import GitChangeset
 from .inmemory import GitInMemoryChangeset
 from .config import ConfigFile
-from rhodecode.lib import subprocessio
+from .commitgraph import CommitGraph
 
 
 log = logging.getLogger(__name__)
 
+# bounds number of git processes run at once, see ``_get_process_slots``
+_process_slots = None
+_process_slots_lock = threading.Lock()
+
+
+def _get_process_slots():
+    """
+    Returns semaphore limiting number of running git commands to
+    ``settings.GIT_MAX_PROCESSES``
+    """
+    global _process_slots
+    if _process_slots is None:
+        _process_slots_lock.acquire()
+        try:
+            if _process_slots is None:
+                _process_slots = threading.BoundedSemaphore(
+                    settings.GIT_MAX_PROCESSES)
+        finally:
+            _process_slots_lock.release()
+    return _process_slots
+
 
 class GitRepository(BaseRepository):
     """
@@ -91,10 +115,73 @@ class GitRepository(BaseRepository):
         """
         return self._get_all_revisions()
 
+    @LazyProperty
+    def commit_graph(self):
+        """
+        Returns persistent ``CommitGraph`` index of this repository, or
+        ``None`` if there's no ``settings.CACHE_DIR`` to store it in
+        """
+        if not settings.CACHE_DIR:
+            return None
+        name = hashlib.md5(self.path).hexdigest()
+        return CommitGraph(self, os.path.join(settings.CACHE_DIR,
+                                              'commitgraph', name))
+
+    @LazyProperty
+    def _revisions_map(self):
+        return dict((rev, idx) for idx, rev in enumerate(self.revisions))
+
+    def _get_revision_index(self, raw_id):
+        """
+        Returns position of given ``raw_id`` in ``revisions``, works like
+        ``revisions.index`` but without scanning whole list
+
+        :raises ValueError: if there's no such revision
+        """
+        idx = self._revisions_map.get(raw_id)
+        if idx is None and len(self._revisions_map) != len(self.revisions):
+            # revisions got extended, ie. by in memory changeset
+            self._revisions_map = dict((rev, idx) for idx, rev
+                                       in enumerate(self.revisions))
+            idx = self._revisions_map.get(raw_id)
+        if idx is None:
+            raise ValueError('%r is not in revisions' % raw_id)
+        return idx
+
+    def _get_parent_revisions(self, revision):
+        """
+        Returns integer revisions of parents of given integer ``revision``,
+        served from commit graph if possible
+        """
+        graph = self.commit_graph
+        if (graph is not None and graph.loaded and revision < len(graph)
+            and graph.get_raw_id(revision) == self.revisions[revision]):
+            return graph.parentrevs(revision)
+        return [p.revision for p in self.get_changeset(revision).parents]
+
+    def _get_children_revisions(self, revision):
+        """
+        Returns integer revisions of children of given integer ``revision``,
+        served from commit graph if possible
+        """
+        graph = self.commit_graph
+        if (graph is not None and graph.loaded and revision < len(graph)
+            and graph.get_raw_id(revision) == self.revisions[revision]):
+            return graph.childrenrevs(revision)
+        raw_id = self.revisions[revision]
+        so, se = self.run_git_command('rev-list --all --children')
+        for line in so.splitlines():
+            shas = line.split()
+            if shas and shas[0] == raw_id:
+                return sorted(self._get_revision_index(sha)
+                              for sha in shas[1:])
+        return []
+
     def run_git_command(self, cmd):
         """
         Runs given ``cmd`` as git command and returns tuple
-        (returncode, stdout, stderr).
+        (stdout, stderr). At most ``settings.GIT_MAX_PROCESSES`` commands
+        run at the same time, others wait for their turn.
 
         .. note::
            This method exists only until log/blame functionality is implemented
@@ -105,10 +192,8 @@ class GitRepository(BaseRepository):
         """
 
         _copts = ['-c', 'core.quotepath=false', ]
-        _str_cmd = False
         if isinstance(cmd, basestring):
             cmd = [cmd]
-            _str_cmd = True
 
         gitenv = os.environ
         # need to clean fix GIT_DIR !
@@ -116,23 +201,34 @@ class GitRepository(BaseRepository):
             del gitenv['GIT_DIR']
         gitenv['GIT_CONFIG_NOGLOBAL'] = '1'
 
-        cmd = ['git'] + _copts + cmd
-        if _str_cmd:
-            cmd = ' '.join(cmd)
+        # commands are shell strings, they may contain quoted paths
+        cmd = ' '.join(['git'] + _copts + cmd)
+        opts = dict(
+            env=gitenv,
+            shell=True,
+        )
+        if os.path.isdir(self.path):
+            opts['cwd'] = self.path
+
+        # communicate polls both pipes, no reader threads are needed for
+        # the output that is read whole anyway
+        slots = _get_process_slots()
+        slots.acquire()
         try:
-            opts = dict(
-                env=gitenv,
-                shell=False,
-            )
-            if os.path.isdir(self.path):
-                opts['cwd'] = self.path
-            p = subprocessio.SubprocessIOChunker(cmd, **opts)
-        except (EnvironmentError, OSError), err:
-            log.error(traceback.format_exc())
+            try:
+                p = Popen(cmd, stdout=PIPE, stderr=PIPE, **opts)
+                stdout, stderr = p.communicate()
+            except (EnvironmentError, OSError), err:
+                log.error(traceback.format_exc())
+                raise RepositoryError("Couldn't run git command (%s).\n"
+                                      "Original error was:%s" % (cmd, err))
+        finally:
+            slots.release()
+
+        if p.returncode:
             raise RepositoryError("Couldn't run git command (%s).\n"
-                                  "Original error was:%s" % (cmd, err))
-
-        return ''.join(p.output), ''.join(p.error)
+                                  "Original error was:%s" % (cmd, stderr))
+        return stdout, stderr
 
     @classmethod
     def _check_url(cls, url):
@@ -215,6 +311,13 @@ class GitRepository(BaseRepository):
             self._repo.head()
         except KeyError:
             return []
+        if self.commit_graph is not None:
+            try:
+                return self.commit_graph.refresh().revisions()
+            except (RepositoryError, EnvironmentError):
+                log.error(traceback.format_exc())
+                log.error('Cannot use commit graph of %s, falling back to '
+                          'git rev-list' % self)
         cmd = 'rev-list --all --reverse --date-order'
         try:
             so, se = self.run_git_command(cmd)
@@ -263,7 +366,12 @@ class GitRepository(BaseRepository):
             elif revision in _tags_shas:
                 return _tags_shas[_tags_shas.index(revision)]
 
-            elif not pattern.match(revision) or revision not in self.revisions:
+            elif not pattern.match(revision):
+                raise ChangesetDoesNotExistError("Revision %r does not exist "
+                    "for this repository %s" % (revision, self))
+            try:
+                self._get_revision_index(revision)
+            except ValueError:
                 raise ChangesetDoesNotExistError("Revision %r does not exist "
                     "for this repository %s" % (revision, self))
 
@@ -336,6 +444,10 @@ class GitRepository(BaseRepository):
                      for x in self._parsed_refs.iteritems() if x[1][1] == 'H']
         return OrderedDict(sorted(_branches, key=sortkey, reverse=False))
 
+    def _get_branch_revisions(self, branch_name):
+        cmd = 'rev-list --date-order --reverse %s' % self.branches[branch_name]
+        return self.run_git_command(cmd)[0].splitlines()
+
     @LazyProperty
     def tags(self):
         return self._get_tags()
@@ -440,6 +552,42 @@ class GitRepository(BaseRepository):
         changeset = GitChangeset(repository=self, revision=revision)
         return changeset
 
+    def get_changesets_bulk(self, revisions):
+        """
+        Returns list of ``GitChangeset`` objects for given ``revisions``.
+        All commits are read in one pass over object store, while branches,
+        tags and parents are resolved once for the whole list.
+        """
+        store = self._repo.object_store
+        changesets = []
+        for revision in revisions:
+            revision = self._get_revision(revision)
+            try:
+                commit = store[revision]
+            except KeyError:
+                raise RepositoryError("Cannot get object with id %s"
+                                      % revision)
+            if isinstance(commit, Tag):
+                changesets.append(self.get_changeset(revision))
+            else:
+                changesets.append(GitChangeset(repository=self,
+                                               revision=revision,
+                                               commit=commit))
+
+        heads = self._heads(reverse=False)
+        tags = {}
+        for tname, tsha in self.tags.iteritems():
+            tags.setdefault(tsha, []).append(tname)
+        by_id = dict((cs.raw_id, cs) for cs in changesets)
+        for cs in changesets:
+            branch = heads.get(cs.raw_id)
+            cs.branch = safe_unicode(branch) if branch else None
+            cs.tags = tags.get(cs.raw_id, [])
+            cs.parents = [by_id[parent] if parent in by_id
+                          else self.get_changeset(parent)
+                          for parent in cs._commit.parents]
+        return changesets
+
     def get_changesets(self, start=None, end=None, start_date=None,
            end_date=None, branch_name=None, reverse=False):
         """
@@ -512,6 +660,32 @@ class GitRepository(BaseRepository):
         for rev in revs:
             yield self.get_changeset(rev)
 
+    def get_changed_paths(self, rev1, rev2):
+        """
+        Returns tuple of sorted lists of (added, changed, removed) file paths
+        between trees of ``rev1`` and ``rev2``, without reading any content.
+
+        :param rev1: Entry point from which changes are listed. Can be
+          ``self.EMPTY_CHANGESET`` - all files of ``rev2`` are added then
+        :param rev2: Until which revision changes should be listed.
+        """
+        _r = self._repo
+        old_tree = None
+        if rev1 != self.EMPTY_CHANGESET:
+            old_tree = _r[self.get_changeset(rev1).raw_id].tree
+        new_tree = _r[self.get_changeset(rev2).raw_id].tree
+
+        added, changed, removed = [], [], []
+        changes = _r.object_store.tree_changes(old_tree, new_tree)
+        for (oldpath, newpath), (_, _), (_, _) in changes:
+            if newpath and oldpath:
+                changed.append(newpath)
+            elif newpath and not oldpath:
+                added.append(newpath)
+            elif not newpath and oldpath:
+                removed.append(oldpath)
+        return sorted(added), sorted(changed), sorted(removed)
+
     def get_diff(self, rev1, rev2, path=None, ignore_whitespace=False,
                  context=3):
         """
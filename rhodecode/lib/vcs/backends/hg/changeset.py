@@ -1,5 +1,3 @@
-import os
-import posixpath
 
 from rhodecode.lib.vcs.backends.base import BaseChangeset
 from rhodecode.lib.vcs.conf import settings
@@ -11,8 +9,10 @@ from rhodecode.lib.vcs.nodes import AddedFileNodesGenerator, \
 
 from rhodecode.lib.vcs.utils import safe_str, safe_unicode, date_fromtimestamp
 from rhodecode.lib.vcs.utils.lazy import LazyProperty
-from rhodecode.lib.vcs.utils.paths import get_dirs_for_path
-from rhodecode.lib.vcs.utils.hgcompat import archival, hex
+from rhodecode.lib.vcs.utils.hgcompat import archival, cmdutil, fromlocal, \
+    hex
+
+from .dirindex import get_dir_index
 
 
 class MercurialChangeset(BaseChangeset):
@@ -71,9 +71,13 @@ class MercurialChangeset(BaseChangeset):
     def _file_paths(self):
         return list(self._ctx)
 
+    @LazyProperty
+    def _dir_index(self):
+        return get_dir_index(self._ctx)
+
     @LazyProperty
     def _dir_paths(self):
-        p = list(set(get_dirs_for_path(*self._file_paths)))
+        p = [d for d in self._dir_index if d]
         p.insert(0, '')
         return p
 
@@ -169,9 +173,9 @@ class MercurialChangeset(BaseChangeset):
 
     def _get_kind(self, path):
         path = self._fix_path(path)
-        if path in self._file_paths:
+        if path in self._ctx:
             return NodeKind.FILE
-        elif path in self._dir_paths:
+        elif path in self._dir_index:
             return NodeKind.DIR
         else:
             raise ChangesetError("Node does not exist at the given path %r"
@@ -278,7 +282,7 @@ class MercurialChangeset(BaseChangeset):
         elif prefix.strip() == '':
             raise VCSError("Prefix cannot be empty")
 
-        archival.archive(self.repository._repo, stream, self.raw_id,
+        archival.archive(self.repository._repo, stream, self._ctx.node(),
                          kind, prefix=prefix, subrepos=subrepos)
 
         if stream.closed and hasattr(stream, 'name'):
@@ -288,6 +292,49 @@ class MercurialChangeset(BaseChangeset):
         else:
             stream.seek(0)
 
+    def _get_archive_files(self):
+        """
+        Yields (path, stat mode, content) of all files of this changeset,
+        read straight from its manifest. The same way ``archival.archive``
+        does, ``.hg_archival.txt`` is added unless ``ui.archivemeta`` is
+        disabled and files are passed through decode filters of repository
+        """
+        repo = self.repository._repo
+        if repo.ui.configbool('ui', 'archivemeta', True):
+            yield '.hg_archival.txt', 0100644, self._get_archival_metadata()
+        for path in sorted(self._ctx.manifest()):
+            fctx = self._ctx[path]
+            flags = fctx.flags()
+            if 'l' in flags:
+                mode = 0120777
+            elif 'x' in flags:
+                mode = 0100755
+            else:
+                mode = 0100644
+            yield path, mode, repo.wwritedata(path, fctx.data())
+
+    def _get_archival_metadata(self):
+        """
+        Returns content of ``.hg_archival.txt`` written by ``archival``
+        """
+        repo = self.repository._repo
+        ctx = self._ctx
+        base = 'repo: %s\nnode: %s\nbranch: %s\n' % (
+            repo[0].hex(), ctx.hex(), fromlocal(ctx.branch()))
+
+        tags = ''.join('tag: %s\n' % t for t in ctx.tags()
+                       if repo.tagtype(t) == 'global')
+        if not tags:
+            repo.ui.pushbuffer()
+            opts = {'template': '{latesttag}\n{latesttagdistance}',
+                    'style': '', 'patch': None, 'git': None}
+            cmdutil.show_changeset(repo.ui, repo, opts).show(ctx)
+            ltags, dist = repo.ui.popbuffer().split('\n')
+            tags = ''.join('latesttag: %s\n' % t for t in ltags.split(':'))
+            tags += 'latesttagdistance: %s\n' % dist
+
+        return base + tags
+
     def get_nodes(self, path):
         """
         Returns combined ``DirNode`` and ``FileNode`` objects list representing
@@ -300,12 +347,9 @@ class MercurialChangeset(BaseChangeset):
                 " %r" % (self.revision, path))
         path = self._fix_path(path)
 
-        filenodes = [FileNode(f, changeset=self) for f in self._file_paths
-            if os.path.dirname(f) == path]
-        dirs = path == '' and '' or [d for d in self._dir_paths
-            if d and posixpath.dirname(d) == path]
-        dirnodes = [DirNode(d, changeset=self) for d in dirs
-            if os.path.dirname(d) == path]
+        dirs, files = self._dir_index[path]
+        filenodes = [FileNode(f, changeset=self) for f in files]
+        dirnodes = [DirNode(d, changeset=self) for d in dirs]
 
         als = self.repository.alias
         for k, vals in self._extract_submodules().iteritems():
@@ -331,9 +375,9 @@ class MercurialChangeset(BaseChangeset):
         path = self._fix_path(path)
 
         if not path in self.nodes:
-            if path in self._file_paths:
+            if path in self._ctx:
                 node = FileNode(path, changeset=self)
-            elif path in self._dir_paths or path in self._dir_paths:
+            elif path in self._dir_index:
                 if path == '':
                     node = RootNode(changeset=self)
                 else:
@@ -346,6 +390,23 @@ class MercurialChangeset(BaseChangeset):
             self.nodes[path] = node
         return self.nodes[path]
 
+    def walk_paths(self, topurl=''):
+        """
+        Yields tuples of paths (toppath, dirpaths, filepaths) of directories
+        at the given ``topurl`` and below it, read straight from directory
+        index without creating nodes.
+        """
+        path = self._fix_path(topurl)
+        if path not in self._dir_index:
+            raise ChangesetError("Directory does not exist for revision %r at "
+                " %r" % (self.revision, path))
+        stack = [path]
+        while stack:
+            path = stack.pop()
+            dirs, files = self._dir_index[path]
+            yield path, dirs, files
+            stack.extend(reversed(dirs))
+
     @LazyProperty
     def affected_files(self):
         """
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+    vcs.backends.hg.dirindex
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Directory index of mercurial manifests.
+
+    Mercurial manifest is a flat list of file paths, so listing a directory
+    means filtering all of them. Index maps every directory of a manifest to
+    its subdirectories and files and is built once per manifest. Changesets
+    with the same manifest node share the same index, recently used indexes
+    are kept in a cache bounded by number of paths they hold.
+"""
+
+import posixpath
+import threading
+
+from rhodecode.lib.vcs.conf import settings
+from rhodecode.lib.vcs.utils.ordered_dict import OrderedDict
+
+
+def build_dir_index(paths):
+    """
+    Returns dict mapping every directory of given file ``paths`` to sorted
+    lists of its subdirectories and files. Root directory is ``''`` and all
+    paths are relative to it.
+
+    :param paths: iterable of file paths
+    """
+    index = {'': ([], [])}
+    for path in paths:
+        dirname = posixpath.dirname(path)
+        if dirname not in index:
+            # register directory and its missing parents
+            missing = []
+            child = dirname
+            while child not in index:
+                missing.append(child)
+                child = posixpath.dirname(child)
+            for child in reversed(missing):
+                index[child] = ([], [])
+                index[posixpath.dirname(child)][0].append(child)
+        index[dirname][1].append(path)
+    for dirs, files in index.itervalues():
+        dirs.sort()
+        files.sort()
+    return index
+
+
+class DirIndexCache(object):
+    """
+    Least recently used directory indexes, holding at most ``max_paths``
+    directory and file paths altogether. Index bigger than that is built
+    every time it's asked for and never kept.
+    """
+
+    def __init__(self, max_paths):
+        self.max_paths = max_paths
+        self.size = 0
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._indexes)
+
+    def get(self, key, get_paths):
+        """
+        Returns directory index kept under ``key``, building it from file
+        paths returned by ``get_paths`` if it's not cached yet
+
+        :param key: key of the index, like node of the manifest
+        :param get_paths: callable returning iterable of file paths
+        """
+        self._lock.acquire()
+        try:
+            index = self._indexes.pop(key, None)
+            if index is not None:
+                # most recently used are kept at the end
+                self._indexes[key] = index
+                return index
+        finally:
+            self._lock.release()
+
+        # built outside of lock, the same index may be built twice by
+        # concurrent requests but they don't wait for each other
+        index = build_dir_index(get_paths())
+        size = self._get_size(index)
+        if size > self.max_paths:
+            return index
+
+        self._lock.acquire()
+        try:
+            if key not in self._indexes:
+                self._indexes[key] = index
+                self.size += size
+                while self.size > self.max_paths:
+                    old = self._indexes.popitem(last=False)[1]
+                    self.size -= self._get_size(old)
+            return self._indexes.get(key, index)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._indexes.clear()
+            self.size = 0
+        finally:
+            self._lock.release()
+
+    def _get_size(self, index):
+        return len(index) + sum(len(files) for dirs, files in
+                                index.itervalues())
+
+
+_cache = None
+
+
+def get_dir_index(ctx):
+    """
+    Returns directory index of manifest of given mercurial ``ctx``, shared
+    by all changesets with the same manifest
+    """
+    global _cache
+    if _cache is None:
+        _cache = DirIndexCache(settings.HG_DIR_INDEX_CACHE_SIZE)
+    return _cache.get(ctx.manifestnode(), lambda: iter(ctx))
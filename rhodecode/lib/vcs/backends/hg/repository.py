@@ -13,13 +13,14 @@ from rhodecode.lib.vcs.exceptions import BranchDoesNotExistError, \
     ChangesetDoesNotExistError, EmptyRepositoryError, RepositoryError, \
     VCSError, TagAlreadyExistError, TagDoesNotExistError
 from rhodecode.lib.vcs.utils import author_email, author_name, date_fromtimestamp, \
-    makedate, safe_unicode
+    makedate, safe_unicode, safe_str
 from rhodecode.lib.vcs.utils.lazy import LazyProperty
 from rhodecode.lib.vcs.utils.ordered_dict import OrderedDict
 from rhodecode.lib.vcs.utils.paths import abspath
 
 from rhodecode.lib.vcs.utils.hgcompat import ui, nullid, match, patch, diffopts, clone, \
-    get_contact, pull, localrepository, RepoLookupError, Abort, RepoError, hex
+    get_contact, pull, localrepository, RepoLookupError, Abort, RepoError, hex, \
+    bin, tolocal
 
 
 class MercurialRepository(BaseRepository):
@@ -79,6 +80,11 @@ class MercurialRepository(BaseRepository):
     def branches(self):
         return self._get_branches()
 
+    def _get_branch_revisions(self, branch_name):
+        cl = self._repo.changelog
+        return [hex(cl.node(rev))
+                for rev in self._repo.revs('branch(%s)', branch_name)]
+
     def _get_branches(self, closed=False):
         """
         Get's branches for this repository
@@ -216,6 +222,22 @@ class MercurialRepository(BaseRepository):
 
         return map(lambda x: hex(x[7]), self._repo.changelog.index)[:-1]
 
+    def get_changed_paths(self, rev1, rev2):
+        """
+        Returns tuple of sorted lists of (added, changed, removed) file paths
+        between trees of ``rev1`` and ``rev2``, without reading any content.
+
+        :param rev1: Entry point from which changes are listed. Can be
+          ``self.EMPTY_CHANGESET`` - all files of ``rev2`` are added then
+        :param rev2: Until which revision changes should be listed.
+        """
+        node1 = nullid
+        if rev1 != self.EMPTY_CHANGESET:
+            node1 = self.get_changeset(rev1)._ctx.node()
+        node2 = self.get_changeset(rev2)._ctx.node()
+        changed, added, removed = self._repo.status(node1, node2)[:3]
+        return sorted(added), sorted(changed), sorted(removed)
+
     def get_diff(self, rev1, rev2, path='', ignore_whitespace=False,
                   context=3):
         """
@@ -431,11 +453,28 @@ class MercurialRepository(BaseRepository):
         changeset = MercurialChangeset(repository=self, revision=revision)
         return changeset
 
+    def get_changesets_bulk(self, revisions):
+        """
+        Returns list of ``MercurialChangeset`` objects for given
+        ``revisions``, parents within the list are shared instead of being
+        looked up again.
+        """
+        changesets = [self.get_changeset(rev) for rev in revisions]
+        by_rev = dict((cs.revision, cs) for cs in changesets)
+        parentrevs = self._repo.changelog.parentrevs
+        for cs in changesets:
+            cs.parents = [by_rev[parent] if parent in by_rev
+                          else self.get_changeset(parent)
+                          for parent in parentrevs(cs.revision)
+                          if parent >= 0]
+        return changesets
+
     def get_changesets(self, start=None, end=None, start_date=None,
                        end_date=None, branch_name=None, reverse=False):
         """
         Returns iterator of ``MercurialChangeset`` objects from start to end
-        (both are inclusive)
+        (both are inclusive). Branch and dates are read straight from the
+        changelog, so only returned changesets are created.
 
         :param start: None, str, int or mercurial lookup format
         :param end:  None, str, int or mercurial lookup format
@@ -445,34 +484,41 @@ class MercurialRepository(BaseRepository):
         :param reversed: return changesets in reversed order
         """
 
+        cl = self._repo.changelog
         start_raw_id = self._get_revision(start)
-        start_pos = self.revisions.index(start_raw_id) if start else None
+        start_pos = cl.rev(bin(start_raw_id)) if start is not None else 0
         end_raw_id = self._get_revision(end)
-        end_pos = self.revisions.index(end_raw_id) if end else None
+        end_pos = cl.rev(bin(end_raw_id)) if end is not None \
+            else len(cl) - 1
 
         if None not in [start, end] and start_pos > end_pos:
             raise RepositoryError("start revision '%s' cannot be "
                                   "after end revision '%s'" % (start, end))
 
-        if branch_name and branch_name not in self.branches.keys():
+        if branch_name and branch_name not in self.branches:
             raise BranchDoesNotExistError('Such branch %s does not exists for'
                                   ' this repository' % branch_name)
-        if end_pos is not None:
-            end_pos += 1
-
-        slice_ = reversed(self.revisions[start_pos:end_pos]) if reverse else \
-            self.revisions[start_pos:end_pos]
-
-        for id_ in slice_:
-            cs = self.get_changeset(id_)
-            if branch_name and cs.branch != branch_name:
-                continue
-            if start_date and cs.date < start_date:
-                continue
-            if end_date and cs.date > end_date:
-                continue
-
-            yield cs
+
+        if reverse:
+            revs = xrange(end_pos, start_pos - 1, -1)
+        else:
+            revs = xrange(start_pos, end_pos + 1)
+
+        if branch_name:
+            branch_name = safe_str(branch_name)
+        for rev in revs:
+            if branch_name or start_date or end_date:
+                # (manifest, user, (time, timezone), files, desc, extra)
+                entry = cl.read(rev)
+                if branch_name and \
+                        tolocal(entry[5].get('branch')) != branch_name:
+                    continue
+                date = date_fromtimestamp(*entry[2])
+                if start_date and date < start_date:
+                    continue
+                if end_date and date > end_date:
+                    continue
+            yield self.get_changeset(hex(cl.node(rev)))
 
     def pull(self, url):
         """
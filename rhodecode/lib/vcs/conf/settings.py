@@ -15,6 +15,19 @@ VCSRC_PATH = VCSRC_PATH or abspath(HOME_, '.vcsrc')
 if os.path.isdir(VCSRC_PATH):
     VCSRC_PATH = os.path.join(VCSRC_PATH, '__init__.py')
 
+# directory for persistent repository indexes (like git commit graph), those
+# indexes are not used if it's not set
+CACHE_DIR = os.environ.get('VCS_CACHE_DIR')
+
+# max number of git commands run at the same time by all repositories of
+# a process, others wait for a free slot
+GIT_MAX_PROCESSES = int(os.environ.get('VCS_GIT_MAX_PROCESSES', 8))
+
+# max number of directory and file paths held by directory indexes of
+# mercurial manifests kept in memory of a process
+HG_DIR_INDEX_CACHE_SIZE = int(os.environ.get('VCS_HG_DIR_INDEX_CACHE_SIZE',
+                                             1000000))
+
 BACKENDS = {
     'hg': 'vcs.backends.hg.MercurialRepository',
     'git': 'vcs.backends.git.GitRepository',
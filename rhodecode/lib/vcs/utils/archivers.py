@@ -5,21 +5,75 @@
 
     set of archiver functions for creating archives from repository content
 
+    Archivers write into a buffer which is emptied after every added file,
+    so archives can be streamed while they're built, without temporary files.
+
     :created_on: Jan 21, 2011
     :copyright: (c) 2010-2011 by Marcin Kuzminski, Lukasz Balcerzak.
 """
 
+import stat
+import time
+import tarfile
+import zipfile
+from cStringIO import StringIO
+
+# zip can't store dates before 1980
+ZIP_EPOCH = 315532800
 
-class BaseArchiver(object):
+
+class ChunkBuffer(object):
+    """
+    Write only file like object keeping written data until they're taken
+    """
 
     def __init__(self):
+        self._chunks = []
+        self._pos = 0
+        self.size = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(data)
+            self._pos += len(data)
+            self.size += len(data)
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def take(self):
+        """
+        Returns all data written since last call and empties the buffer
+        """
+        data = ''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class BaseArchiver(object):
+
+    def __init__(self, mtime):
+        self.mtime = mtime
+        self.buffer = ChunkBuffer()
         self.archive_file = self._get_archive_file()
 
-    def addfile(self):
+    def addfile(self, path, mode, content):
         """
         Adds a file to archive container
+
+        :param path: path of the file in archive
+        :param mode: stat mode of the file, symlinks have ``content`` as
+            their target
+        :param content: content of the file
         """
-        pass
+        raise NotImplementedError()
 
     def close(self):
         """
@@ -35,26 +89,58 @@ class BaseArchiver(object):
 
 
 class TarArchiver(BaseArchiver):
-    pass
+    # tarfile stream mode, it never seeks in written file
+    mode = 'w|'
 
+    def _get_archive_file(self):
+        return tarfile.open(mode=self.mode, fileobj=self.buffer)
+
+    def addfile(self, path, mode, content):
+        info = tarfile.TarInfo(path)
+        info.mtime = self.mtime
+        fileobj = None
+        if stat.S_ISLNK(mode):
+            info.type = tarfile.SYMTYPE
+            info.linkname = content
+            info.mode = 0777
+        else:
+            info.mode = stat.S_IMODE(mode)
+            info.size = len(content)
+            fileobj = StringIO(content)
+        self.archive_file.addfile(info, fileobj)
 
-class Tbz2Archiver(BaseArchiver):
-    pass
 
+class Tbz2Archiver(TarArchiver):
+    mode = 'w|bz2'
 
-class TgzArchiver(BaseArchiver):
-    pass
+
+class TgzArchiver(TarArchiver):
+    mode = 'w|gz'
 
 
 class ZipArchiver(BaseArchiver):
-    pass
 
+    def _get_archive_file(self):
+        return zipfile.ZipFile(self.buffer, 'w', zipfile.ZIP_DEFLATED, True)
 
-def get_archiver(self, kind):
+    def addfile(self, path, mode, content):
+        date_time = time.localtime(max(self.mtime, ZIP_EPOCH))[:6]
+        info = zipfile.ZipInfo(path, date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # unix permissions and file type
+        info.create_system = 3
+        info.external_attr = mode << 16L
+        # content is compressed at once, so its header is written with known
+        # crc and sizes and nothing is rewritten later
+        self.archive_file.writestr(info, content)
+
+
+def get_archiver(kind, mtime):
     """
     Returns instance of archiver class specific to given kind
 
     :param kind: archive kind
+    :param mtime: modification time given to archived files
     """
 
     archivers = {
@@ -64,4 +150,29 @@ def get_archiver(self, kind):
         'zip': ZipArchiver,
     }
 
-    return archivers[kind]()
+    return archivers[kind](mtime)
+
+
+def iter_archive(kind, files, prefix, mtime, chunk_size=64 * 1024):
+    """
+    Yields chunks of archive of given ``files`` while it's being built. First
+    chunk is yielded as soon as first file is added, later ones once at
+    least ``chunk_size`` bytes are written.
+
+    :param kind: archive kind
+    :param files: iterable of (path, stat mode, content) tuples
+    :param prefix: name of root directory in archive
+    :param mtime: modification time given to archived files
+    """
+    archiver = get_archiver(kind, mtime)
+    buf = archiver.buffer
+    first = True
+    for path, mode, content in files:
+        archiver.addfile('%s/%s' % (prefix, path), mode, content)
+        if buf.size >= chunk_size or (first and buf.size):
+            first = False
+            yield buf.take()
+    archiver.close()
+    data = buf.take()
+    if data:
+        yield data
@@ -2,7 +2,7 @@
 Mercurial libs compatibility
 """
 
-from mercurial import archival, merge as hg_merge, patch, ui
+from mercurial import archival, cmdutil, merge as hg_merge, patch, ui
 from mercurial.commands import clone, nullid, pull
 from mercurial.context import memctx, memfilectx
 from mercurial.error import RepoError, RepoLookupError, Abort
@@ -10,8 +10,8 @@ from mercurial.hgweb.common import get_contact
 from mercurial.localrepo import localrepository
 from mercurial.match import match
 from mercurial.mdiff import diffopts
-from mercurial.node import hex
-from mercurial.encoding import tolocal
+from mercurial.node import hex, bin
+from mercurial.encoding import tolocal, fromlocal
 from mercurial import discovery
 from mercurial import localrepo
 from mercurial import scmutil
@@ -35,7 +35,6 @@ from sqlalchemy import *
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship, joinedload, class_mapper, validates
 from sqlalchemy.exc import DatabaseError
-from beaker.cache import cache_region, region_invalidate
 from webob.exc import HTTPNotFound
 
 from pylons.i18n.translation import lazy_ugettext as _
@@ -155,6 +154,12 @@ class RhodeCodeSetting(Base, BaseModel):
     app_settings_name = Column("app_settings_name", String(255, convert_unicode=False, assert_unicode=None), nullable=True, unique=None, default=None)
     _app_settings_value = Column("app_settings_value", String(255, convert_unicode=False, assert_unicode=None), nullable=True, unique=None, default=None)
 
+    # cache key of settings version, can't clash with any repository name
+    # as those can't contain colons
+    VERSION_KEY = ':settings'
+    # (version, settings) of app settings read by this process
+    _cached_settings = None
+
     def __init__(self, k='', v=''):
         self.app_settings_name = k
         self.app_settings_value = v
@@ -219,6 +224,27 @@ class RhodeCodeSetting(Base, BaseModel):
 
         return settings
 
+    @classmethod
+    def get_cached_app_settings(cls):
+        """
+        Returns app settings read by this process before, as long as settings
+        version didn't change since then
+        """
+        version = CacheInvalidation.get_version(cls.VERSION_KEY)
+        cached = cls._cached_settings
+        if cached is None or cached[0] != version:
+            # version has to be read before settings
+            cached = cls._cached_settings = (version, cls.get_app_settings())
+        return dict(cached[1])
+
+    @classmethod
+    def invalidate_app_settings(cls):
+        """
+        Makes all processes read app settings again, call it once changes of
+        settings are committed
+        """
+        CacheInvalidation.set_invalidate(cls.VERSION_KEY)
+
     @classmethod
     def get_ldap_settings(cls, cache=False):
         ret = cls.query()\
@@ -647,6 +673,7 @@ class Repository(Base, BaseModel):
     repo_to_perm = relationship('UserRepoToPerm', cascade='all', order_by='UserRepoToPerm.repo_to_perm_id')
     users_group_to_perm = relationship('UsersGroupRepoToPerm', cascade='all')
     stats = relationship('Statistics', cascade='all', uselist=False)
+    summary = relationship('RepositorySummary', cascade='all', uselist=False)
 
     followers = relationship('UserFollowing',
                              primaryjoin='UserFollowing.follows_repo_id==Repository.repo_id',
@@ -779,10 +806,7 @@ class Repository(Base, BaseModel):
         """
         Returns associated cache keys for that repo
         """
-        return CacheInvalidation.query()\
-            .filter(CacheInvalidation.cache_args == self.repo_name)\
-            .order_by(CacheInvalidation.cache_key)\
-            .all()
+        return CacheInvalidation.get_cache_keys(self.repo_name)
 
     def get_new_name(self, repo_name):
         """
@@ -957,38 +981,34 @@ class Repository(Base, BaseModel):
         """
         set a cache for invalidation for this instance
         """
-        CacheInvalidation.set_invalidate(repo_name=self.repo_name)
+        CacheInvalidation.set_invalidate(self.repo_name)
 
     @LazyProperty
     def scm_instance(self):
-        import rhodecode
-        full_cache = str2bool(rhodecode.CONFIG.get('vcs_full_cache'))
-        if full_cache:
-            return self.scm_instance_cached()
-        return self.__get_instance()
+        return self.scm_instance_cached()
 
     def scm_instance_cached(self, cache_map=None):
-        @cache_region('long_term')
-        def _c(repo_name):
+        """
+        Returns scm instance of this repository kept open in registry of
+        this process, fresh one when the registry is disabled
+
+        :param cache_map: optional prefetched map from
+            ``CacheInvalidation.get_cache_map``
+        """
+        from rhodecode.lib.scm_registry import get_scm_registry
+        registry = get_scm_registry()
+        if registry is None:
             return self.__get_instance()
+
         rn = self.repo_name
-        log.debug('Getting cached instance of repo')
-
-        if cache_map:
-            # get using prefilled cache_map
-            invalidate_repo = cache_map[self.repo_name]
-            if invalidate_repo:
-                invalidate_repo = (None if invalidate_repo.cache_active
-                                   else invalidate_repo)
+        if cache_map is not None:
+            version = cache_map.get(safe_unicode(rn), 0)
         else:
-            # get from invalidate
-            invalidate_repo = self.invalidate
-
-        if invalidate_repo is not None:
-            region_invalidate(_c, None, rn)
-            # update our cache
-            CacheInvalidation.set_valid(invalidate_repo.cache_key)
-        return _c(rn)
+            version = CacheInvalidation.get_version(rn)
+        repo = registry.get(rn, self.repo_full_path, version,
+                            self.__get_instance)
+        CacheInvalidation.set_valid(rn, version)
+        return repo
 
     def __get_instance(self):
         repo_full_path = self.repo_full_path
@@ -1394,6 +1414,39 @@ class Statistics(Base, BaseModel):
     repository = relationship('Repository', single_parent=True)
 
 
+class RepositorySummary(Base, BaseModel):
+    """
+    Denormalised tip information of a repository, so dashboard can be
+    rendered without creating scm instances. Row is up to date as long as
+    its ``cache_version`` matches current cache version of the repository
+    """
+    __tablename__ = 'repository_summary'
+    __table_args__ = (
+         UniqueConstraint('repository_id'),
+         {'extend_existing': True, 'mysql_engine': 'InnoDB',
+          'mysql_charset': 'utf8'}
+    )
+    summary_id = Column("summary_id", Integer(), nullable=False, unique=True, default=None, primary_key=True)
+    repository_id = Column("repository_id", Integer(), ForeignKey('repositories.repo_id'), nullable=False, unique=True, default=None)
+    tip_id = Column("tip_id", String(40), nullable=False)
+    tip_revision = Column("tip_revision", Integer(), nullable=False)
+    tip_message = Column("tip_message", UnicodeText(25000), nullable=True)
+    tip_author = Column("tip_author", Unicode(255), nullable=True)
+    last_change = Column("last_change", DateTime(timezone=False), nullable=True)
+    size = Column("size", BigInteger(), nullable=True)
+    cache_version = Column("cache_version", Integer(), nullable=True, default=0)
+
+    repository = relationship('Repository', single_parent=True)
+
+    def __unicode__(self):
+        return u"<%s('%s:%s')>" % (self.__class__.__name__,
+                                  self.repository_id, self.tip_id)
+
+    @classmethod
+    def get_by_repo(cls, repo_id):
+        return cls.query().filter(cls.repository_id == repo_id).scalar()
+
+
 class UserFollowing(Base, BaseModel):
     __tablename__ = 'user_followings'
     __table_args__ = (
@@ -1420,6 +1473,15 @@ class UserFollowing(Base, BaseModel):
 
 
 class CacheInvalidation(Base, BaseModel):
+    """
+    Per repository cache versions.
+
+    Every change of a repository bumps its version, values cached by a
+    process are valid only as long as the version they were computed at is
+    still the current one. Versions are kept in a file under ``cache_dir``,
+    or in this table for multiple instances sharing only a database, see
+    ``get_store``. Checking validity never writes anything.
+    """
     __tablename__ = 'cache_invalidation'
     __table_args__ = (
         UniqueConstraint('cache_key'),
@@ -1431,156 +1493,163 @@ class CacheInvalidation(Base, BaseModel):
     cache_key = Column("cache_key", String(255, convert_unicode=False, assert_unicode=None), nullable=True, unique=None, default=None)
     cache_args = Column("cache_args", String(255, convert_unicode=False, assert_unicode=None), nullable=True, unique=None, default=None)
     cache_active = Column("cache_active", Boolean(), nullable=True, unique=None, default=False)
+    cache_version = Column("cache_version", Integer(), nullable=True, unique=None, default=0)
+
+    # versions values cached by this process were computed at, {key: version}
+    _seen_versions = {}
+    _store = None
 
-    def __init__(self, cache_key, cache_args=''):
+    def __init__(self, cache_key, cache_args='', cache_version=0):
         self.cache_key = cache_key
         self.cache_args = cache_args
         self.cache_active = False
+        self.cache_version = cache_version
 
     def __unicode__(self):
         return u"<%s('%s:%s')>" % (self.__class__.__name__,
                                   self.cache_id, self.cache_key)
 
-    @property
-    def prefix(self):
-        _split = self.cache_key.split(self.cache_args, 1)
-        if _split and len(_split) == 2:
-            return _split[0]
-        return ''
-
     @classmethod
     def clear_cache(cls):
         cls.query().delete()
 
     @classmethod
-    def _get_key(cls, key):
+    def get_store(cls):
         """
-        Wrapper for generating a key, together with a prefix
-
-        :param key:
+        Returns file store of versions, or ``None`` when they are kept in
+        database. ``cache_invalidation_store`` is ``file`` or ``db``, when
+        it's empty file store is used unless ``instance_id`` is set. Configs
+        without it are of installations which kept versions in database
+        before, so they keep doing so.
         """
-        import rhodecode
-        prefix = ''
-        org_key = key
-        iid = rhodecode.CONFIG.get('instance_id')
-        if iid:
-            prefix = iid
-
-        return "%s%s" % (prefix, key), prefix, org_key
+        if cls._store is None:
+            import rhodecode
+            from rhodecode.lib.cache_versions import FileVersionStore
+            conf = rhodecode.CONFIG
+            store = conf.get('cache_invalidation_store', 'db')
+            if not store:
+                store = 'db' if conf.get('instance_id') else 'file'
+            cache_dir = conf.get('app_conf', {}).get('cache_dir')
+            if store == 'file' and cache_dir:
+                cls._store = FileVersionStore(os.path.join(cache_dir,
+                                                           'cache_versions'))
+            else:
+                cls._store = False
+        return cls._store or None
 
     @classmethod
-    def get_by_key(cls, key):
-        return cls.query().filter(cls.cache_key == key).scalar()
+    def _get_repo_name(cls, key):
+        repo_name = key
+        repo_name = remove_suffix(repo_name, '_README')
+        repo_name = remove_suffix(repo_name, '_RSS')
+        repo_name = remove_suffix(repo_name, '_ATOM')
+        return repo_name
 
     @classmethod
-    def get_by_repo_name(cls, repo_name):
-        return cls.query().filter(cls.cache_args == repo_name).all()
+    def get_version(cls, repo_name):
+        """
+        Returns current cache version of given repository
+        """
+        store = cls.get_store()
+        if store is not None:
+            return store.get_version(repo_name)
+        version = Session().query(cls.cache_version)\
+            .filter(cls.cache_key == safe_str(repo_name)).scalar()
+        return version or 0
 
     @classmethod
-    def _get_or_create_key(cls, key, repo_name, commit=True):
-        inv_obj = Session().query(cls).filter(cls.cache_key == key).scalar()
-        if not inv_obj:
-            try:
-                inv_obj = CacheInvalidation(key, repo_name)
-                Session().add(inv_obj)
-                if commit:
-                    Session().commit()
-            except Exception:
-                log.error(traceback.format_exc())
-                Session().rollback()
-        return inv_obj
+    def get_cache_map(cls):
+        """
+        Returns dict of all repository names and their cache versions, read
+        at once
+        """
+        store = cls.get_store()
+        if store is not None:
+            return store.get_versions()
+        return dict((safe_unicode(repo_name), version or 0)
+                    for repo_name, version
+                    in Session().query(cls.cache_args, cls.cache_version)
+                    .filter(cls.cache_key == cls.cache_args))
 
     @classmethod
-    def invalidate(cls, key):
+    def get_cache_keys(cls, repo_name):
         """
-        Returns Invalidation object if this given key should be invalidated
-        None otherwise. `cache_active = False` means that this cache
-        state is not valid and needs to be invalidated
-
-        :param key:
+        Returns list of (key, version, active) tuples of values this process
+        cached for given repository, ``active`` tells if they are up to date
         """
-        repo_name = key
-        repo_name = remove_suffix(repo_name, '_README')
-        repo_name = remove_suffix(repo_name, '_RSS')
-        repo_name = remove_suffix(repo_name, '_ATOM')
-
-        # adds instance prefix
-        key, _prefix, _org_key = cls._get_key(key)
-        inv = cls._get_or_create_key(key, repo_name)
-
-        if inv and inv.cache_active is False:
-            return inv
+        version = cls.get_version(repo_name)
+        keys = []
+        for key in (repo_name, repo_name + '_README', repo_name + '_RSS',
+                    repo_name + '_ATOM'):
+            seen = cls._seen_versions.get(key)
+            if seen is not None:
+                keys.append((key, seen, seen == version))
+        return keys
 
     @classmethod
-    def set_invalidate(cls, key=None, repo_name=None):
+    def invalidate(cls, key, cache_map=None):
         """
-        Mark this Cache key for invalidation, either by key or whole
-        cache sets based on repo_name
+        Returns current version of the repository given key belongs to if
+        value cached by this process under ``key`` is outdated and needs to
+        be invalidated, ``None`` otherwise
 
-        :param key:
+        :param key: repository name, optionally followed by cache suffix
+        :param cache_map: optional prefetched map from ``get_cache_map``
         """
-        if key:
-            key, _prefix, _org_key = cls._get_key(key)
-            inv_objs = Session().query(cls).filter(cls.cache_key == key).all()
-        elif repo_name:
-            inv_objs = Session().query(cls).filter(cls.cache_args == repo_name).all()
-
-        log.debug('marking %s key[s] for invalidation based on key=%s,repo_name=%s'
-                  % (len(inv_objs), key, repo_name))
-        try:
-            for inv_obj in inv_objs:
-                inv_obj.cache_active = False
-                Session().add(inv_obj)
-            Session().commit()
-        except Exception:
-            log.error(traceback.format_exc())
-            Session().rollback()
+        repo_name = cls._get_repo_name(key)
+        if cache_map is not None:
+            version = cache_map.get(safe_unicode(repo_name), 0)
+        else:
+            version = cls.get_version(repo_name)
+        if cls._seen_versions.get(key) != version:
+            return version
 
     @classmethod
-    def set_valid(cls, key):
+    def set_valid(cls, key, version):
         """
-        Mark this cache key as active and currently cached
+        Marks value cached by this process under ``key`` as computed at
+        given ``version``
 
         :param key:
+        :param version: version returned by ``invalidate``
         """
-        inv_obj = cls.get_by_key(key)
-        inv_obj.cache_active = True
-        Session().add(inv_obj)
-        Session().commit()
+        cls._seen_versions[key] = version
 
     @classmethod
-    def get_cache_map(cls):
+    def set_invalidate(cls, repo_name, session=None):
+        """
+        Invalidates all cached values of given repository in all processes
+        by bumping its version
+
+        :param repo_name:
+        :param session: when given version kept in database is bumped within
+            transaction of this session, and it's up to caller to commit it
+        """
+        log.debug('bumping cache version of %s' % repo_name)
+        store = cls.get_store()
+        if store is not None:
+            try:
+                store.bump(repo_name)
+            except EnvironmentError:
+                log.error(traceback.format_exc())
+            return
 
-        class cachemapdict(dict):
-
-            def __init__(self, *args, **kwargs):
-                fixkey = kwargs.get('fixkey')
-                if fixkey:
-                    del kwargs['fixkey']
-                self.fixkey = fixkey
-                super(cachemapdict, self).__init__(*args, **kwargs)
-
-            def __getattr__(self, name):
-                key = name
-                if self.fixkey:
-                    key, _prefix, _org_key = cls._get_key(key)
-                if key in self.__dict__:
-                    return self.__dict__[key]
-                else:
-                    return self[key]
-
-            def __getitem__(self, key):
-                if self.fixkey:
-                    key, _prefix, _org_key = cls._get_key(key)
-                try:
-                    return super(cachemapdict, self).__getitem__(key)
-                except KeyError:
-                    return
-
-        cache_map = cachemapdict(fixkey=True)
-        for obj in cls.query().all():
-            cache_map[obj.cache_key] = cachemapdict(obj.get_dict())
-        return cache_map
+        key = safe_str(repo_name)
+        sa = session or Session()
+        try:
+            updated = sa.query(cls)\
+                .filter(cls.cache_key == key)\
+                .update({cls.cache_version: cls.cache_version + 1},
+                        synchronize_session=False)
+            if not updated:
+                sa.add(CacheInvalidation(key, key, 1))
+            if session is None:
+                sa.commit()
+        except Exception:
+            log.error(traceback.format_exc())
+            if session is not None:
+                raise
+            sa.rollback()
 
 
 class ChangesetComment(Base, BaseModel):
@@ -1,4 +1,7 @@
 """SQLAlchemy Metadata and Session object"""
+import threading
+
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 from beaker import cache
@@ -9,7 +12,7 @@ from rhodecode.lib import caching_query
 # Beaker CacheManager.  A home base for cache configurations.
 cache_manager = cache.CacheManager()
 
-__all__ = ['Base', 'Session']
+__all__ = ['Base', 'Session', 'query_counter']
 #
 # SQLAlchemy session manager. Updated by model.init_model()
 #
@@ -25,3 +28,31 @@ Base = declarative_base()
 
 #to use cache use this in query
 #.options(FromCache("sqlalchemy_cache_type", "cachekey"))
+
+
+class QueryCounter(threading.local):
+    """
+    Number of sql queries executed by each thread, so number of queries run
+    by a request can be checked
+    """
+    count = 0
+
+    def reset(self):
+        self.count = 0
+
+query_counter = QueryCounter()
+# engines queries of which are counted
+_counted_engines = set()
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    query_counter.count += 1
+
+
+def count_queries(engine):
+    """
+    Makes all queries executed by given engine counted by ``query_counter``
+    """
+    if engine not in _counted_engines:
+        event.listen(engine, 'before_cursor_execute', _count_query)
+        _counted_engines.add(engine)
@@ -24,18 +24,85 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import itertools
 import traceback
+import weakref
 
+from sqlalchemy import event
 from sqlalchemy.exc import DatabaseError
+from sqlalchemy.orm.attributes import get_history
 
 from rhodecode.lib.caching_query import FromCache
 
 from rhodecode.model import BaseModel
+from rhodecode.model.meta import Session
 from rhodecode.model.db import User, Permission, UserToPerm, UserRepoToPerm,\
-    UserRepoGroupToPerm
+    UserRepoGroupToPerm, UsersGroupToPerm, UsersGroupRepoToPerm, \
+    UsersGroupRepoGroupToPerm, UsersGroupMember, UsersGroup, Repository, \
+    RepoGroup, CacheInvalidation
 
 log = logging.getLogger(__name__)
 
+# objects compiled permissions of users are built from, mapped to their
+# attributes that matter, None stands for any attribute
+PERMISSION_SOURCES = {
+    Permission: None,
+    UserToPerm: None,
+    UserRepoToPerm: None,
+    UserRepoGroupToPerm: None,
+    UsersGroupToPerm: None,
+    UsersGroupRepoToPerm: None,
+    UsersGroupRepoGroupToPerm: None,
+    UsersGroupMember: None,
+    UsersGroup: ('inherit_default_permissions',),
+    Repository: ('repo_name', 'user_id', 'private'),
+    RepoGroup: ('group_name',),
+}
+
+# sessions with uncommitted changes of permissions
+_changed_sessions = weakref.WeakKeyDictionary()
+
+
+def _permissions_changed(session):
+    for obj in itertools.chain(session.new, session.deleted):
+        if type(obj) in PERMISSION_SOURCES:
+            return True
+    for obj in session.dirty:
+        try:
+            attrs = PERMISSION_SOURCES[type(obj)]
+        except KeyError:
+            continue
+        if attrs is None:
+            if session.is_modified(obj):
+                return True
+        else:
+            for attr in attrs:
+                if get_history(obj, attr).has_changes():
+                    return True
+    return False
+
+
+def _after_flush(session, flush_context):
+    if session in _changed_sessions or not _permissions_changed(session):
+        return
+    _changed_sessions[session] = True
+    if CacheInvalidation.get_store() is None:
+        # versions kept in database are bumped along with the change
+        CacheInvalidation.set_invalidate(PermissionModel.VERSION_KEY,
+                                         session=session)
+
+
+def _after_commit(session):
+    if _changed_sessions.pop(session, False) and \
+        CacheInvalidation.get_store() is not None:
+        # other processes can't see the change before it's committed, so
+        # version kept in a file is bumped only now
+        CacheInvalidation.set_invalidate(PermissionModel.VERSION_KEY)
+
+
+def _after_rollback(session):
+    _changed_sessions.pop(session, None)
+
 
 class PermissionModel(BaseModel):
     """
@@ -44,6 +111,43 @@ class PermissionModel(BaseModel):
 
     cls = Permission
 
+    # cache key of permissions version, can't clash with any repository name
+    # as those can't contain colons
+    VERSION_KEY = ':permissions'
+    _tracking = False
+
+    @classmethod
+    def get_version(cls):
+        """
+        Returns current version of compiled permissions of all users
+        """
+        return CacheInvalidation.get_version(cls.VERSION_KEY)
+
+    @classmethod
+    def track_changes(cls):
+        """
+        Makes every committed change of permissions, repositories, groups or
+        users groups membership bump permissions version, so permissions
+        compiled for users before are not used anymore. Called once by
+        processes using such compiled permissions
+        """
+        if cls._tracking:
+            return
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+        cls._tracking = True
+
+    @classmethod
+    def is_cacheable(cls, session):
+        """
+        Tells if permissions compiled before can be used within given
+        session, which is only when changes are tracked and session itself
+        didn't change anything yet
+        """
+        return cls._tracking and session not in _changed_sessions and \
+            not _permissions_changed(session)
+
     def get_permission(self, permission_id, cache=False):
         """
         Get's permissions by id
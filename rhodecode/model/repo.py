@@ -29,6 +29,13 @@ import logging
 import traceback
 from datetime import datetime
 
+from sqlalchemy import func, and_, or_, not_
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy.sql import exists
+from pylons import tmpl_context as c
+from pylons.i18n.translation import _
+
+import rhodecode
 from rhodecode.lib.vcs.backends import get_backend
 from rhodecode.lib.compat import json
 from rhodecode.lib.utils2 import LazyProperty, safe_str, safe_unicode,\
@@ -38,8 +45,8 @@ from rhodecode.lib.hooks import log_create_repository, log_delete_repository
 
 from rhodecode.model import BaseModel
 from rhodecode.model.db import Repository, UserRepoToPerm, User, Permission, \
-    Statistics, UsersGroup, UsersGroupRepoToPerm, RhodeCodeUi, RepoGroup,\
-    RhodeCodeSetting
+    Statistics, UsersGroup, UsersGroupRepoToPerm, UsersGroupMember, \
+    RhodeCodeUi, RepoGroup, RhodeCodeSetting
 from rhodecode.lib import helpers as h
 
 
@@ -51,6 +58,15 @@ class RepoModel(BaseModel):
     cls = Repository
     URL_SEPARATOR = Repository.url_sep()
 
+    READ_PERMS = ('repository.read', 'repository.write', 'repository.admin')
+    # columns lightweight dashboard can be sorted by
+    SORT_COLUMNS = {
+        'name': func.lower(Repository.repo_name),
+        'desc': func.lower(Repository.description),
+        'last_change': Repository.updated_on,
+        'owner': func.lower(User.username),
+    }
+
     def __get_users_group(self, users_group):
         return self._get_instance(UsersGroup, users_group,
                                   callback=UsersGroup.get_by_group_name)
@@ -113,6 +129,124 @@ class RepoModel(BaseModel):
             } for gr in users_groups]
         )
 
+    def _get_readable_filter(self, user_id):
+        """
+        Returns clause matching repositories given non admin user can read.
+        Permissions are resolved like ``UserModel.fill_perms`` does with its
+        defaults: owner is admin, explicit permission of user wins, then the
+        highest permission of users groups user is member of, and permission
+        of default user on public repositories last
+
+        :param user_id: id of user to check permissions of
+        """
+        default_user = User.get_by_username('default', cache=True)
+
+        def _perm_exists(perm_cls, user_clause, read):
+            clauses = [perm_cls.repository_id == Repository.repo_id,
+                       user_clause]
+            if read:
+                clauses += [perm_cls.permission_id == Permission.permission_id,
+                            Permission.permission_name.in_(self.READ_PERMS)]
+            return exists().where(and_(*clauses))
+
+        def _user_perm(read=False):
+            return _perm_exists(UserRepoToPerm,
+                                UserRepoToPerm.user_id == user_id, read)
+
+        def _default_perm(read=False):
+            return _perm_exists(UserRepoToPerm, UserRepoToPerm.user_id ==
+                                default_user.user_id, read)
+
+        def _group_perm(read=False):
+            member = and_(UsersGroupRepoToPerm.users_group_id ==
+                          UsersGroupMember.users_group_id,
+                          UsersGroupMember.user_id == user_id)
+            return _perm_exists(UsersGroupRepoToPerm, member, read)
+
+        public = or_(Repository.private == False, Repository.private == None)
+        return or_(
+            Repository.user_id == user_id,
+            _user_perm(read=True),
+            and_(not_(_user_perm()), or_(
+                _group_perm(read=True),
+                and_(not_(_group_perm()), public, _default_perm(read=True))
+            ))
+        )
+
+    def get_repos_page(self, user, group_id=None, start=0, limit=None,
+                       sort_key='name', sort_dir='asc', name_filter=None):
+        """
+        Returns tuple of total number of repositories given user can read
+        and a page of them. Filtering by permissions, sorting and paging is
+        done in database
+
+        :param user: AuthUser instance to check permissions of
+        :param group_id: id of group to list repositories of, ``None`` for
+            top level repositories
+        :param start: offset of first returned repository
+        :param limit: max number of returned repositories
+        :param sort_key: one of name, desc, last_change, owner
+        :param sort_dir: asc or desc
+        :param name_filter: only return repositories containing this string
+            in their name
+        """
+        q = self.sa.query(Repository)\
+            .join((User, User.user_id == Repository.user_id))\
+            .filter(Repository.group_id == group_id)
+
+        if name_filter:
+            q = q.filter(func.lower(Repository.repo_name)
+                         .contains(name_filter.lower()))
+
+        if 'hg.admin' not in user.permissions['global']:
+            q = q.filter(self._get_readable_filter(user.user_id))
+        total = q.count()
+
+        sort_col = self.SORT_COLUMNS.get(sort_key,
+                                         self.SORT_COLUMNS['name'])
+        if sort_dir == 'desc':
+            sort_col = sort_col.desc()
+        q = q.order_by(sort_col, func.lower(Repository.repo_name))\
+            .options(contains_eager(Repository.user))\
+            .options(joinedload(Repository.fork))\
+            .offset(start)
+        if limit is not None:
+            q = q.limit(limit)
+        return total, q.all()
+
+    def get_repos_as_dict(self, repos_list):
+        """
+        Returns list of dicts rendered for lightweight dashboard data table
+        """
+        _tmpl_lookup = rhodecode.CONFIG['pylons.app_globals'].mako_lookup
+        template = _tmpl_lookup.get_template('data_table/_dt_elements.html')
+
+        def _render(tmpl, *args, **kwargs):
+            kwargs.update(dict(_=_, h=h, c=c))
+            return template.get_def(tmpl).render(*args, **kwargs)
+
+        def desc(desc):
+            if c.visual.stylify_metatags:
+                return h.urlify_text(h.desc_stylize(h.truncate(desc, 60)))
+            else:
+                return h.urlify_text(h.truncate(desc, 60))
+
+        repos_data = []
+        for repo in repos_list:
+            repos_data.append({
+                "menu": _render('quick_menu', repo.repo_name),
+                "raw_name": repo.repo_name.lower(),
+                "name": _render('repo_name', repo.repo_name, repo.repo_type,
+                                repo.private, repo.fork, short_name=False,
+                                admin=False),
+                "last_change": _render('last_change', repo.last_db_change),
+                "desc": desc(repo.description),
+                "owner": h.person(repo.user.username),
+                "rss": _render('rss', repo.repo_name),
+                "atom": _render('atom', repo.repo_name),
+            })
+        return repos_data
+
     def _get_defaults(self, repo_name):
         """
         Get's information about repository, and returns a dict for
@@ -32,7 +32,8 @@ import cStringIO
 import pkg_resources
 from os.path import dirname as dn, join as jn
 
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 from pylons.i18n.translation import _
 
 import rhodecode
@@ -46,11 +47,12 @@ from rhodecode import BACKENDS
 from rhodecode.lib import helpers as h
 from rhodecode.lib.utils2 import safe_str, safe_unicode
 from rhodecode.lib.auth import HasRepoPermissionAny, HasReposGroupPermissionAny
+from rhodecode.lib.hooks import refresh_repository
 from rhodecode.lib.utils import get_repos as get_filesystem_repos, make_ui, \
-    action_logger, REMOVED_REPO_PAT
+    action_logger, get_scm_size, REMOVED_REPO_PAT
 from rhodecode.model import BaseModel
 from rhodecode.model.db import Repository, RhodeCodeUi, CacheInvalidation, \
-    UserFollowing, UserLog, User, RepoGroup, PullRequest
+    UserFollowing, UserLog, User, RepoGroup, PullRequest, RepositorySummary
 
 log = logging.getLogger(__name__)
 
@@ -71,6 +73,36 @@ class RepoTemp(object):
         return "<%s('id:%s')>" % (self.__class__.__name__, self.repo_id)
 
 
+class ScannedRepo(object):
+    """
+    Repository found on filesystem by ``ScmModel.scan_repos``. Its scm
+    instance is created only when it's first used.
+    """
+
+    def __init__(self, name, alias, path, baseui=None, scm_instance=None):
+        self.name = name
+        self.alias = alias
+        self.path = path
+        self.baseui = baseui
+        if scm_instance is not None:
+            self.scm_instance = scm_instance
+
+    def __repr__(self):
+        return "<%s('%s:%s')>" % (self.__class__.__name__, self.alias,
+                                  self.name)
+
+    @LazyProperty
+    def scm_instance(self):
+        klass = get_backend(self.alias)
+        if self.alias == 'hg':
+            return klass(safe_str(self.path), baseui=self.baseui)
+        return klass(self.path)
+
+    @property
+    def description(self):
+        return self.scm_instance.description
+
+
 class CachedRepoList(object):
     """
     Cached repo list, uses in-memory cache after initialization, that is
@@ -90,27 +122,31 @@ class CachedRepoList(object):
         return '<%s (%s)>' % (self.__class__.__name__, self.__len__())
 
     def __iter__(self):
-        # pre-propagated cache_map to save executing select statements
-        # for each repo
-        cache_map = CacheInvalidation.get_cache_map()
-
+        # summaries are refreshed by pushes, repository rescans and web
+        # commits, rendering only reads stored ones even when they're
+        # outdated, so the dashboard never touches scm or writes to database
+        empty = EmptyChangeset()
         for dbr in self.db_repo_list:
-            scmr = dbr.scm_instance_cached(cache_map)
             # check permission at this level
             if not HasRepoPermissionAny(
                 'repository.read', 'repository.write', 'repository.admin'
             )(dbr.repo_name, 'get repo check'):
                 continue
 
-            if scmr is None:
-                log.error(
-                    '%s this repository is present in database but it '
-                    'cannot be created as an scm instance' % dbr.repo_name
-                )
-                continue
-
-            last_change = scmr.last_change
-            tip = h.get_changeset_safe(scmr, 'tip')
+            summary = dbr.summary
+            if summary is not None:
+                last_change = summary.last_change
+                tip_id = summary.tip_id
+                tip_revision = summary.tip_revision
+                tip_message = summary.tip_message
+                tip_author = summary.tip_author
+            else:
+                # not refreshed yet, show what database knows
+                last_change = dbr.updated_on
+                tip_id = empty.raw_id
+                tip_revision = empty.revision
+                tip_message = empty.message
+                tip_author = empty.author
 
             tmp_d = {}
             tmp_d['name'] = dbr.repo_name
@@ -120,15 +156,14 @@ class CachedRepoList(object):
             tmp_d['description_sort'] = tmp_d['description'].lower()
             tmp_d['last_change'] = last_change
             tmp_d['last_change_sort'] = time.mktime(last_change.timetuple())
-            tmp_d['tip'] = tip.raw_id
-            tmp_d['tip_sort'] = tip.revision
-            tmp_d['rev'] = tip.revision
+            tmp_d['tip'] = tip_id
+            tmp_d['tip_sort'] = tip_revision
+            tmp_d['rev'] = tip_revision
             tmp_d['contact'] = dbr.user.full_contact
             tmp_d['contact_sort'] = tmp_d['contact']
             tmp_d['owner_sort'] = tmp_d['contact']
-            tmp_d['repo_archives'] = list(scmr._get_archives())
-            tmp_d['last_msg'] = tip.message
-            tmp_d['author'] = tip.author
+            tmp_d['last_msg'] = tip_message
+            tmp_d['author'] = tip_author
             tmp_d['dbrepo'] = dbr.get_dict()
             tmp_d['dbrepo_fork'] = dbr.fork.get_dict() if dbr.fork else {}
             yield tmp_d
@@ -207,10 +242,12 @@ class ScmModel(BaseModel):
 
         return q.ui_value
 
-    def repo_scan(self, repos_path=None):
+    def scan_repos(self, repos_path=None):
         """
-        Listing of repositories in given path. This path should not be a
-        repository itself. Return a dictionary of repository objects
+        Returns iterator of ``ScannedRepo`` of every repository found in
+        given path, yielded as soon as it's found. Directories are listed
+        in parallel and scm instances aren't created. This path should not
+        be a repository itself.
 
         :param repos_path: path to directory containing repositories
         """
@@ -220,31 +257,42 @@ class ScmModel(BaseModel):
 
         log.info('scanning for repositories in %s' % repos_path)
 
+        # ui is read before the scan starts, reading it clears the session
+        # which repositories may be mapped in while they're yielded
         baseui = make_ui('db')
-        repos = {}
+        return self._scan_repos(repos_path, baseui)
+
+    def _scan_repos(self, repos_path, baseui):
+        names = set()
 
         for name, path in get_filesystem_repos(repos_path, recursive=True):
             # skip removed repos
             if REMOVED_REPO_PAT.match(name) or path[0] is None:
                 continue
+            if path[0] not in BACKENDS:
+                continue
 
             # name need to be decomposed and put back together using the /
             # since this is internal storage separator for rhodecode
             name = Repository.url_sep().join(name.split(os.sep))
 
-            try:
-                if name in repos:
-                    raise RepositoryError('Duplicate repository name %s '
-                                          'found in %s' % (name, path))
-                else:
-
-                    klass = get_backend(path[0])
+            if name in names:
+                raise RepositoryError('Duplicate repository name %s '
+                                      'found in %s' % (name, path))
+            names.add(name)
+            yield ScannedRepo(name, path[0], path[1], baseui)
 
-                    if path[0] == 'hg' and path[0] in BACKENDS.keys():
-                        repos[name] = klass(safe_str(path[1]), baseui=baseui)
+    def repo_scan(self, repos_path=None):
+        """
+        Listing of repositories in given path. This path should not be a
+        repository itself. Return a dictionary of repository objects
 
-                    if path[0] == 'git' and path[0] in BACKENDS.keys():
-                        repos[name] = klass(path[1])
+        :param repos_path: path to directory containing repositories
+        """
+        repos = {}
+        for scanned in self.scan_repos(repos_path):
+            try:
+                repos[scanned.name] = scanned.scm_instance
             except OSError:
                 continue
 
@@ -264,7 +312,13 @@ class ScmModel(BaseModel):
         if all_repos is None:
             all_repos = self.sa.query(Repository)\
                         .filter(Repository.group_id == None)\
-                        .order_by(func.lower(Repository.repo_name)).all()
+                        .order_by(func.lower(Repository.repo_name))
+            if not simple:
+                # everything dashboard shows comes within the same query
+                all_repos = all_repos.options(joinedload(Repository.summary))\
+                                     .options(joinedload(Repository.user))\
+                                     .options(joinedload(Repository.fork))
+            all_repos = all_repos.all()
         if simple:
             repo_iter = SimpleCachedRepoList(all_repos,
                                              repos_path=self.repos_path,
@@ -284,14 +338,117 @@ class ScmModel(BaseModel):
 
         return group_iter
 
+    def update_repo_summary(self, repo, scm_repo=None, version=None):
+        """
+        Refreshes denormalised tip information of given repository used to
+        render dashboard. Returns ``RepositorySummary`` or ``None`` if scm
+        instance of that repository cannot be created
+
+        :param repo: Repository instance, id or name
+        :param scm_repo: already created scm instance of that repository
+        :param version: cache version of repository, when given it has to be
+            read before the scm instance was created
+        """
+        repo = self.__get_repo(repo)
+        if version is None:
+            version = CacheInvalidation.get_version(repo.repo_name)
+        if scm_repo is None:
+            scm_repo = repo.scm_instance
+        if scm_repo is None:
+            return
+
+        tip = h.get_changeset_safe(scm_repo, 'tip')
+        summary = repo.summary
+        if summary is None:
+            summary = RepositorySummary()
+            summary.repository = repo
+        summary.tip_id = tip.raw_id
+        summary.tip_revision = tip.revision
+        summary.tip_message = safe_unicode(tip.message)
+        summary.tip_author = safe_unicode(tip.author)
+        summary.last_change = scm_repo.last_change
+        summary.cache_version = version
+        self.sa.add(summary)
+        # repository pages don't update it on their own
+        repo.updated_on = summary.last_change
+        self.sa.add(repo)
+        return summary
+
+    def add_repo_size(self, repo, size):
+        """
+        Adds ``size`` of data pushed to given repository to its recorded
+        size. Returns new recorded size, or ``None`` if size of repository
+        wasn't measured yet
+
+        :param repo: Repository instance, id or name
+        :param size: number of pushed bytes
+        """
+        repo = self.__get_repo(repo)
+        if repo is None:
+            return None
+        # single update, concurrent pushes don't overwrite each other
+        self.sa.query(RepositorySummary)\
+            .filter(RepositorySummary.repository_id == repo.repo_id)\
+            .filter(RepositorySummary.size != None)\
+            .update({RepositorySummary.size: RepositorySummary.size + size},
+                    synchronize_session=False)
+        return self.sa.query(RepositorySummary.size)\
+            .filter(RepositorySummary.repository_id == repo.repo_id)\
+            .scalar()
+
+    def update_repo_size(self, repo):
+        """
+        Measures size of given repository on disk and records it, correcting
+        the size recorded from pushes. Returns the size, or ``None`` if there
+        is no summary of that repository and it can't be created
+
+        :param repo: Repository instance, id or name
+        """
+        repo = self.__get_repo(repo)
+        summary = repo.summary
+        if summary is None:
+            summary = self.update_repo_summary(repo)
+            if summary is None:
+                return None
+        size_scm, size_root = get_scm_size('.' + repo.repo_type,
+                                           repo.repo_full_path)
+        summary.size = size_scm + size_root
+        self.sa.add(summary)
+        return summary.size
+
+    def update_repo_sizes(self):
+        """
+        Measures and records sizes of all repositories, returns number of
+        updated ones
+        """
+        updated = 0
+        for repo_id, in self.sa.query(Repository.repo_id).all():
+            try:
+                if self.update_repo_size(repo_id) is not None:
+                    updated += 1
+                self.sa.commit()
+            except Exception:
+                log.error(traceback.format_exc())
+                self.sa.rollback()
+        return updated
+
+    def get_repo_sizes(self):
+        """
+        Returns dict of recorded sizes of all repositories by their names,
+        size is ``None`` for repositories not measured yet
+        """
+        return dict(self.sa.query(Repository.repo_name,
+                                  RepositorySummary.size)
+                    .outerjoin(Repository.summary).all())
+
     def mark_for_invalidation(self, repo_name):
         """
-        Puts cache invalidation task into db for
-        further global cache invalidation
+        Bumps cache version of given repository, so all processes drop their
+        cached values of it on next access
 
         :param repo_name: this repo that should invalidation take place
         """
-        CacheInvalidation.set_invalidate(repo_name=repo_name)
+        CacheInvalidation.set_invalidate(repo_name)
 
     def toggle_following_repo(self, follow_repo_id, user_id):
 
@@ -380,6 +537,25 @@ class ScmModel(BaseModel):
         return self.sa.query(PullRequest)\
                 .filter(PullRequest.other_repo == repo).count()
 
+    def get_counters(self, repo):
+        """
+        Returns tuple of numbers of followers, forks and pull requests of
+        given repository, all read with single query
+
+        :param repo: Repository instance, id or name
+        """
+        repo = self._get_repo(repo)
+        count = func.count('*')
+        followers = self.sa.query(count).select_from(UserFollowing)\
+                .filter(UserFollowing.follows_repo_id == repo.repo_id)
+        forks = self.sa.query(count).select_from(Repository)\
+                .filter(Repository.fork_id == repo.repo_id)
+        pull_requests = self.sa.query(count).select_from(PullRequest)\
+                .filter(PullRequest.other_repo_id == repo.repo_id)
+        counters = select([followers.as_scalar(), forks.as_scalar(),
+                           pull_requests.as_scalar()])
+        return tuple(self.sa.execute(counters, mapper=Repository).fetchone())
+
     def mark_as_fork(self, repo, fork, user):
         repo = self.__get_repo(repo)
         fork = self.__get_repo(fork)
@@ -415,7 +591,7 @@ class ScmModel(BaseModel):
                 repo.fetch(clone_uri)
             else:
                 repo.pull(clone_uri)
-            self.mark_for_invalidation(dbrepo.repo_name)
+            refresh_repository(dbrepo.repo_name)
         except:
             log.error(traceback.format_exc())
             raise
@@ -452,7 +628,7 @@ class ScmModel(BaseModel):
 
         action = 'push_local:%s' % tip.raw_id
         action_logger(user, action, repo_name)
-        self.mark_for_invalidation(repo_name)
+        refresh_repository(repo_name)
         return tip
 
     def create_node(self, repo, repo_name, cs, user, author, message, content,
@@ -491,7 +667,7 @@ class ScmModel(BaseModel):
 
         action = 'push_local:%s' % tip.raw_id
         action_logger(user, action, repo_name)
-        self.mark_for_invalidation(repo_name)
+        refresh_repository(repo_name)
         return tip
 
     def get_nodes(self, repo_name, revision, root_path='/', flat=True):
@@ -511,13 +687,13 @@ class ScmModel(BaseModel):
             _repo = self.__get_repo(repo_name)
             changeset = _repo.scm_instance.get_changeset(revision)
             root_path = root_path.lstrip('/')
-            for topnode, dirs, files in changeset.walk(root_path):
+            for toppath, dirs, files in changeset.walk_paths(root_path):
                 for f in files:
-                    _files.append(f.path if flat else {"name": f.path,
-                                                       "type": "file"})
+                    _files.append(f if flat else {"name": f,
+                                                  "type": "file"})
                 for d in dirs:
-                    _dirs.append(d.path if flat else {"name": d.path,
-                                                      "type": "dir"})
+                    _dirs.append(d if flat else {"name": d,
+                                                 "type": "dir"})
         except RepositoryError:
             log.debug(traceback.format_exc())
             raise
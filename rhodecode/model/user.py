@@ -31,16 +31,18 @@ import functools
 from pylons import url
 from pylons.i18n.translation import _
 
+from sqlalchemy import func
 from sqlalchemy.exc import DatabaseError
 from sqlalchemy.orm import joinedload
 
 from rhodecode.lib.utils2 import safe_unicode, generate_api_key
-from rhodecode.lib.caching_query import FromCache
+from rhodecode.lib.caching_query import FromCache, get_cache_region
 from rhodecode.model import BaseModel
+from rhodecode.model.permission import PermissionModel
 from rhodecode.model.db import User, UserRepoToPerm, Repository, Permission, \
     UserToPerm, UsersGroupRepoToPerm, UsersGroupToPerm, UsersGroupMember, \
     Notification, RepoGroup, UserRepoGroupToPerm, UsersGroupRepoGroupToPerm, \
-    UserEmailMap
+    UserEmailMap, UserNotification
 from rhodecode.lib.exceptions import DefaultUserException, \
     UserOwnsReposException
 
@@ -350,7 +352,8 @@ class UserModel(BaseModel):
     def fill_data(self, auth_user, user_id=None, api_key=None):
         """
         Fetches auth_user by user_id,or api_key if present.
-        Fills auth_user attributes with those taken from database.
+        Fills auth_user attributes with those taken from database, together
+        with number of unread notifications read by the same query.
         Additionally set's is_authenitated if lookup fails
         present in database
 
@@ -362,15 +365,22 @@ class UserModel(BaseModel):
             raise Exception('You need to pass user_id or api_key')
 
         try:
+            unread = self.sa.query(func.count(UserNotification.notification_id))\
+                .filter(UserNotification.user_id == User.user_id)\
+                .filter(UserNotification.read == False)\
+                .correlate(User).as_scalar()
+            q = self.sa.query(User, unread)
             if api_key:
-                dbuser = self.get_by_api_key(api_key)
+                q = q.filter(User.api_key == api_key)
             else:
-                dbuser = self.get(user_id)
+                q = q.filter(User.user_id == user_id)
+            dbuser, unread_cnt = q.first() or (None, None)
 
             if dbuser is not None and dbuser.active:
                 log.debug('filling %s data' % dbuser)
                 for k, v in dbuser.get_dict().items():
                     setattr(auth_user, k, v)
+                auth_user.unread_notifications = unread_cnt
             else:
                 return False
 
@@ -381,7 +391,7 @@ class UserModel(BaseModel):
 
         return True
 
-    def fill_perms(self, user, explicit=True, algo='higherwin'):
+    def fill_perms(self, user, explicit=True, algo='higherwin', cache=False):
         """
         Fills user permission attribute with permissions taken from database
         works for permissions given for repositories, and for permissions that
@@ -396,7 +406,12 @@ class UserModel(BaseModel):
             it's multiple defined, eg user in two different groups. It also
             decides if explicit flag is turned off how to specify the permission
             for case when user is in a group + have defined separate permission
+        :param cache: reuse permissions compiled for this user before, as long
+            as permissions version didn't change since then
         """
+        if cache:
+            return self._fill_cached_perms(user, explicit, algo)
+
         RK = 'repositories'
         GK = 'repositories_groups'
         GLOBAL = 'global'
@@ -631,6 +646,31 @@ class UserModel(BaseModel):
 
         return user
 
+    def _fill_cached_perms(self, user, explicit, algo):
+        if not PermissionModel.is_cacheable(self.sa):
+            return self.fill_perms(user, explicit, algo)
+
+        # version has to be read before permissions are compiled
+        state = (PermissionModel.get_version(), user.is_admin,
+                 user.inherit_default_permissions)
+        region = get_cache_region('permissions_snapshot', 'long_term')
+        key = '%s_%s_%s' % (user.user_id, explicit, algo)
+        try:
+            cached_state, permissions = region.get(key)
+        except KeyError:
+            cached_state = permissions = None
+
+        if cached_state != state:
+            log.debug('compiling permissions of %s' % user)
+            self.fill_perms(user, explicit, algo)
+            permissions = user.permissions
+            region.put(key, (state, permissions))
+
+        # each user gets own copy, so cached one can't be changed
+        user.permissions = dict((k, v.copy())
+                                for k, v in permissions.iteritems())
+        return user
+
     def has_perm(self, user, perm):
         perm = self._get_perm(perm)
         user = self._get_user(user)
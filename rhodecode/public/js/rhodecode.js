@@ -1737,6 +1737,15 @@ var lastLoginSort = function(a, b, desc, field) {
     return compState;
 };
 
+var sizeSort = function(a, b, desc, field) {
+    var a_ = a.getData('raw_size') || 0;
+    var b_ = b.getData('raw_size') || 0;
+
+    var comp = YAHOO.util.Sort.compare;
+    var compState = comp(a_, b_, desc);
+    return compState;
+};
+
 var nameSort = function(a, b, desc, field) {
     var a_ = fromHTML(a.getData(field));
     var b_ = fromHTML(b.getData(field));
@@ -1,8 +1,39 @@
+from sqlalchemy import event
+
 from rhodecode.tests import *
+from rhodecode.model import meta
 
 
 class TestChangelogController(TestController):
 
+    def test_index_doesnt_write(self):
+        self.log_user()
+        statements = []
+        active = [True]
+
+        def _log_statement(conn, cursor, statement, *args):
+            if active[0]:
+                statements.append(statement)
+        event.listen(meta.Base.metadata.bind, 'before_cursor_execute',
+                     _log_statement)
+        try:
+            self.app.get(url(controller='changelog', action='index',
+                             repo_name=HG_REPO))
+        finally:
+            active[0] = False
+        self.assertTrue(statements)
+        self.assertEqual([s for s in statements
+                          if not s.lstrip().upper().startswith('SELECT')], [])
+
+    def test_index_queries(self):
+        self.log_user()
+        url_ = url(controller='changelog', action='index', repo_name=HG_REPO)
+        self.app.get(url_)
+        # repository data and permissions are cached now
+        self.app.get(url_)
+        self.assertTrue(0 < meta.query_counter.count <= 10,
+                        meta.query_counter.count)
+
     def test_index_hg(self):
         self.log_user()
         response = self.app.get(url(controller='changelog', action='index',
@@ -68,3 +99,19 @@ class TestChangelogController(TestController):
             """title="Merge with 2e6a2bf9356ca56df08807f4ad86d480da72a8f4">"""
             """46ad32a4f974</a>""" % HG_REPO
         )
+
+    def test_index_hg_branch(self):
+        self.log_user()
+        response = self.app.get(url(controller='changelog', action='index',
+                                    repo_name=HG_REPO),
+                                {'branch': 'default', 'size': 10})
+        response.mustcontain("""<div id="chg_10" class="container tablerow1">""")
+        self.assertFalse('<div id="chg_11"' in response.body)
+
+    def test_index_git_branch(self):
+        self.log_user()
+        response = self.app.get(url(controller='changelog', action='index',
+                                    repo_name=GIT_REPO),
+                                {'branch': 'master', 'size': 10})
+        response.mustcontain("""<div id="chg_10" class="container tablerow1">""")
+        self.assertFalse('<div id="chg_11"' in response.body)
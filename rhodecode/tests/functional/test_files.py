@@ -1,4 +1,12 @@
+from __future__ import with_statement
+import os
+import mock
+import zipfile
+from StringIO import StringIO
+import rhodecode
 from rhodecode.tests import *
+from rhodecode.lib.archive_store import get_archive_store
+from rhodecode.lib.vcs.backends.hg import MercurialChangeset
 from rhodecode.model.db import Repository
 from rhodecode.model.meta import Session
 
@@ -226,24 +234,79 @@ removed extra unicode conversion in diff.</div>
     def test_archival(self):
         self.log_user()
         _set_downloads(HG_REPO, set_to=True)
+        get_archive_store().clear()
         for arch_ext, info in ARCHIVE_SPECS.items():
             short = '27cd5cce30c9%s' % arch_ext
             fname = '27cd5cce30c96924232dffcd24178a07ffeb5dfc%s' % arch_ext
             filename = '%s-%s' % (HG_REPO, short)
-            response = self.app.get(url(controller='files',
-                                        action='archivefile',
-                                        repo_name=HG_REPO,
-                                        fname=fname))
-
-            self.assertEqual(response.status, '200 OK')
+            archive_url = url(controller='files', action='archivefile',
+                              repo_name=HG_REPO, fname=fname)
             heads = [
                 ('Pragma', 'no-cache'),
                 ('Cache-Control', 'no-cache'),
                 ('Content-Disposition', 'attachment; filename=%s' % filename),
                 ('Content-Type', '%s; charset=utf-8' % info[0]),
             ]
+            # first download is streamed while it's built
+            response = self.app.get(archive_url)
+            self.assertEqual(response.status, '200 OK')
             self.assertEqual(response.response._headers.items(), heads)
 
+            # next ones are sent from the store
+            stored = self.app.get(archive_url)
+            self.assertEqual(stored.body, response.body)
+            self.assertEqual(stored.response._headers.items(),
+                    heads + [('Content-Length', str(len(response.body)))])
+
+    def test_archival_is_built_once(self):
+        self.log_user()
+        _set_downloads(HG_REPO, set_to=True)
+        fname = '27cd5cce30c96924232dffcd24178a07ffeb5dfc.tar.gz'
+        archive_url = url(controller='files', action='archivefile',
+                          repo_name=HG_REPO, fname=fname)
+        response = self.app.get(archive_url)
+
+        with mock.patch.object(MercurialChangeset, 'iter_archive') as iter_archive:
+            self.assertEqual(self.app.get(archive_url).body, response.body)
+            self.assertFalse(iter_archive.called)
+
+    def test_archival_without_store(self):
+        self.log_user()
+        _set_downloads(HG_REPO, set_to=True)
+        fname = '27cd5cce30c96924232dffcd24178a07ffeb5dfc.zip'
+        archive_url = url(controller='files', action='archivefile',
+                          repo_name=HG_REPO, fname=fname)
+
+        with mock.patch('rhodecode.controllers.files.get_archive_store',
+                        return_value=None):
+            response = self.app.get(archive_url)
+        self.assertEqual(zipfile.ZipFile(StringIO(response.body)).testzip(),
+                         None)
+
+    def test_archival_sendfile(self):
+        self.log_user()
+        _set_downloads(HG_REPO, set_to=True)
+        fname = '27cd5cce30c96924232dffcd24178a07ffeb5dfc.zip'
+        archive_url = url(controller='files', action='archivefile',
+                          repo_name=HG_REPO, fname=fname)
+        store = get_archive_store()
+
+        with mock.patch.dict(rhodecode.CONFIG,
+                             {'archive_sendfile_header': 'X-Sendfile'}):
+            response = self.app.get(archive_url)
+        self.assertEqual(response.body, '')
+        path = response.response.headers['X-Sendfile']
+        self.assertTrue(path.startswith(store.path))
+        self.assertTrue(os.path.isfile(path))
+
+        with mock.patch.dict(rhodecode.CONFIG,
+                             {'archive_sendfile_header': 'X-Accel-Redirect',
+                              'archive_accel_redirect_location': '/_arch/'}):
+            response = self.app.get(archive_url)
+        location = response.response.headers['X-Accel-Redirect']
+        self.assertTrue(location.startswith('/_arch/'))
+        self.assertTrue(path.endswith(location[len('/_arch'):]))
+
     def test_archival_wrong_ext(self):
         self.log_user()
         _set_downloads(HG_REPO, set_to=True)
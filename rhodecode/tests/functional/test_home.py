@@ -3,6 +3,7 @@ from rhodecode.tests import *
 from rhodecode.model.meta import Session
 from rhodecode.model.db import User, RhodeCodeSetting, Repository
 from rhodecode.lib.utils import set_rhodecode_config
+from rhodecode.lib.compat import json
 
 
 class TestHomeController(TestController):
@@ -73,6 +74,65 @@ merge" class="tooltip" href="/vcs_test_hg/changeset/27cd5cce30c96924232"""
 
         try:
             response = self.app.get(url(controller='home', action='index'))
-            response.mustcontain("""var data = {"totalRecords": %s""" % len(Repository.getAll()))
+            response.mustcontain("""new YAHOO.util.XHRDataSource(url)""")
+            response.mustcontain("""var url = "/_repos";""")
         finally:
             set_l_dash(False)
+
+    def test_repos_data(self):
+        self.log_user()
+        response = self.app.get(url(controller='home', action='repos_data'))
+        data = json.loads(response.body)
+        top_level = Repository.query()\
+            .filter(Repository.group_id == None).count()
+        self.assertEqual(data['totalRecords'], top_level)
+        self.assertEqual(len(data['records']), top_level)
+        self.assertEqual(data['sort'], 'name')
+        self.assertEqual(data['dir'], 'asc')
+        names = [r['raw_name'] for r in data['records']]
+        self.assertEqual(names, sorted(names))
+
+    def test_repos_data_page(self):
+        self.log_user()
+        response = self.app.get(url(controller='home', action='repos_data'),
+                                {'startIndex': 1, 'results': 1,
+                                 'sort': 'name', 'dir': 'desc'})
+        data = json.loads(response.body)
+        names = sorted([r.repo_name.lower() for r in Repository.query()
+                        .filter(Repository.group_id == None)], reverse=True)
+        self.assertEqual(data['startIndex'], 1)
+        self.assertEqual(data['dir'], 'desc')
+        self.assertEqual([r['raw_name'] for r in data['records']],
+                         names[1:2])
+
+    def test_repos_data_filter(self):
+        self.log_user()
+        response = self.app.get(url(controller='home', action='repos_data'),
+                                {'filter': GIT_REPO.upper()})
+        data = json.loads(response.body)
+        names = [r['raw_name'] for r in data['records']]
+        self.assertTrue(GIT_REPO in names)
+        self.assertFalse(HG_REPO in names)
+        self.assertEqual(data['totalRecords'], len(names))
+        for name in names:
+            self.assertTrue(GIT_REPO in name)
+
+    def test_repos_data_hides_private_repos(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        repo.private = True
+        Session().add(repo)
+        Session().commit()
+        try:
+            self.log_user(TEST_USER_REGULAR_LOGIN, TEST_USER_REGULAR_PASS)
+            response = self.app.get(url(controller='home',
+                                        action='repos_data'))
+            data = json.loads(response.body)
+            names = [r['raw_name'] for r in data['records']]
+            self.assertFalse(HG_REPO in names)
+            self.assertTrue(GIT_REPO in names)
+            self.assertEqual(data['totalRecords'], len(names))
+        finally:
+            repo = Repository.get_by_repo_name(HG_REPO)
+            repo.private = False
+            Session().add(repo)
+            Session().commit()
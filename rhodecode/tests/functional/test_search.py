@@ -1,5 +1,9 @@
+from __future__ import with_statement
 import os
+import mock
 from rhodecode.tests import *
+from rhodecode.controllers.search import SearchController
+from rhodecode.lib.search_cache import SearchCache
 from nose.plugins.skip import SkipTest
 
 
@@ -29,6 +33,29 @@ class TestSearchController(TestController):
                                 {'q': 'def repo'})
         response.mustcontain('39 results')
 
+    def test_normal_search_last_page(self):
+        self.log_user()
+        response = self.app.get(url(controller='search', action='index'),
+                                {'q': 'def repo', 'page': 4})
+        response.mustcontain('39 results')
+        self.assertEqual(response.body.count('class="search-code-body"'), 9)
+
+    def test_repeated_search_is_cached(self):
+        self.log_user()
+        cache = SearchCache(1024 * 1024)
+        with mock.patch('rhodecode.controllers.search.get_search_cache',
+                        return_value=cache):
+            self.app.get(url(controller='search', action='index'),
+                         {'q': 'def  Repo'})
+            self.assertEqual(len(cache), 1)
+            with mock.patch.object(SearchController, '_search') as search:
+                response = self.app.get(url(controller='search',
+                                            action='index'),
+                                        {'q': 'def repo'})
+                self.assertFalse(search.called)
+        response.mustcontain('39 results')
+        self.assertEqual(response.body.count('class="search-code-body"'), 10)
+
     def test_repo_search(self):
         self.log_user()
         response = self.app.get(url(controller='search', action='index'),
@@ -36,6 +63,16 @@ class TestSearchController(TestController):
 
         response.mustcontain('4 results')
 
+    def test_repo_search_in_repo(self):
+        self.log_user()
+        response = self.app.get(url(controller='search', action='index',
+                                    search_repo=HG_REPO),
+                                {'q': 'def test'})
+
+        response.mustcontain('4 results')
+        response.mustcontain('%s &raquo; ' % HG_REPO)
+        self.assertFalse('%s &raquo; ' % GIT_REPO in response.body)
+
     def test_search_last(self):
         self.log_user()
         response = self.app.get(url(controller='search', action='index'),
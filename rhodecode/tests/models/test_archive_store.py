@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.archive_store import ArchiveStore
+
+
+class TestArchiveStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ArchiveStore(os.path.join(self.tmp, 'archives'),
+                                  10 * 1024)
+        self.built = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _create(self, key, size=1024):
+        def fill(stream):
+            self.built.append(key)
+            stream.write('x' * size)
+        return self.store.create(key, fill)
+
+    def test_archive_is_built_once(self):
+        self.assertEqual(self.store.get(('repo', 'tip')), None)
+        path = self._create(('repo', 'tip'))
+        self.assertEqual(open(path, 'rb').read(), 'x' * 1024)
+        self.assertEqual(self._create(('repo', 'tip')), path)
+        self.assertEqual(self.store.get(('repo', 'tip')), path)
+        self.assertEqual(self.built, [('repo', 'tip')])
+        self.assertEqual(path, os.path.join(self.store.path,
+                         *self.store.get_name(('repo', 'tip')).split('/')))
+
+    def test_failed_build_is_not_stored(self):
+        def fill(stream):
+            stream.write('broken')
+            raise IOError('failed')
+        self.assertRaises(IOError, self.store.create, 'key', fill)
+        self.assertEqual(self.store.get('key'), None)
+        self._create('key')
+        self.assertEqual(self.built, ['key'])
+
+    def test_least_recently_used_are_evicted(self):
+        for i in range(10):
+            path = self._create(i)
+            os.utime(path, (1000 + i, 1000 + i))
+        # read archive becomes the most recently used one
+        self.store.get(0)
+        self._create(10)
+        self.assertEqual([i for i in range(11) if self.store.get(i)],
+                         [0, 4, 5, 6, 7, 8, 9, 10])
+
+        # just created archive is kept even when it's bigger than the store
+        big = self._create('big', size=20 * 1024)
+        self.assertTrue(os.path.isfile(big))
+        self.assertEqual([i for i in range(11) if self.store.get(i)], [])
+        self._create(11)
+        self.assertEqual(self.store.get('big'), None)
+
+    def test_streamed_archive_is_stored(self):
+        chunks = self.store.iter_create('key', iter(['a', 'b', 'c']))
+        self.assertEqual(chunks.next(), 'a')
+        # not stored until it's read whole
+        self.assertEqual(self.store.get('key'), None)
+        self.assertEqual(list(chunks), ['b', 'c'])
+        self.assertEqual(open(self.store.get('key'), 'rb').read(), 'abc')
+
+    def test_interrupted_stream_is_not_stored(self):
+        chunks = self.store.iter_create('key', iter(['a', 'b', 'c']))
+        self.assertEqual(chunks.next(), 'a')
+        chunks.close()
+        self.assertEqual(self.store.get('key'), None)
+        self.assertEqual(os.listdir(os.path.dirname(
+                         self.store._get_path('key'))), ['%s.lock' %
+                         os.path.basename(self.store._get_path('key'))])
+
+    def test_stream_being_stored_is_not_stored_again(self):
+        chunks = self.store.iter_create('key', iter(['a', 'b']))
+        chunks.next()
+        other = self.store.iter_create('key', iter(['a', 'b']))
+        self.assertEqual(list(other), ['a', 'b'])
+        self.assertEqual(self.store.get('key'), None)
+        list(chunks)
+        self.assertEqual(open(self.store.get('key'), 'rb').read(), 'ab')
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import with_statement
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+import rhodecode
+from rhodecode.tests import *
+from rhodecode.lib.cache_versions import FileVersionStore
+from rhodecode.model.db import CacheInvalidation, RhodeCodeSetting
+from rhodecode.model.scm import ScmModel
+from rhodecode.model.meta import Session
+
+
+class TestFileVersionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = FileVersionStore(os.path.join(self.tmp, 'versions'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_missing_repo_has_version_zero(self):
+        self.assertEqual(self.store.get_version(u'missing'), 0)
+        self.assertEqual(self.store.get_versions(), {})
+
+    def test_bump(self):
+        self.assertEqual(self.store.bump(u'repo'), 1)
+        self.assertEqual(self.store.bump(u'repo'), 2)
+        self.assertEqual(self.store.bump(u'group/repę'), 1)
+        self.assertEqual(self.store.get_versions(),
+                         {u'repo': 2, u'group/repę': 1})
+
+    def test_bump_is_seen_by_other_stores(self):
+        other = FileVersionStore(self.store.path)
+        self.assertEqual(other.get_version(u'repo'), 0)
+        self.store.bump(u'repo')
+        self.assertEqual(other.get_version(u'repo'), 1)
+
+
+class TestCacheInvalidation(unittest.TestCase):
+
+    def setUp(self):
+        self._seen = CacheInvalidation._seen_versions.copy()
+
+    def tearDown(self):
+        CacheInvalidation._seen_versions = self._seen
+        CacheInvalidation._store = None
+
+    def _check_invalidation(self):
+        key = HG_REPO + '_README'
+        version = CacheInvalidation.invalidate(key)
+        self.assertNotEqual(version, None)
+        CacheInvalidation.set_valid(key, version)
+        self.assertEqual(CacheInvalidation.invalidate(key), None)
+        self.assertEqual(CacheInvalidation.invalidate(
+            key, CacheInvalidation.get_cache_map()), None)
+
+        ScmModel().mark_for_invalidation(HG_REPO)
+        new_version = CacheInvalidation.invalidate(key)
+        self.assertEqual(new_version, version + 1)
+        self.assertEqual(CacheInvalidation.invalidate(
+            key, CacheInvalidation.get_cache_map()), new_version)
+        CacheInvalidation.set_valid(key, new_version)
+        self.assertEqual(CacheInvalidation.invalidate(key), None)
+        self.assertTrue((key, new_version, True) in
+                        CacheInvalidation.get_cache_keys(HG_REPO))
+
+    def test_file_store(self):
+        self.assertNotEqual(CacheInvalidation.get_store(), None)
+        self._check_invalidation()
+
+    def test_db_store(self):
+        CacheInvalidation._store = False
+        self.assertEqual(CacheInvalidation.get_store(), None)
+        self._check_invalidation()
+        Session().commit()
+
+    def _get_store(self, **conf):
+        CacheInvalidation._store = None
+        conf['app_conf'] = rhodecode.CONFIG.get('app_conf', {})
+        with mock.patch.object(rhodecode, 'CONFIG', conf):
+            return CacheInvalidation.get_store()
+
+    def test_store_setting(self):
+        # configs without the option kept versions in database
+        self.assertEqual(self._get_store(), None)
+        self.assertEqual(self._get_store(instance_id='node1'), None)
+        self.assertEqual(self._get_store(cache_invalidation_store='db'),
+                         None)
+        self.assertNotEqual(self._get_store(cache_invalidation_store=''),
+                            None)
+        self.assertEqual(self._get_store(cache_invalidation_store='',
+                                         instance_id='node1'), None)
+        self.assertNotEqual(self._get_store(cache_invalidation_store='file',
+                                            instance_id='node1'), None)
+
+
+class TestAppSettingsCache(unittest.TestCase):
+
+    def tearDown(self):
+        setting = RhodeCodeSetting.get_by_name('title')
+        setting.app_settings_value = u'RhodeCode'
+        Session().add(setting)
+        Session().commit()
+        RhodeCodeSetting.invalidate_app_settings()
+
+    def test_settings_are_read_again_when_invalidated(self):
+        settings = RhodeCodeSetting.get_cached_app_settings()
+        self.assertEqual(settings, RhodeCodeSetting.get_app_settings())
+
+        setting = RhodeCodeSetting.get_by_name('title')
+        setting.app_settings_value = u'new title'
+        Session().add(setting)
+        Session().commit()
+        self.assertEqual(RhodeCodeSetting.get_cached_app_settings(), settings)
+
+        RhodeCodeSetting.invalidate_app_settings()
+        self.assertEqual(RhodeCodeSetting.get_cached_app_settings()
+                         ['rhodecode_title'], u'new title')
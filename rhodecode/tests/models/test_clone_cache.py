@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.archive_store import ArchiveStore
+from rhodecode.lib.clone_cache import get_upload_pack_key, \
+    get_getbundle_key, cache_response
+
+
+def pkt_line(line):
+    if line is None:
+        return '0000'
+    return '%04x%s\n' % (len(line) + 5, line)
+
+
+def upload_pack_body(*lines):
+    return ''.join(pkt_line(l) for l in lines)
+
+
+class TestCloneCacheKeys(unittest.TestCase):
+
+    def test_upload_pack_of_full_clone(self):
+        want = 'want %s' % ('a' * 40)
+        key = get_upload_pack_key(upload_pack_body(
+            want + ' side-band-64k ofs-delta agent=git/1.8.1', None, 'done'))
+        self.assertEqual(key, get_upload_pack_key(upload_pack_body(
+            want + ' side-band-64k ofs-delta agent=git/2.1.0', None, 'done')))
+        self.assertNotEqual(key, None)
+        self.assertNotEqual(key, get_upload_pack_key(upload_pack_body(
+            want + ' side-band-64k', None, 'done')))
+
+    def test_upload_pack_of_fetch(self):
+        want = 'want %s' % ('a' * 40)
+        self.assertEqual(get_upload_pack_key(upload_pack_body(
+            want, None, 'have %s' % ('b' * 40), 'done')), None)
+        self.assertEqual(get_upload_pack_key(upload_pack_body(
+            want, None, 'shallow %s' % ('b' * 40), 'done')), None)
+        # negotiation isn't finished
+        self.assertEqual(get_upload_pack_key(upload_pack_body(want, None)),
+                         None)
+        self.assertEqual(get_upload_pack_key('zzzz'), None)
+        self.assertEqual(get_upload_pack_key('00ffwant'), None)
+
+    def test_getbundle_of_full_clone(self):
+        environ = {'QUERY_STRING': 'cmd=getbundle',
+                   'HTTP_X_HGARG_1': 'common=%s&heads=' % ('0' * 40),
+                   'HTTP_X_HGARG_2': 'a' * 40}
+        key = get_getbundle_key(environ)
+        self.assertNotEqual(key, None)
+        self.assertEqual(key, get_getbundle_key({
+            'QUERY_STRING': 'cmd=getbundle&heads=%s&common=%s'
+                            % ('a' * 40, '0' * 40)}))
+
+    def test_getbundle_of_pull(self):
+        self.assertEqual(get_getbundle_key({
+            'QUERY_STRING': 'cmd=getbundle&heads=%s&common=%s'
+                            % ('a' * 40, 'b' * 40)}), None)
+        self.assertEqual(get_getbundle_key({
+            'QUERY_STRING': 'cmd=heads'}), None)
+
+
+class TestCacheResponse(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.store = ArchiveStore(os.path.join(self.tmp, 'clones'),
+                                  1024 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _get(self, status, key='key'):
+        def app(environ, start_response):
+            # starts response lazily like hgweb does
+            start_response(status, [])
+            yield 'HG10'
+            yield 'GZ'
+        statuses = []
+        chunks = cache_response(self.store, key, app, {},
+                                lambda s, h, e=None: statuses.append(s))
+        return statuses, ''.join(chunks)
+
+    def test_successful_response_is_stored(self):
+        self.assertEqual(self._get('200 Script output follows'),
+                         (['200 Script output follows'], 'HG10GZ'))
+        self.assertEqual(open(self.store.get('key'), 'rb').read(), 'HG10GZ')
+
+    def test_failed_response_is_not_stored(self):
+        self.assertEqual(self._get('500 Internal Server Error'),
+                         (['500 Internal Server Error'], 'HG10GZ'))
+        self.assertEqual(self.store.get('key'), None)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os
+import mock
+import shutil
+import tempfile
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib import diffs
+from rhodecode.lib.diff_cache import DiffCache
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(
+                                os.path.abspath(__file__))), 'fixtures')
+
+
+class TestDiffCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = DiffCache(os.path.join(self.tmp, 'diffs'), 10 * 1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _set_used(self, key, timestamp):
+        os.utime(self.cache._get_path(key), (timestamp, timestamp))
+
+    def test_get_and_set(self):
+        self.assertEqual(self.cache.get(('a', 'b')), None)
+        self.cache.set(('a', 'b'), {'html': u'<table>ę</table>'})
+        self.assertEqual(self.cache.get(('a', 'b')),
+                         {'html': u'<table>ę</table>'})
+        self.assertEqual(DiffCache(self.cache.path, 1024).get(('a', 'b')),
+                         {'html': u'<table>ę</table>'})
+
+    def test_least_recently_used_are_evicted(self):
+        value = os.urandom(1024)
+        for i in range(8):
+            self.cache.set(i, value)
+            self._set_used(i, 1000 + i)
+        # read entry becomes the most recently used one
+        self.assertEqual(self.cache.get(0), value)
+        self.cache.set(8, value)
+        self.cache.set(9, value)
+
+        self.assertNotEqual(self.cache.get(0), None)
+        self.assertEqual(self.cache.get(1), None)
+        self.assertNotEqual(self.cache.get(9), None)
+        size = sum(entry[1] for entry in self.cache._iter_entries())
+        self.assertTrue(size <= self.cache.max_size)
+
+    def test_too_big_entries_are_not_cached(self):
+        self.cache.set('big', os.urandom(5 * 1024))
+        self.assertEqual(self.cache.get('big'), None)
+
+    def test_rendered_diff_is_cached(self):
+        with open(os.path.join(FIXTURES, 'hg_diff_binary_and_normal.diff')) \
+            as f:
+            diff = f.read()
+        get_diff = mock.Mock(return_value=diff)
+        cache = DiffCache(self.cache.path, 1024 * 1024)
+        with mock.patch.object(diffs, 'get_diff_cache', return_value=cache):
+            limited, files = diffs.get_rendered_diff(get_diff, ('a', 'b'))
+            self.assertEqual(diffs.get_rendered_diff(get_diff, ('a', 'b')),
+                             (limited, files))
+            self.assertEqual(get_diff.call_count, 1)
+
+            # other options make other diff
+            diffs.get_rendered_diff(get_diff, ('a', 'b'), diff_limit=1000)
+            self.assertEqual(get_diff.call_count, 2)
+            # nothing is cached without key
+            diffs.get_rendered_diff(get_diff)
+            diffs.get_rendered_diff(get_diff)
+            self.assertEqual(get_diff.call_count, 4)
+
+        self.assertFalse(limited)
+        self.assertEqual([f['filename'] for f in files][:2],
+                         ['img/baseline-10px.png', 'js/jquery/hashgrid.js'])
+        self.assertTrue('code-difftable' in files[1]['html'])
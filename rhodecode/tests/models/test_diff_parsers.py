@@ -3,7 +3,7 @@ import os
 import unittest
 from rhodecode.tests import *
 from rhodecode.lib.diffs import DiffProcessor, NEW_FILENODE, DEL_FILENODE, \
-    MOD_FILENODE, RENAMED_FILENODE, CHMOD_FILENODE
+    MOD_FILENODE, RENAMED_FILENODE, CHMOD_FILENODE, LimitedDiffContainer
 
 dn = os.path.dirname
 FIXTURES = os.path.join(dn(dn(os.path.abspath(__file__))), 'fixtures')
@@ -84,3 +84,60 @@ def _diff_checker(fixture):
 def test_parse_diff():
     for fixture in DIFF_FIXTURES:
         yield _diff_checker, fixture
+
+
+def _read_fixture(fixture):
+    with open(os.path.join(FIXTURES, fixture)) as f:
+        return f.read()
+
+
+def _chunked(diff, size=100):
+    for i in xrange(0, len(diff), size):
+        yield diff[i:i + size]
+
+
+def _streamed_diff_checker(fixture):
+    diff = _read_fixture(fixture)
+    diff_proc = DiffProcessor(_chunked(diff))
+    data = [(x['filename'], x['operation'], x['stats'])
+            for x in diff_proc.prepare()]
+
+    assert DIFF_FIXTURES[fixture] == data
+    assert diff_proc.as_html() == DiffProcessor(diff).as_html()
+
+
+def test_parse_streamed_diff():
+    for fixture in DIFF_FIXTURES:
+        yield _streamed_diff_checker, fixture
+
+
+class TestDiffProcessor(unittest.TestCase):
+
+    def test_limit_stops_reading(self):
+        diff = _read_fixture('git_diff_binary_and_normal.diff')
+        read = []
+
+        def stream():
+            for chunk in _chunked(diff):
+                read.append(chunk)
+                yield chunk
+
+        diff_proc = DiffProcessor(stream(), diff_limit=1000)
+        parsed = diff_proc.prepare()
+        self.assertTrue(isinstance(parsed, LimitedDiffContainer))
+        self.assertTrue(diff_proc.limited_diff)
+        self.assertTrue(len(read) < len(diff) / 100)
+
+    def test_inline_changes_highlighted_when_rendered(self):
+        diff_proc = DiffProcessor(_read_fixture('diff_with_diff_data.diff'))
+        parsed = diff_proc.prepare()
+        lines = [l['line'] for f in parsed for chunk in f['chunks']
+                 for l in chunk]
+        self.assertFalse([l for l in lines if '<ins>' in l])
+
+        hg_py = [f for f in parsed if f['filename'] == 'vcs/backends/hg.py']
+        html = diff_proc.as_html(parsed_lines=hg_py)
+        self.assertTrue('<ins>' in html)
+        self.assertEqual([f['filename'] for f in parsed if f['highlighted']],
+                         ['vcs/backends/hg.py'])
+        self.assertEqual(diff_proc.as_html(parsed_lines=hg_py), html)
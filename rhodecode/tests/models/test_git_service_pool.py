@@ -0,0 +1,160 @@
+from __future__ import with_statement
+import os
+import gzip
+import mock
+import time
+import threading
+import unittest
+from webob import Request
+from StringIO import StringIO
+from rhodecode.tests import *
+from rhodecode.lib.middleware import pygrack
+from rhodecode.lib.middleware.pygrack import GitServicePool, \
+    GitRepository, ServiceOutput
+from rhodecode.model.db import Repository
+
+
+class TestGitServicePool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = GitServicePool(2, 1, 1)
+
+    def test_limits(self):
+        self.assertNotEqual(self.pool.acquire('repo'), None)
+        self.assertNotEqual(self.pool.acquire('other'), None)
+        self.pool.timeout = 0.1
+        # per repository limit
+        self.assertEqual(self.pool.acquire('repo'), None)
+        # global limit
+        self.assertEqual(self.pool.acquire('third'), None)
+
+        self.pool.release('other', 10)
+        self.assertNotEqual(self.pool.acquire('third'), None)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['running'], stats['waiting'],
+                          stats['served'], stats['rejected'],
+                          stats['bytes_served']), (2, 0, 1, 2, 10))
+
+    def test_queued_request_runs_when_place_is_released(self):
+        self.pool.acquire('repo')
+        waited = []
+        t = threading.Thread(target=lambda:
+                             waited.append(self.pool.acquire('repo')))
+        t.start()
+        time.sleep(0.1)
+        self.assertEqual(self.pool.get_stats()['waiting'], 1)
+        self.pool.release('repo')
+        t.join()
+        self.assertTrue(waited[0] >= 0.1)
+        self.assertTrue(self.pool.get_stats()['max_wait_time'] >= 0.1)
+
+    def test_output_releases_place(self):
+        self.pool.acquire('repo')
+        output = mock.Mock()
+        output.next.side_effect = ['abc', 'de', StopIteration]
+        out = ServiceOutput(output, self.pool, 'repo', 'git-upload-pack', 0)
+        self.assertEqual(list(out), ['abc', 'de'])
+        out.close()
+        out.close()
+        self.assertTrue(output.close.called)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats['running'], stats['bytes_served']), (0, 5))
+
+
+class TestGitRepository(unittest.TestCase):
+
+    def _post(self, pool, body='0000', git_command='git-upload-pack',
+              headers={}):
+        path = Repository.get_by_repo_name(GIT_REPO).repo_full_path
+        if os.path.isdir(os.path.join(path, '.git')):
+            path = os.path.join(path, '.git')
+        app = GitRepository(GIT_REPO, path, {'username': 'test'})
+        request = Request.blank('/%s/%s' % (GIT_REPO, git_command),
+                                POST=body, headers=headers)
+        with mock.patch.object(pygrack, 'get_git_service_pool',
+                               return_value=pool):
+            with mock.patch.object(pygrack.subprocessio,
+                                   'SubprocessIOChunker') as chunker:
+                response = app.backend(request, request.environ)
+        return response, chunker
+
+    def test_environment_is_copied(self):
+        response, chunker = self._post(GitServicePool(2, 1, 1))
+        env = chunker.call_args[1]['env']
+        self.assertTrue('RHODECODE_EXTRAS' in env)
+        self.assertFalse('RHODECODE_EXTRAS' in os.environ)
+        self.assertTrue(isinstance(response.app_iter, ServiceOutput))
+        response.app_iter.close()
+
+    def test_busy_pool_refuses_request(self):
+        pool = GitServicePool(1, 1, 0)
+        pool.acquire('other')
+        response, chunker = self._post(pool)
+        self.assertEqual(response.status_int, 503)
+        self.assertFalse(chunker.called)
+
+    def test_full_clone_is_sent_from_clone_cache(self):
+        body = '0032want %s\n00000009done\n' % ('a' * 40)
+        store = mock.Mock()
+        store.get.return_value = __file__
+        with mock.patch.object(pygrack, 'get_clone_cache',
+                               return_value=store):
+            response, chunker = self._post(GitServicePool(2, 1, 1), body)
+        self.assertFalse(chunker.called)
+        self.assertEqual(response.body, open(__file__, 'rb').read())
+        repo_id = Repository.get_by_repo_name(GIT_REPO).repo_id
+        self.assertEqual(store.get.call_args[0][0][0][0], repo_id)
+
+    def test_clone_cache_key_follows_refs(self):
+        body = '0032want %s\n00000009done\n' % ('a' * 40)
+        store = mock.Mock()
+        store.get.return_value = None
+        keys = []
+        with mock.patch.object(pygrack, 'get_clone_cache',
+                               return_value=store):
+            for stamp in ['old', 'new']:
+                with mock.patch('rhodecode.lib.clone_cache.get_refs_stamp',
+                                return_value=stamp):
+                    response, chunker = self._post(None, body)
+                keys.append(store.get.call_args[0][0])
+        self.assertEqual(keys[0][1], keys[1][1])
+        self.assertNotEqual(keys[0], keys[1])
+
+    def test_gzipped_request_is_decompressed(self):
+        body = '0032want %s\n00000009done\n' % ('a' * 40)
+        buf = StringIO()
+        f = gzip.GzipFile(fileobj=buf, mode='wb')
+        f.write(body)
+        f.close()
+        store = mock.Mock()
+        store.get.return_value = __file__
+        with mock.patch.object(pygrack, 'get_clone_cache',
+                               return_value=store):
+            response, chunker = self._post(
+                GitServicePool(2, 1, 1), buf.getvalue(),
+                headers={'Content-Encoding': 'gzip'})
+        self.assertFalse(chunker.called)
+        self.assertTrue(store.get.called)
+
+    def test_gunzip_stream(self):
+        buf = StringIO()
+        f = gzip.GzipFile(fileobj=buf, mode='wb')
+        f.write('x' * 100000)
+        f.close()
+        stream = pygrack.GunzipStream(StringIO(buf.getvalue()), 1000)
+        self.assertEqual(stream.read(10), 'x' * 10)
+        self.assertEqual(stream.read(), 'x' * 99990)
+        self.assertEqual(stream.read(10), '')
+
+    def test_pushed_size_is_recorded(self):
+        body = '0000PACK' + 'x' * 100
+        with mock.patch('rhodecode.model.scm.ScmModel.add_repo_size') \
+            as add_repo_size:
+            response, chunker = self._post(None, body, 'git-receive-pack')
+            # process reads the request
+            stream = chunker.call_args[1]['inputstream']
+            while stream.read(7):
+                pass
+            self.assertFalse(add_repo_size.called)
+            response.app_iter.close()
+        add_repo_size.assert_called_once_with(GIT_REPO, len(body))
@@ -4,8 +4,10 @@ from rhodecode.tests import *
 from rhodecode.tests.models.common import _make_group
 from rhodecode.model.repos_group import ReposGroupModel
 from rhodecode.model.repo import RepoModel
-from rhodecode.model.db import RepoGroup, User, UsersGroupRepoGroupToPerm
+from rhodecode.model.db import RepoGroup, User, UsersGroupRepoGroupToPerm, \
+    Repository, UserRepoToPerm, Permission
 from rhodecode.model.user import UserModel
+from rhodecode.model.permission import PermissionModel
 
 from rhodecode.model.meta import Session
 from rhodecode.model.users_group import UsersGroupModel
@@ -470,3 +472,54 @@ class TestPermissions(unittest.TestCase):
         u1_auth = AuthUser(user_id=self.u1.user_id)
         self.assertEqual(u1_auth.permissions['repositories']['myownrepo'],
                          'repository.admin')
+
+    def test_permissions_version_bumped_on_grant(self):
+        version = PermissionModel.get_version()
+        RepoModel().grant_user_permission(repo=HG_REPO, user=self.u1,
+                                          perm='repository.write')
+        # not visible to other processes before commit
+        self.assertEqual(PermissionModel.get_version(), version)
+        Session().commit()
+        self.assertTrue(PermissionModel.get_version() > version)
+
+    def test_permissions_version_kept_on_unrelated_change(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        description = repo.description
+        version = PermissionModel.get_version()
+        try:
+            repo.description = u'changed description'
+            Session().add(repo)
+            Session().commit()
+            self.assertEqual(PermissionModel.get_version(), version)
+        finally:
+            repo = Repository.get_by_repo_name(HG_REPO)
+            repo.description = description
+            Session().add(repo)
+            Session().commit()
+
+    def test_compiled_permissions_are_reused(self):
+        u1_auth = AuthUser(user_id=self.u1.user_id)
+        u1_auth.permissions['repositories'][HG_REPO] = 'repository.admin'
+
+        # change made directly in database is not seen by cached permissions
+        perm = UserRepoToPerm.query()\
+            .filter(UserRepoToPerm.user_id == self.anon.user_id)\
+            .filter(UserRepoToPerm.repository_id ==
+                    Repository.get_by_repo_name(HG_REPO).repo_id).one()
+        perm_id, permission_id = perm.repo_to_perm_id, perm.permission_id
+        none_id = Permission.get_by_key('repository.none').permission_id
+        tbl = UserRepoToPerm.__table__
+
+        Session().execute(tbl.update()
+                          .where(tbl.c.repo_to_perm_id == perm_id)
+                          .values(permission_id=none_id))
+        Session().commit()
+        try:
+            u1_auth = AuthUser(user_id=self.u1.user_id)
+            self.assertEqual(u1_auth.permissions['repositories'][HG_REPO],
+                             'repository.read')
+        finally:
+            Session().execute(tbl.update()
+                              .where(tbl.c.repo_to_perm_id == perm_id)
+                              .values(permission_id=permission_id))
+            Session().commit()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.utils import get_repo_type, get_repos
+from rhodecode.model.scm import ScmModel, ScannedRepo
+
+
+class TestRepoDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._mkdirs('hg_repo/.hg', 'git_repo/.git', 'bare.git/objects',
+                     'bare.git/refs', 'rm__20121212_repo/rm__.hg',
+                     'group/nested/.hg', 'group/sub/deep/.git', 'empty')
+        open(os.path.join(self.tmp, 'file'), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _mkdirs(self, *paths):
+        for path in paths:
+            os.makedirs(os.path.join(self.tmp, path))
+
+    def _path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def test_repo_type(self):
+        self.assertEqual(get_repo_type(self._path('hg_repo')), 'hg')
+        self.assertEqual(get_repo_type(self._path('git_repo')), 'git')
+        self.assertEqual(get_repo_type(self._path('bare.git')), 'git')
+        self.assertEqual(get_repo_type(self._path('rm__20121212_repo')),
+                         None)
+        self.assertEqual(get_repo_type(self._path('group')), False)
+        self.assertEqual(get_repo_type(self._path('empty')), False)
+        # marker files aren't directories
+        open(self._path('empty/.hg'), 'w').close()
+        self.assertEqual(get_repo_type(self._path('empty')), False)
+
+    def test_get_repos(self):
+        expected = [('bare.git', ('git', self._path('bare.git'))),
+                    ('git_repo', ('git', self._path('git_repo'))),
+                    ('hg_repo', ('hg', self._path('hg_repo'))),
+                    ('rm__20121212_repo',
+                     (None, self._path('rm__20121212_repo')))]
+        self.assertEqual(sorted(get_repos(self.tmp)), expected)
+        expected += [
+            (os.path.join('group', 'nested'),
+             ('hg', self._path(os.path.join('group', 'nested')))),
+            (os.path.join('group', 'sub', 'deep'),
+             ('git', self._path(os.path.join('group', 'sub', 'deep'))))]
+        self.assertEqual(sorted(get_repos(self.tmp, recursive=True)),
+                         sorted(expected))
+        self.assertEqual(sorted(get_repos(self.tmp, recursive=True,
+                                          workers=1)),
+                         sorted(expected))
+
+    def test_scan_repos_is_lazy(self):
+        scanned = dict((s.name, s) for s in
+                       ScmModel().scan_repos(self.tmp))
+        self.assertEqual(sorted(scanned), ['bare.git', 'git_repo',
+                                           'group/nested', 'group/sub/deep',
+                                           'hg_repo'])
+        for repo in scanned.values():
+            self.assertTrue(isinstance(repo, ScannedRepo))
+            self.assertFalse('scm_instance' in repo.__dict__)
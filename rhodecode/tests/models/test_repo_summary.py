@@ -0,0 +1,128 @@
+from __future__ import with_statement
+import mock
+import datetime
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.utils import get_scm_size
+from rhodecode.lib.hooks import refresh_repository
+from rhodecode.lib.middleware.simplehg import SimpleHg
+from rhodecode.model.db import Repository, CacheInvalidation
+from rhodecode.model.scm import ScmModel, CachedRepoList
+from rhodecode.model.meta import Session
+
+
+class TestRepositorySummary(unittest.TestCase):
+
+    def _check_summary(self, repo_name):
+        repo = Repository.get_by_repo_name(repo_name)
+        summary = ScmModel().update_repo_summary(repo)
+        Session().commit()
+
+        tip = repo.scm_instance.get_changeset()
+        self.assertEqual(summary.tip_id, tip.raw_id)
+        self.assertEqual(summary.tip_revision, tip.revision)
+        self.assertEqual(summary.tip_author, tip.author)
+        self.assertEqual(summary.last_change, repo.scm_instance.last_change)
+        self.assertEqual(summary.cache_version,
+                         CacheInvalidation.get_version(repo_name))
+        self.assertEqual(Repository.get_by_repo_name(repo_name).summary,
+                         summary)
+        self.assertEqual(repo.updated_on, summary.last_change)
+
+    def test_update_hg_summary(self):
+        self._check_summary(HG_REPO)
+
+    def test_update_git_summary(self):
+        self._check_summary(GIT_REPO)
+
+    def test_invalidation_outdates_summary(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        ScmModel().update_repo_summary(repo)
+        Session().commit()
+
+        ScmModel().mark_for_invalidation(HG_REPO)
+        version = CacheInvalidation.get_version(HG_REPO)
+        self.assertNotEqual(repo.summary.cache_version, version)
+
+        summary = ScmModel().update_repo_summary(repo)
+        Session().commit()
+        self.assertEqual(summary.cache_version, version)
+
+    def test_dashboard_doesnt_refresh_summaries(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        summary = ScmModel().update_repo_summary(repo)
+        Session().commit()
+        ScmModel().mark_for_invalidation(HG_REPO)
+        repos = Repository.query()\
+            .filter(Repository.repo_name.in_([HG_REPO, GIT_REPO])).all()
+        git_repo = [r for r in repos if r.repo_name == GIT_REPO][0]
+        if git_repo.summary is not None:
+            Session().delete(git_repo.summary)
+            Session().commit()
+
+        repo_list = CachedRepoList(repos, TESTS_TMP_PATH)
+        with mock.patch('rhodecode.model.scm.HasRepoPermissionAny',
+                        return_value=lambda *args: True):
+            with mock.patch.object(Session(), 'commit') as commit:
+                with mock.patch.object(ScmModel, 'update_repo_summary') \
+                        as update:
+                    rows = dict((r['name'], r) for r in repo_list)
+        self.assertEqual(commit.call_count, 0)
+        self.assertEqual(update.call_count, 0)
+        # outdated summary is rendered as it is
+        self.assertEqual(rows[HG_REPO]['tip'], summary.tip_id)
+        self.assertEqual(rows[HG_REPO]['rev'], summary.tip_revision)
+        # missing one falls back to what database knows
+        self.assertEqual(rows[GIT_REPO]['rev'], -1)
+        self.assertEqual(rows[GIT_REPO]['last_change'], git_repo.updated_on)
+
+        ScmModel().update_repo_summary(git_repo)
+        Session().commit()
+
+    def test_refresh_repository(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        repo.updated_on = datetime.datetime(2000, 1, 1)
+        Session().commit()
+        refresh_repository(HG_REPO)
+        repo = Repository.get_by_repo_name(HG_REPO)
+        self.assertEqual(repo.updated_on, repo.scm_instance.last_change)
+
+    def test_hg_push_refreshes_repository(self):
+        # it doesn't depend on push logger hook
+        simplehg = SimpleHg(None, {'base_path': TESTS_TMP_PATH})
+        app = mock.Mock(return_value=['pushed'])
+        with mock.patch('rhodecode.lib.middleware.simplehg'
+                        '.refresh_repository') as refresh:
+            resp = simplehg._SimpleHg__serve_push(app, HG_REPO, {}, None)
+        self.assertEqual(resp, ['pushed'])
+        refresh.assert_called_once_with(HG_REPO)
+
+    def test_counters(self):
+        repo = Repository.get_by_repo_name(HG_REPO)
+        scm_model = ScmModel()
+        self.assertEqual(scm_model.get_counters(repo),
+                         (scm_model.get_followers(repo),
+                          scm_model.get_forks(repo),
+                          scm_model.get_pull_requests(repo)))
+        self.assertEqual(scm_model.get_counters(HG_REPO)[0], 1)
+
+    def test_repo_size(self):
+        repo = Repository.get_by_repo_name(GIT_REPO)
+        scm_model = ScmModel()
+        scm_model.update_repo_summary(repo)
+        repo.summary.size = None
+        Session().commit()
+        # pushes don't count until size is measured
+        self.assertEqual(scm_model.add_repo_size(GIT_REPO, 100), None)
+
+        size = scm_model.update_repo_size(repo)
+        Session().commit()
+        self.assertEqual(size, sum(get_scm_size('.git', repo.repo_full_path)))
+        self.assertEqual(scm_model.add_repo_size(GIT_REPO, 100), size + 100)
+        Session().commit()
+        self.assertEqual(scm_model.get_repo_sizes()[GIT_REPO], size + 100)
+
+        # repositories missing on disk are skipped
+        self.assertTrue(0 < scm_model.update_repo_sizes() <=
+                        Repository.query().count())
+        self.assertEqual(scm_model.get_repo_sizes()[GIT_REPO], size)
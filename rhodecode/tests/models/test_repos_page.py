@@ -0,0 +1,99 @@
+import unittest
+from rhodecode.tests import *
+from rhodecode.tests.models.common import _make_group
+from rhodecode.lib.auth import AuthUser
+from rhodecode.model.db import Repository, User, Permission, UserRepoToPerm,\
+    UsersGroupRepoToPerm
+from rhodecode.model.repo import RepoModel
+from rhodecode.model.repos_group import ReposGroupModel
+from rhodecode.model.user import UserModel
+from rhodecode.model.users_group import UsersGroupModel
+from rhodecode.model.meta import Session
+
+
+class TestReposPage(unittest.TestCase):
+    # more than SQLite allows parameters in one query
+    REPOS = 1100
+
+    def setUp(self):
+        self.group = _make_group('page_group')
+        self.user = UserModel().create_or_update(
+            username=u'page_user', password=u'qweqwe',
+            email=u'page_user@rhodecode.org', firstname=u'u1', lastname=u'u1'
+        )
+        self.users_group = UsersGroupModel().create('page_users_group')
+        UsersGroupModel().add_user_to_group(self.users_group, self.user)
+        admin = User.get_by_username(TEST_USER_ADMIN_LOGIN)
+        default = User.get_by_username('default')
+        perm = Permission.get_by_key
+
+        self.names = []
+        for i in xrange(self.REPOS):
+            repo = Repository()
+            repo.repo_name = 'page_group/repo_%04d' % i
+            repo.repo_type = 'hg'
+            repo.user = self.user if i % 17 == 0 else admin
+            repo.group = self.group
+            repo.landing_rev = 'tip'
+            repo.private = i % 5 == 0
+            Session().add(repo)
+            self.names.append(repo.repo_name)
+
+            default_perm = 'repository.none' if i % 3 == 0 \
+                else 'repository.read'
+            UserRepoToPerm.create(default, repo, perm(default_perm))
+            if i % 7 == 0:
+                UserRepoToPerm.create(self.user, repo,
+                                      perm('repository.none'))
+            elif i % 11 == 0:
+                UserRepoToPerm.create(self.user, repo,
+                                      perm('repository.write'))
+            if i % 2 == 0:
+                UsersGroupRepoToPerm.create(self.users_group, repo,
+                                            perm('repository.none'))
+            if i % 13 == 0:
+                UsersGroupRepoToPerm.create(self.users_group, repo,
+                                            perm('repository.read'))
+        Session().commit()
+        self.group_id = self.group.group_id
+
+    def tearDown(self):
+        repo_ids = Session().query(Repository.repo_id)\
+            .filter(Repository.group_id == self.group_id).subquery()
+        for cls in (UserRepoToPerm, UsersGroupRepoToPerm):
+            Session().query(cls).filter(cls.repository_id.in_(repo_ids))\
+                .delete(synchronize_session=False)
+        Repository.query().filter(Repository.group_id == self.group_id)\
+            .delete()
+        Session().commit()
+        UsersGroupModel().delete(self.users_group, force=True)
+        UserModel().delete(self.user)
+        ReposGroupModel().delete(self.group_id, force_delete=True)
+        Session().commit()
+
+    def test_permissions_match_auth_user(self):
+        user = AuthUser(user_id=self.user.user_id)
+        perms = user.permissions['repositories']
+        readable = [name for name in self.names
+                    if perms.get(name) in RepoModel.READ_PERMS]
+        # every rule decides about some of repositories
+        self.assertTrue(0 < len(readable) < self.REPOS)
+
+        total, repos = RepoModel().get_repos_page(user, self.group_id,
+                                                  start=10, limit=20)
+        self.assertEqual(total, len(readable))
+        self.assertEqual([r.repo_name for r in repos], readable[10:30])
+
+        total, repos = RepoModel().get_repos_page(user, self.group_id,
+                                                  sort_dir='desc')
+        self.assertEqual(total, len(readable))
+        self.assertEqual([r.repo_name for r in repos],
+                         list(reversed(readable)))
+
+    def test_admin_reads_all(self):
+        user = AuthUser(user_id=User.get_by_username(
+            TEST_USER_ADMIN_LOGIN).user_id)
+        total, repos = RepoModel().get_repos_page(user, self.group_id,
+                                                  start=1090, limit=20)
+        self.assertEqual(total, self.REPOS)
+        self.assertEqual([r.repo_name for r in repos], self.names[1090:])
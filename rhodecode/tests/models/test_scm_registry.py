@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.scm_registry import ScmInstanceRegistry, \
+    INSTANCE_SIZE, CHANGESET_SIZE, get_scm_registry, get_refs_stamp
+from rhodecode.model.db import Repository
+from rhodecode.model.scm import ScmModel
+
+
+class FakeRepo(object):
+    alias = 'git'
+
+    def __init__(self, changesets=0):
+        self.revisions = ['a' * 40] * changesets
+
+
+class TestScmInstanceRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.registry = ScmInstanceRegistry(4 * INSTANCE_SIZE)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _get(self, key, version=1, changesets=0):
+        path = os.path.join(self.tmp, key)
+        if not os.path.isdir(path):
+            os.makedirs(os.path.join(path, 'refs', 'heads'))
+        return self.registry.get(key, path, version,
+                                 lambda: FakeRepo(changesets))
+
+    def test_instance_is_reused(self):
+        repo = self._get('repo')
+        self.assertTrue(self._get('repo') is repo)
+        self.assertTrue(self._get('other') is not repo)
+        self.assertEqual(len(self.registry), 2)
+
+    def test_outdated_instance_is_replaced(self):
+        repo = self._get('repo')
+        new_repo = self._get('repo', version=2)
+        self.assertTrue(new_repo is not repo)
+
+        # refs changed outside of rhodecode
+        os.mkdir(os.path.join(self.tmp, 'repo', 'refs', 'tags'))
+        self.assertTrue(self._get('repo', version=2) is not new_repo)
+        self.assertEqual(len(self.registry), 1)
+
+    def test_nested_refs_change_stamp(self):
+        self._get('repo')
+        nested = os.path.join(self.tmp, 'repo', 'refs', 'heads', 'feature')
+        os.mkdir(nested)
+        open(os.path.join(nested, 'x'), 'w').close()
+        os.utime(nested, (0, 0))
+        stamp = get_refs_stamp(os.path.join(self.tmp, 'repo'))
+
+        # git updates a ref by renaming new file over it
+        open(os.path.join(nested, 'x.lock'), 'w').close()
+        os.rename(os.path.join(nested, 'x.lock'), os.path.join(nested, 'x'))
+        self.assertNotEqual(get_refs_stamp(os.path.join(self.tmp, 'repo')),
+                            stamp)
+
+    def test_least_recently_used_are_dropped(self):
+        repos = [self._get('repo%s' % i) for i in range(4)]
+        # used one becomes the most recently used one
+        self.assertTrue(self._get('repo0') is repos[0])
+        big = self._get('big', changesets=INSTANCE_SIZE / CHANGESET_SIZE)
+
+        self.assertTrue(self._get('big') is big)
+        self.assertTrue(self._get('repo0') is repos[0])
+        self.assertTrue(self._get('repo3') is repos[3])
+        self.assertEqual(len(self.registry), 3)
+        self.assertTrue(self.registry._size <= self.registry.max_size)
+
+    def test_too_big_instances_are_not_kept(self):
+        self._get('big', changesets=4 * INSTANCE_SIZE / CHANGESET_SIZE)
+        self.assertEqual(len(self.registry), 0)
+
+
+class TestRepositoryScmInstance(unittest.TestCase):
+
+    def test_scm_instance_is_shared(self):
+        self.assertNotEqual(get_scm_registry(), None)
+        repo = Repository.get_by_repo_name(HG_REPO).scm_instance_cached()
+        self.assertTrue(repo is
+                Repository.get_by_repo_name(HG_REPO).scm_instance_cached())
+
+        ScmModel().mark_for_invalidation(HG_REPO)
+        new_repo = Repository.get_by_repo_name(HG_REPO).scm_instance_cached()
+        self.assertTrue(new_repo is not repo)
+        self.assertEqual(new_repo.revisions, repo.revisions)
@@ -0,0 +1,33 @@
+import unittest
+from rhodecode.tests import *
+from rhodecode.lib.search_cache import SearchCache, CachedPage, \
+    estimate_size
+
+
+class TestSearchCache(unittest.TestCase):
+
+    def _items(self, size):
+        return [{'content': 'x' * size}]
+
+    def test_least_recently_used_are_dropped(self):
+        entry_size = estimate_size(('key', 0)) + \
+            estimate_size((1, self._items(1000)))
+        cache = SearchCache(entry_size * 3)
+        for i in range(3):
+            cache.set(('key', i), (1, self._items(1000)))
+        # read entry becomes the most recently used one
+        self.assertEqual(cache.get(('key', 0)), (1, self._items(1000)))
+        cache.set(('key', 3), (1, self._items(1000)))
+        self.assertEqual([i for i in range(4) if cache.get(('key', i))],
+                         [0, 2, 3])
+
+    def test_too_big_results_are_not_cached(self):
+        cache = SearchCache(1000)
+        cache.set('key', (1, self._items(1000)))
+        self.assertEqual(cache.get('key'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_cached_page(self):
+        page = CachedPage(25, ['a', 'b'])
+        self.assertEqual(len(page), 25)
+        self.assertEqual(page[20:30], ['a', 'b'])
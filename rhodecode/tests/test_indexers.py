@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+    rhodecode.tests.test_indexers
+    ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+    Tests for whoosh indexing daemon
+
+    :created_on: Oct 18, 2026
+    :copyright: (C) 2011-2012 Marcin Kuzminski <marcin@python-works.com>
+    :license: GPLv3, see COPYING for more details.
+"""
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+from __future__ import with_statement
+import os
+import shutil
+import tempfile
+import unittest
+
+from whoosh.index import open_dir, create_in
+from whoosh.query import Term
+
+from rhodecode.tests import *
+from rhodecode.lib.indexers import IDX_NAME, SCHEMA, CHGSETS_SCHEMA, \
+    CHGSET_IDX_NAME, WhooshResultWrapper, get_searcher, get_index_version
+from rhodecode.lib.indexers.daemon import WhooshIndexingDaemon
+
+
+class TestWhooshIndexingDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.index_location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.index_location)
+
+    def _get_daemon(self, **kwargs):
+        return WhooshIndexingDaemon(index_location=self.index_location,
+                                    repo_location=TESTS_TMP_PATH,
+                                    repo_list=[HG_REPO, GIT_REPO], **kwargs)
+
+    def _get_docs(self):
+        idx = open_dir(self.index_location, indexname=IDX_NAME)
+        with idx.reader() as reader:
+            return list(reader.all_stored_fields())
+
+    def _get_indexed(self):
+        docs = self._get_docs()
+        blobs = dict((fields['blob'], fields['content'])
+                     for fields in docs if 'blob' in fields)
+        self.assertEqual(len(blobs), len([f for f in docs if 'blob' in f]))
+        return dict((fields['path'], (fields['repository'],
+                                      blobs.get(fields.get('blob_id'), u'')))
+                    for fields in docs if 'path' in fields)
+
+    def _get_generation(self):
+        return open_dir(self.index_location,
+                        indexname=IDX_NAME).latest_generation()
+
+    def test_parallel_build(self):
+        daemon = self._get_daemon()
+        daemon.run(full_index=True)
+        indexed = self._get_indexed()
+        self.assertTrue(indexed)
+        revisions = daemon.get_indexed_revisions()
+        self.assertEqual(sorted(revisions), sorted([HG_REPO, GIT_REPO]))
+
+        self._get_daemon(procs=2).run(full_index=True)
+        self.assertEqual(self._get_indexed(), indexed)
+
+    def test_content_stored_once(self):
+        self._get_daemon().run(full_index=True)
+        docs = self._get_docs()
+        blobs = set(fields['blob'] for fields in docs if 'blob' in fields)
+        referenced = [fields['blob_id'] for fields in docs
+                      if fields.get('blob_id')]
+        # both test repositories hold the same project
+        self.assertEqual(blobs, set(referenced))
+        self.assertTrue(len(blobs) < len(referenced))
+
+    def test_update_without_changes(self):
+        self._get_daemon().run(full_index=True)
+        generation = self._get_generation()
+        self._get_daemon().run()
+        self.assertEqual(self._get_generation(), generation)
+
+    def test_update_since_indexed_revision(self):
+        daemon = self._get_daemon()
+        daemon.run(full_index=True)
+        indexed = self._get_indexed()
+
+        # pretend repositories were indexed at older revision
+        revisions = daemon.get_indexed_revisions()
+        for repo_name in (HG_REPO, GIT_REPO):
+            repo = daemon.repo_paths[repo_name]
+            revisions[repo_name] = repo.revisions[len(repo) / 2]
+        daemon.set_indexed_revisions(revisions)
+
+        self._get_daemon(procs=2).run()
+        self.assertEqual(self._get_indexed(), indexed)
+        # no blobs without files are left behind
+        docs = self._get_docs()
+        self.assertEqual(set(f['blob'] for f in docs if 'blob' in f),
+                         set(f['blob_id'] for f in docs if f.get('blob_id')))
+        self.assertEqual(self._get_daemon().get_indexed_revisions(),
+                         daemon.get_indexed_revisions())
+
+    def _count_paths(self):
+        return len([f for f in self._get_docs() if 'path' in f])
+
+    def test_update_with_unknown_revision(self):
+        daemon = self._get_daemon()
+        daemon.run(full_index=True)
+        indexed = self._get_indexed()
+        paths = self._count_paths()
+
+        revisions = daemon.get_indexed_revisions()
+        revisions[HG_REPO] = 'a' * 40
+        del revisions[GIT_REPO]
+        daemon.set_indexed_revisions(revisions)
+
+        self._get_daemon().run()
+        self.assertEqual(self._get_indexed(), indexed)
+        # old documents of files are replaced, not duplicated
+        self.assertEqual(self._count_paths(), paths)
+
+
+class TestWhooshResultWrapper(unittest.TestCase):
+
+    def setUp(self):
+        self.index_location = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.index_location)
+
+    def _add_changesets(self, count):
+        idx = create_in(self.index_location, CHGSETS_SCHEMA,
+                        indexname=CHGSET_IDX_NAME)
+        writer = idx.writer()
+        for i in range(count):
+            writer.add_document(raw_id=unicode(i), repository=u'repo',
+                                message=u'fix bug %s' % i)
+        writer.commit()
+
+    def test_searcher_is_reused_until_index_changes(self):
+        self._add_changesets(3)
+        searcher = get_searcher(self.index_location, CHGSET_IDX_NAME)
+        self.assertTrue(searcher is
+                        get_searcher(self.index_location, CHGSET_IDX_NAME))
+        self._add_changesets(5)
+        searcher = get_searcher(self.index_location, CHGSET_IDX_NAME)
+        self.assertEqual(searcher.doc_count(), 5)
+
+    def test_index_version_changes_with_index(self):
+        self._add_changesets(3)
+        version = get_index_version(self.index_location, CHGSET_IDX_NAME)
+        self.assertEqual(get_index_version(self.index_location,
+                                           CHGSET_IDX_NAME), version)
+        idx = open_dir(self.index_location, indexname=CHGSET_IDX_NAME)
+        writer = idx.writer()
+        writer.add_document(raw_id=u'new', repository=u'repo',
+                            message=u'new')
+        writer.commit()
+        self.assertNotEqual(get_index_version(self.index_location,
+                                              CHGSET_IDX_NAME), version)
+
+    def test_message_results_page(self):
+        self._add_changesets(25)
+        searcher = get_searcher(self.index_location, CHGSET_IDX_NAME)
+        results = WhooshResultWrapper('message', searcher,
+                                      Term('message', u'bug'), [u'bug'],
+                                      self.index_location)
+        self.assertEqual(len(results), 25)
+        page = results[20:30]
+        self.assertEqual(len(page), 5)
+        self.assertTrue('<span' in page[0]['message_hl'])
+        self.assertEqual(len(set(r['raw_id'] for r in results)), 25)
+
+    def test_content_results_page(self):
+        idx = create_in(self.index_location, SCHEMA, indexname=IDX_NAME)
+        writer = idx.writer()
+        writer.add_document(blob=u'b1', content=u'import os\nimport re')
+        writer.add_document(blob=u'b2', content=u'nothing here')
+        for repo in (u'repo', u'fork'):
+            path = os.path.join(self.index_location, repo, 'setup.py')
+            writer.add_document(fileid=path, repository=repo,
+                                path=path, blob_id=u'b1')
+        writer.commit()
+        searcher = get_searcher(self.index_location, IDX_NAME)
+        results = WhooshResultWrapper('content', searcher,
+                                      Term('content', u'import'),
+                                      [u'import'], self.index_location)
+        self.assertEqual(len(results), 2)
+        page = results[0:10]
+        self.assertEqual(sorted(r['repository'] for r in page),
+                         [u'fork', u'repo'])
+        self.assertEqual(page[0]['f_path'], 'setup.py')
+        self.assertEqual(page[0]['content_short'], u'import os\nimport re')
@@ -1,6 +1,8 @@
 from __future__ import with_statement
 
 import os
+import stat
+import time
 import tarfile
 import zipfile
 import datetime
@@ -95,6 +97,64 @@ class ArchivesTestCaseMixin(BackendTestMixin):
         with self.assertRaises(VCSError):
             self.tip.fill_archive(prefix='/any')
 
+    def _get_streamed(self, kind):
+        chunks = self.tip.iter_archive(kind=kind, prefix='repo',
+                                       chunk_size=1)
+        return StringIO.StringIO(''.join(chunks))
+
+    def test_iter_archive_zip(self):
+        out = zipfile.ZipFile(self._get_streamed('zip'))
+        self.assertEqual(out.testzip(), None)
+        for x in xrange(5):
+            node_path = '%d/file_%d.txt' % (x, x)
+            self.assertEqual(out.read('repo/' + node_path),
+                             self.tip.get_node(node_path).content)
+
+    def test_iter_archive_tar(self):
+        for kind, mode in [('tar', 'r|'), ('tgz', 'r|gz'),
+                           ('tbz2', 'r|bz2')]:
+            outfile = tarfile.open(fileobj=self._get_streamed(kind),
+                                   mode=mode)
+            members = []
+            for member in outfile:
+                members.append(member.name)
+                node_path = member.name[len('repo/'):]
+                if node_path == '.hg_archival.txt':
+                    continue
+                self.assertEqual(member.mode,
+                    stat.S_IMODE(self.tip.get_file_mode(node_path)))
+                self.assertEqual(member.mtime,
+                                 time.mktime(self.tip.date.timetuple()))
+                self.assertEqual(outfile.extractfile(member).read(),
+                                 self.tip.get_node(node_path).content)
+            files = ['repo/%d/file_%d.txt' % (x, x) for x in xrange(5)]
+            if self.backend_alias == 'hg':
+                files.insert(0, 'repo/.hg_archival.txt')
+            self.assertEqual(sorted(members), files)
+
+    def test_iter_archive_matches_fill_archive(self):
+        for kind, mode in [('tgz', 'r|gz'), ('tbz2', 'r|bz2')]:
+            stream = StringIO.StringIO()
+            self.tip.fill_archive(stream=stream, kind=kind, prefix='repo')
+            filled = self._read_tar(stream, mode)
+            streamed = self._read_tar(self._get_streamed(kind), mode)
+            self.assertEqual(sorted(streamed), sorted(filled))
+            self.assertEqual(streamed, filled)
+
+    def _read_tar(self, stream, mode):
+        stream.seek(0)
+        outfile = tarfile.open(fileobj=stream, mode=mode)
+        return dict((member.name, outfile.extractfile(member).read())
+                    for member in outfile if member.isfile())
+
+    def test_iter_archive_wrong_arguments(self):
+        with self.assertRaises(VCSError):
+            self.tip.iter_archive(kind='wrong kind')
+        with self.assertRaises(VCSError):
+            self.tip.iter_archive(prefix='')
+        with self.assertRaises(VCSError):
+            self.tip.iter_archive(prefix='/any')
+
 # For each backend create test case class
 for alias in SCM_TESTS:
     attrs = {
@@ -103,6 +103,45 @@ class BranchesTestCaseMixin(BackendTestMixin):
         self.assertIn('issue/123', self.repo.branches)
         self.assertIn('123', self.repo.branches)
 
+    def test_changesets_page_of_branch(self):
+        tip = self.repo.get_changeset()
+        self.imc.add(vcs.nodes.FileNode('docs/index.txt',
+            content='Documentation\n'))
+        foobar_tip = self.imc.commit(
+            message=u'New branch: foobar',
+            author=u'joe',
+            branch='foobar',
+            parents=[tip],
+        )
+        expected = [cs.raw_id for cs in
+                    self.repo.get_changesets(branch_name='foobar')]
+        self.assertEqual(self.repo.count('foobar'), len(expected))
+        self.assertEqual(self.repo.count(), len(self.repo.revisions))
+        page = self.repo.get_changesets_page('foobar', offset=0, limit=1)
+        self.assertEqual([cs.raw_id for cs in page], expected[:1])
+        page = self.repo.get_changesets_page('foobar', offset=0)
+        self.assertEqual([cs.raw_id for cs in page], expected)
+        self.assertEqual(page[-1], foobar_tip)
+
+        # branch history is recomputed after new changesets arrive
+        self.imc.change(vcs.nodes.FileNode('docs/index.txt',
+            content='Documentation\nand more...\n'))
+        newtip = self.imc.commit(
+            message=u'At foobar branch',
+            author=u'joe',
+            branch='foobar',
+            parents=[foobar_tip],
+        )
+        self.assertEqual(self.repo.count('foobar'), len(expected) + 1)
+        page = self.repo.get_changesets_page('foobar', offset=len(expected))
+        self.assertEqual(page, [newtip])
+
+    def test_changesets_page_of_missing_branch(self):
+        self.assertRaises(vcs.exceptions.BranchDoesNotExistError,
+                          self.repo.get_changesets_page, 'no-such-branch')
+        self.assertRaises(vcs.exceptions.BranchDoesNotExistError,
+                          self.repo.count, 'no-such-branch')
+
 
 # For each backend create test case class
 for alias in SCM_TESTS:
@@ -41,6 +41,28 @@ class GetsliceTestCaseMixin(BackendTestMixin):
         self.assertEqual(list(self.repo[:-2]),
             [self.repo.get_changeset(rev) for rev in self.repo.revisions[:-2]])
 
+    def test_get_changesets_bulk(self):
+        revisions = self.repo.revisions[1:4]
+        changesets = self.repo.get_changesets_bulk(revisions)
+        self.assertEqual(changesets,
+            [self.repo.get_changeset(rev) for rev in revisions])
+        for cs in changesets:
+            single = self.repo.get_changeset(cs.raw_id)
+            self.assertEqual(cs.message, single.message)
+            self.assertEqual(cs.author, single.author)
+            self.assertEqual(cs.date, single.date)
+            self.assertEqual(cs.branch, single.branch)
+            self.assertEqual(cs.tags, single.tags)
+            self.assertEqual(cs.parents, single.parents)
+        # parents within the list are shared
+        self.assertTrue(changesets[1].parents[0] is changesets[0])
+
+    def test_get_changesets_page(self):
+        self.assertEqual(self.repo.get_changesets_page(offset=3),
+            [self.repo.get_changeset(rev) for rev in self.repo.revisions[3:]])
+        self.assertEqual(self.repo.get_changesets_page(offset=1, limit=2),
+            list(self.repo[1:3]))
+
 
 # For each backend create test case class
 for alias in SCM_TESTS:
@@ -4,6 +4,7 @@ import os
 import mock
 import datetime
 from rhodecode.lib.vcs.backends.git import GitRepository, GitChangeset
+from rhodecode.lib.vcs.backends.git.commitgraph import CommitGraph
 from rhodecode.lib.vcs.exceptions import RepositoryError, VCSError, NodeDoesNotExistError
 from rhodecode.lib.vcs.nodes import NodeKind, FileNode, DirNode, NodeState
 from rhodecode.lib.vcs.utils.compat import unittest
@@ -630,6 +631,19 @@ class GitSpecificWithRepoTest(BackendTestMixin, unittest.TestCase):
         self.assertEqual(cs.get_node('foobar/static/js/admin/base.js').content,
             'base')
 
+    def test_run_git_command_raises_on_error(self):
+        self.assertRaises(RepositoryError, self.repo.run_git_command,
+                          'rev-parse not-existing-ref')
+
+    def test_run_git_command_limits_processes(self):
+        from rhodecode.lib.vcs.backends.git import repository
+        slots = mock.Mock()
+        with mock.patch.object(repository, '_process_slots', slots):
+            so, se = self.repo.run_git_command('rev-parse HEAD')
+        self.assertEqual(so.strip(), self.repo.revisions[-1])
+        self.assertEqual(slots.acquire.call_count, 1)
+        self.assertEqual(slots.release.call_count, 1)
+
     def test_workdir_get_branch(self):
         self.repo.run_git_command('checkout -b production')
         # Regression test: one of following would fail if we don't check
@@ -661,6 +675,86 @@ class GitSpecificWithRepoTest(BackendTestMixin, unittest.TestCase):
             % (3, self.repo._get_revision(0), self.repo._get_revision(1)))
 
 
+class GitCommitGraphTest(BackendTestMixin, unittest.TestCase):
+    backend_alias = 'git'
+
+    def _get_graph(self, repo):
+        return CommitGraph(repo, os.path.join(self.repo_path + '-graph',
+                                              'graph'))
+
+    def _rev_list(self, repo):
+        so, se = repo.run_git_command('rev-list --all --reverse --date-order')
+        return so.splitlines()
+
+    def test_graph_matches_rev_list(self):
+        repo = GitRepository(TEST_GIT_REPO)
+        graph = CommitGraph(repo, os.path.join(get_new_dir('commit-graph'),
+                                               'graph'))
+        self.assertEqual(graph.refresh().revisions(), self._rev_list(repo))
+        for rev in (0, 10, 44, len(graph) - 1):
+            cs = repo.get_changeset(repo.revisions[rev])
+            self.assertEqual(graph.parentrevs(rev),
+                             [p.revision for p in cs.parents])
+            self.assertEqual(graph.get_author(rev), cs.author)
+            self.assertEqual(graph.get_revision(cs.raw_id), rev)
+
+    def test_graph_is_persistent(self):
+        graph = self._get_graph(self.repo).refresh()
+        other = self._get_graph(GitRepository(self.repo_path))
+        self.assertTrue(other._load())
+        self.assertEqual(other.revisions(), graph.revisions())
+        self.assertEqual(other.parentrevs(1), [0])
+        self.assertEqual(other.get_author(1),
+                         'Jane Doe <jane.doe@example.com>')
+
+    def test_graph_is_updated_with_new_commits(self):
+        graph = self._get_graph(self.repo).refresh()
+        self.assertEqual(len(graph), 2)
+        self.imc.add(FileNode('foo3', content='foo3'))
+        tip = self.imc.commit(message=u'Third', author=u'Jane <jane@doe.com>',
+                              date=datetime.datetime(2010, 1, 2))
+        graph.refresh()
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(graph.get_raw_id(-1), tip.raw_id)
+        self.assertEqual(graph.parentrevs(2), [1])
+        self.assertEqual(graph.revisions(), self._rev_list(self.repo))
+
+    def test_graph_is_rebuilt_when_history_is_rewritten(self):
+        graph = self._get_graph(self.repo).refresh()
+        self.repo.run_git_command('update-ref refs/heads/master %s'
+                                  % self.repo.revisions[0])
+        graph.refresh()
+        self.assertEqual(graph.revisions(), [self.repo.revisions[0]])
+
+    def test_dagwalker_uses_graph(self):
+        from rhodecode.lib.graphmod import _dagwalker
+        self.repo.commit_graph = self._get_graph(self.repo).refresh()
+        self.repo.get_changeset = mock.Mock()
+        dag = list(_dagwalker(self.repo, [1, 0], 'git'))
+        self.assertEqual([(1, 'C', 1, [0]), (0, 'C', 0, [])], dag)
+        self.assertFalse(self.repo.get_changeset.called)
+
+    def test_graph_children(self):
+        repo = GitRepository(TEST_GIT_REPO)
+        graph = CommitGraph(repo, os.path.join(get_new_dir('commit-graph'),
+                                               'graph')).refresh()
+        for rev in (0, 10, 44, len(graph) - 1):
+            for child in graph.childrenrevs(rev):
+                self.assertTrue(rev in graph.parentrevs(child))
+        self.assertEqual(graph.childrenrevs(-1), [])
+        self.assertEqual(graph.childrenrevs(0), [1])
+
+    def test_children_without_graph(self):
+        repo = GitRepository(TEST_GIT_REPO)
+        with_graph = dict((rev, repo._get_children_revisions(rev))
+                          for rev in (0, 10, 44, len(repo) - 1))
+        repo.commit_graph = None
+        for rev, children in with_graph.iteritems():
+            self.assertEqual(repo._get_children_revisions(rev), children)
+            self.assertEqual([cs.revision for cs in
+                              repo.get_changeset(rev).children], children)
+
+
 class GitRegressionTest(BackendTestMixin, unittest.TestCase):
     backend_alias = 'git'
 
@@ -1,12 +1,17 @@
 from __future__ import with_statement
 
 import os
+import posixpath
+from itertools import islice
 from rhodecode.lib.vcs.backends.hg import MercurialRepository, MercurialChangeset
-from rhodecode.lib.vcs.exceptions import RepositoryError, VCSError, NodeDoesNotExistError
+from rhodecode.lib.vcs.backends.hg.dirindex import DirIndexCache
+from rhodecode.lib.vcs.exceptions import RepositoryError, VCSError, NodeDoesNotExistError, \
+    ChangesetError
 from rhodecode.lib.vcs.nodes import NodeKind, NodeState
 from conf import PACKAGE_DIR, TEST_HG_REPO, TEST_HG_REPO_CLONE, \
     TEST_HG_REPO_PULL
 from rhodecode.lib.vcs.utils.compat import unittest
+from rhodecode.lib.vcs.utils.paths import get_dirs_for_path
 
 
 # Use only clean mercurial's ui
@@ -306,6 +311,60 @@ class MercurialChangesetTest(unittest.TestCase):
             .get_node('api')\
             .get_node('index.rst'))
 
+    def test_get_changesets_of_branch(self):
+        expected = [cs.raw_id for cs in self.repo
+                    if cs.branch == 'web']
+        self.assertTrue(len(expected) > 2)
+        self.assertEqual([cs.raw_id for cs in
+                          self.repo.get_changesets(branch_name='web')],
+                         expected)
+        # changesets are read lazily, newest ones first
+        self.assertEqual([cs.raw_id for cs in islice(self.repo.get_changesets(
+                          branch_name='web', reverse=True), 2)],
+                         expected[:-3:-1])
+
+    def test_dir_index(self):
+        chset = self.repo.get_changeset(45)
+        files = list(chset._ctx)
+        for path in chset._dir_paths:
+            dirs, dir_files = chset._dir_index[path]
+            self.assertEqual(dir_files, sorted(f for f in files
+                             if posixpath.dirname(f) == path))
+            self.assertEqual(dirs, sorted(d for d in chset._dir_paths
+                             if d and posixpath.dirname(d) == path))
+        self.assertEqual(sorted(chset._dir_index),
+                         sorted(set(posixpath.dirname(f) for f in files) |
+                                set(get_dirs_for_path(*files)) | set([''])))
+
+    def test_dir_index_is_shared(self):
+        chset = self.repo.get_changeset(45)
+        other = MercurialRepository(TEST_HG_REPO).get_changeset(45)
+        self.assertTrue(chset._dir_index is other._dir_index)
+        self.assertFalse(chset._dir_index is
+                         self.repo.get_changeset(44)._dir_index)
+
+    def test_dir_index_cache_is_bounded(self):
+        cache = DirIndexCache(6)
+        # 3 directories and 2 files
+        cache.get('a', lambda: ['a/b/c', 'a/d'])
+        index = cache.get('a', lambda: [])
+        self.assertEqual(index['a'], (['a/b'], ['a/d']))
+        self.assertEqual(cache.size, 5)
+        cache.get('b', lambda: ['e'])
+        self.assertEqual((len(cache), cache.size), (1, 2))
+        # too big to be kept
+        cache.get('c', lambda: ['f', 'g', 'h', 'i', 'j', 'k'])
+        self.assertEqual((len(cache), cache.size), (1, 2))
+
+    def test_walk_paths(self):
+        chset = self.repo.get_changeset(45)
+        self.assertEqual(list(chset.walk_paths('docs')),
+                         [(top.path, [d.path for d in dirs],
+                           [f.path for f in files])
+                          for top, dirs, files in chset.walk('docs')])
+        self.assertRaises(ChangesetError, list,
+                          chset.walk_paths('setup.py'))
+
     def test_branch_and_tags(self):
         chset0 = self.repo.get_changeset(0)
         self.assertEqual(chset0.branch, 'default')
@@ -74,6 +74,22 @@ class RepositoryGetDiffTest(BackendTestMixin):
         with self.assertRaises(ChangesetDoesNotExistError):
             self.repo.get_diff('a' * 40, 'b' * 40)
 
+    def test_changed_paths(self):
+        revs = self.repo.revisions
+        self.assertEqual(self.repo.get_changed_paths(
+            self.repo.EMPTY_CHANGESET, revs[0]),
+            (['foobar', 'foobar2'], [], []))
+        self.assertEqual(self.repo.get_changed_paths(revs[0], revs[1]),
+            (['foobar3'], ['foobar'], []))
+        self.assertEqual(self.repo.get_changed_paths(revs[0], revs[2]),
+            (['foobar3'], [], ['foobar']))
+        self.assertEqual(self.repo.get_changed_paths(revs[2], revs[2]),
+            ([], [], []))
+
+    def test_changed_paths_raise_for_wrong(self):
+        with self.assertRaises(ChangesetDoesNotExistError):
+            self.repo.get_changed_paths('a' * 40, self.repo.revisions[0])
+
 
 class GitRepositoryGetDiffTest(RepositoryGetDiffTest, unittest.TestCase):
     backend_alias = 'git'